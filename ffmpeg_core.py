@@ -0,0 +1,3479 @@
+"""
+FFmpeg GUI - Core
+Command builders, probing and job running shared by the GUI and the
+headless CLI (python main.py --headless job.json). Nothing here imports Tk.
+"""
+
+import os
+import bisect
+import subprocess
+import threading
+import json
+import time
+import hashlib
+import re
+import sqlite3
+import itertools
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from pathlib import Path
+
+# Threads one encoder instance can use before extra threads stop paying off.
+# Batch jobs are sized so that jobs * threads roughly matches the core count.
+CODEC_THREAD_BUDGET = {
+    'libx264': 4,
+    'libx265': 8,
+    'libvpx-vp9': 4,
+    'libaom-av1': 8,
+    'mpeg4': 2,
+    'libxvid': 2,
+    'copy': 1,
+    'audio': 1,
+}
+
+# Parallel ffprobe runs when files are added to the batch list
+PROBE_WORKERS = min(8, os.cpu_count() or 1)
+
+# Journal written into the batch output folder, used to resume interrupted batches
+BATCH_JOURNAL_NAME = '.ffmpeg_gui_batch.json'
+
+# Fingerprints of the outputs in a batch output folder, for incremental batches
+OUTPUT_MANIFEST_NAME = '.ffmpeg_gui_manifest.json'
+
+# OutputCache folders (under the temp folder) and the size each may grow to
+SEGMENT_CACHE = ('ffmpeg_gui_segments', 20 * 1024 ** 3)
+THUMBNAIL_CACHE = ('ffmpeg_gui_thumbnails', 512 * 1024 ** 2)
+PALETTE_CACHE = ('ffmpeg_gui_palettes', 64 * 1024 ** 2)
+
+# Contact sheets with up to this many thumbnails seek to each one separately
+THUMBNAIL_SEEK_LIMIT = 16
+
+# GIF ranges longer than two of these are rendered as parallel segments
+GIF_SEGMENT_SECONDS = 10
+
+# Share of a target file size kept free for container overhead
+TARGET_SIZE_OVERHEAD = 0.02
+
+# Lowest video bitrate (bits/s) a target size may leave before it is refused
+TARGET_MIN_VIDEO_BITRATE = 50000
+
+# CRF search: sample windows per input, their length and the CRFs searched
+CRF_SAMPLE_WINDOWS = 4
+CRF_SAMPLE_SECONDS = 4
+CRF_SEARCH_RANGE = {'libx264': (16, 36), 'libx265': (18, 38)}
+
+
+def batch_concurrency(codec, jobs=0, cpu_count=None):
+    """Return (parallel jobs, threads per job) for a batch.
+
+    jobs=0 derives the job count from the core count and the codec's
+    thread budget; otherwise the given job count is used as is.
+    """
+    cpu_count = cpu_count or os.cpu_count() or 1
+    if jobs <= 0:
+        jobs = max(1, cpu_count // CODEC_THREAD_BUDGET.get(codec, 2))
+        if codec == 'copy':
+            # Stream copy is disk bound, more jobs only thrash the drive
+            jobs = min(jobs, 4)
+    return jobs, max(1, cpu_count // jobs)
+
+
+DURATION_RE = re.compile(r'Duration: (\d{2}):(\d{2}):(\d{2}\.\d+)')
+
+
+class FFmpegProgress:
+    """One progress report from FFmpeg's -progress key=value stream"""
+
+    def __init__(self, values):
+        self.frame = int(self._number(values.get('frame'), 0))
+        self.fps = self._number(values.get('fps'))
+        self.out_time = self._number(values.get('out_time_us')) / 1000000
+        self.bitrate = self._number(values.get('bitrate', '').replace('kbits/s', ''))  # kbit/s
+        self.total_size = int(self._number(values.get('total_size'), 0))  # bytes
+        self.speed = self._number(values.get('speed', '').rstrip('x'))
+        self.done = values.get('progress') == 'end'
+
+    @staticmethod
+    def _number(value, default=0.0):
+        """Parse a numeric field, FFmpeg reports N/A until it knows a value"""
+        try:
+            return float(value)
+        except (TypeError, ValueError):
+            return default
+
+    def percent(self, duration):
+        """Progress in percent of the given duration in seconds"""
+        if not duration:
+            return 0.0
+        return max(0.0, min(self.out_time / duration * 100, 100.0))
+
+
+def iter_progress(stream):
+    """Yield an FFmpegProgress for every block of a -progress stream"""
+    values = {}
+    for line in stream:
+        key, sep, value = line.partition('=')
+        if not sep:
+            continue
+        values[key.strip()] = value.strip()
+        # Each block ends with progress=continue or progress=end
+        if key.strip() == 'progress':
+            yield FFmpegProgress(values)
+            values = {}
+
+
+def parse_time(value):
+    """Convert HH:MM:SS(.ms), MM:SS or plain seconds to seconds"""
+    seconds = 0.0
+    for part in str(value).strip().split(':'):
+        seconds = seconds * 60 + float(part)
+    return seconds
+
+
+def format_duration(seconds):
+    """Format seconds as HH:MM:SS"""
+    seconds = int(round(seconds))
+    return f"{seconds // 3600:02d}:{seconds % 3600 // 60:02d}:{seconds % 60:02d}"
+
+
+def format_size(size):
+    """Format a byte count for display"""
+    for unit in ['B', 'KB', 'MB', 'GB']:
+        if size < 1024 or unit == 'GB':
+            return f"{size:.1f} {unit}" if unit != 'B' else f"{int(size)} B"
+        size /= 1024
+
+
+def parse_bitrate(value):
+    """Convert a bitrate like '192k' or '2M' to bits per second"""
+    value = str(value).strip().lower()
+    multiplier = {'k': 1000, 'm': 1000000}.get(value[-1:], 1)
+    if multiplier != 1:
+        value = value[:-1]
+    return float(value) * multiplier
+
+
+def parse_size(value):
+    """Convert a file size like '25MB', '700M' or '1.5G' to bytes"""
+    text = str(value).strip().upper().replace(' ', '')
+    if text.endswith('IB'):
+        text = text[:-2]
+    elif text.endswith('B'):
+        text = text[:-1]
+    multiplier = {'K': 1024, 'M': 1024 ** 2, 'G': 1024 ** 3}.get(text[-1:], 1)
+    if multiplier != 1:
+        text = text[:-1]
+    try:
+        size = float(text) * multiplier
+    except ValueError:
+        raise ValueError(f"Invalid size: {value} (use e.g. 25MB or 1.5GB)")
+    if size <= 0:
+        raise ValueError(f"Invalid size: {value}")
+    return size
+
+
+def file_identity(path):
+    """Return (normalized path, size, mtime) - changes whenever the file does"""
+    stat = os.stat(path)
+    return os.path.normcase(os.path.abspath(path)), stat.st_size, stat.st_mtime_ns
+
+
+def run_ffprobe(ffprobe_path, input_file):
+    """Run ffprobe and return its JSON format/stream description"""
+    cmd = [ffprobe_path, '-v', 'quiet', '-print_format', 'json', '-show_format', '-show_streams', input_file]
+    result = subprocess.run(
+        cmd, capture_output=True, text=True, timeout=30,
+        creationflags=subprocess.CREATE_NO_WINDOW if os.name == 'nt' else 0
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"ffprobe failed for {os.path.basename(input_file)}")
+    return json.loads(result.stdout)
+
+
+def probe_duration(info):
+    """Duration in seconds from ffprobe data, or None if unknown"""
+    try:
+        return float(info['format']['duration'])
+    except (KeyError, TypeError, ValueError):
+        return None
+
+
+def first_stream(info, codec_type):
+    """First stream of the given type ('video', 'audio', ...) from ffprobe data"""
+    for stream in info.get('streams', []):
+        if stream.get('codec_type') == codec_type:
+            return stream
+    return None
+
+
+class ProbeCache:
+    """ffprobe results and other per-file metadata, keyed by path, size and mtime.
+
+    Recently used entries stay in an in-memory LRU, everything is also kept in
+    an SQLite store so unchanged files are never probed again, even across
+    restarts. Besides 'probe', other kinds of derived metadata can be cached
+    per file with get().
+    """
+
+    def __init__(self, db_path, ffprobe_path='ffprobe', memory_size=1024):
+        self.ffprobe_path = ffprobe_path
+        self.memory_size = memory_size
+        self.memory = OrderedDict()
+        self.lock = threading.Lock()
+        self.db = sqlite3.connect(str(db_path), check_same_thread=False)
+        self.db.execute('PRAGMA journal_mode=WAL')
+        self.db.execute('CREATE TABLE IF NOT EXISTS entries ('
+                        'path TEXT, kind TEXT, size INTEGER, mtime INTEGER, data TEXT, '
+                        'PRIMARY KEY (path, kind))')
+        self.db.commit()
+
+    def probe(self, path):
+        """ffprobe format/stream data for a file"""
+        return self.get(path, 'probe', lambda p: run_ffprobe(self.ffprobe_path, p))
+
+    def duration(self, path):
+        """Duration of a file in seconds, or None if it can't be probed"""
+        try:
+            return probe_duration(self.probe(path))
+        except Exception:
+            return None
+
+    def keyframes(self, path):
+        """(keyframe times, duration) of the first video stream, from a packet scan"""
+        return self.get(path, 'keyframes', lambda p: probe_keyframes(self.ffprobe_path, p))
+
+    def peek(self, path, kind):
+        """Cached data for a file if present and still valid, without computing it"""
+        try:
+            path_key, size, mtime = file_identity(path)
+        except OSError:
+            return None
+        with self.lock:
+            return self._lookup((path_key, kind), size, mtime)
+
+    def get(self, path, kind, compute):
+        """Cached compute(path) result, recomputed only when the file changes"""
+        path_key, size, mtime = file_identity(path)
+        key = (path_key, kind)
+        with self.lock:
+            data = self._lookup(key, size, mtime)
+            if data is not None:
+                return data
+
+        # Compute outside the lock so different files are probed in parallel
+        data = compute(path)
+        with self.lock:
+            self.db.execute('INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?, ?)',
+                            (path_key, kind, size, mtime, json.dumps(data)))
+            self.db.commit()
+            self._remember(key, (size, mtime, data))
+        return data
+
+    def _lookup(self, key, size, mtime):
+        """Find a valid entry in memory or on disk, caller holds the lock"""
+        entry = self.memory.get(key)
+        if entry and entry[:2] == (size, mtime):
+            self.memory.move_to_end(key)
+            return entry[2]
+
+        row = self.db.execute('SELECT size, mtime, data FROM entries WHERE path=? AND kind=?',
+                              key).fetchone()
+        if row and tuple(row[:2]) == (size, mtime):
+            data = json.loads(row[2])
+            self._remember(key, (size, mtime, data))
+            return data
+        return None
+
+    def _remember(self, key, entry):
+        """Store an entry in the memory LRU"""
+        self.memory[key] = entry
+        self.memory.move_to_end(key)
+        while len(self.memory) > self.memory_size:
+            self.memory.popitem(last=False)
+
+    def cached(self):
+        """View of this cache that only reads entries already present"""
+        return CachedProbes(self)
+
+
+class CachedProbes:
+    """Read-only view of a ProbeCache that never runs ffprobe.
+
+    Meant for the Tk thread: files that haven't been probed yet make
+    probe() raise, so duration(), frame_size() and audio_stream() see them
+    as unknown instead of blocking on ffprobe.
+    """
+
+    def __init__(self, probe_cache):
+        self.probe_cache = probe_cache
+        self.ffprobe_path = probe_cache.ffprobe_path
+
+    def probe(self, path):
+        """Cached ffprobe data for a file"""
+        data = self.probe_cache.peek(path, 'probe')
+        if data is None:
+            raise ValueError(f"{os.path.basename(path)} hasn't been probed yet, try again in a moment")
+        return data
+
+    def duration(self, path):
+        """Cached duration of a file in seconds, or None"""
+        try:
+            return probe_duration(self.probe(path))
+        except Exception:
+            return None
+
+    def peek(self, path, kind):
+        """Cached data for a file if present and still valid"""
+        return self.probe_cache.peek(path, kind)
+
+
+def audio_stream(probe_cache, path):
+    """A file's first audio stream from the probe cache, or None"""
+    try:
+        return first_stream(probe_cache.probe(path), 'audio')
+    except Exception:
+        return None
+
+
+def frame_size(probe_cache, path):
+    """(width, height) of a file's frames as filters see them (after autorotation), or None"""
+    try:
+        video = first_stream(probe_cache.probe(path), 'video') or {}
+    except Exception:
+        return None
+    width, height = video.get('width'), video.get('height')
+    if not width or not height:
+        return None
+    rotation = video.get('tags', {}).get('rotate') or next(
+        (data.get('rotation') for data in video.get('side_data_list', []) if 'rotation' in data), 0)
+    if abs(int(float(rotation))) % 180 == 90:
+        width, height = height, width
+    return width, height
+
+
+def summarize_probe(info):
+    """Extract the fields shown in the batch list from ffprobe data"""
+    video = first_stream(info, 'video') or {}
+    audio = first_stream(info, 'audio') or {}
+    fps = 0.0
+    try:
+        num, _, den = video.get('avg_frame_rate', '0/1').partition('/')
+        fps = float(num) / float(den or 1)
+    except (ValueError, ZeroDivisionError):
+        pass
+    return {
+        'duration': probe_duration(info),
+        'width': video.get('width', 0),
+        'height': video.get('height', 0),
+        'fps': fps,
+        'vcodec': video.get('codec_name', ''),
+        'acodec': audio.get('codec_name', ''),
+        'size': int(info.get('format', {}).get('size', 0) or 0),
+    }
+
+
+def probe_keyframes(ffprobe_path, input_file):
+    """Return (keyframe times, duration) of the first video stream.
+
+    Reads packet headers only, so nothing is decoded.
+    """
+    cmd = [ffprobe_path, '-v', 'error', '-select_streams', 'v:0',
+           '-show_entries', 'packet=pts_time,flags', '-of', 'csv=p=0', input_file]
+    result = subprocess.run(
+        cmd, capture_output=True, text=True,
+        creationflags=subprocess.CREATE_NO_WINDOW if os.name == 'nt' else 0
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"ffprobe failed: {result.stderr.strip()}")
+
+    keyframes = []
+    duration = 0.0
+    for line in result.stdout.splitlines():
+        pts, _, flags = line.partition(',')
+        try:
+            pts = float(pts)
+        except ValueError:
+            continue
+        duration = max(duration, pts)
+        if 'K' in flags:
+            keyframes.append(pts)
+    keyframes.sort()
+    return keyframes, duration
+
+
+def plan_segments(keyframes, duration, count):
+    """Pick up to count-1 keyframe times that split the input evenly"""
+    if count < 2 or not keyframes:
+        return []
+    split_times = []
+    for i in range(1, count):
+        target = duration * i / count
+        nearest = min(keyframes, key=lambda k: abs(k - target))
+        if 0 < nearest < duration and (not split_times or nearest > split_times[-1]):
+            split_times.append(nearest)
+    return split_times
+
+
+def keyframe_at_or_before(keyframes, time):
+    """Latest keyframe time <= time (0.0 if there is none)"""
+    index = bisect.bisect_right(keyframes, time + 0.0005)
+    return keyframes[index - 1] if index else 0.0
+
+
+def plan_smart_cut(keyframes, start, end):
+    """Split [start, end) into parts to re-encode and parts to stream copy.
+
+    Returns a list of ('encode' | 'copy', part start, part end). Only the
+    partial GOPs at the cut points are re-encoded.
+    """
+    inside = [k for k in keyframes if start <= k <= end]
+    if len(inside) < 2:
+        return [('encode', start, end)]
+    first, last = inside[0], inside[-1]
+    parts = []
+    if first > start:
+        parts.append(('encode', start, first))
+    parts.append(('copy', first, last))
+    if end > last:
+        parts.append(('encode', last, end))
+    return parts
+
+
+def file_checksum(path):
+    """SHA-256 of a file's contents"""
+    sha = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1024 * 1024), b''):
+            sha.update(block)
+    return sha.hexdigest()
+
+
+class BatchJournal:
+    """On-disk record of a batch run, so an interrupted batch can be resumed.
+
+    Holds the options snapshot and per-file status, output path and output
+    checksum. Saved atomically at most once per second while items change,
+    and always when the batch ends.
+    """
+
+    SAVE_INTERVAL = 1.0
+
+    def __init__(self, path, data):
+        self.path = path
+        self.data = data
+        self.items = {item['input']: item for item in data['items']}
+        self.lock = threading.Lock()
+        self.dirty = False
+        self.last_save = 0.0
+
+    @classmethod
+    def create(cls, output_folder, options, jobs):
+        """Start a new journal for (input, output) jobs in the output folder"""
+        data = {
+            'version': 1,
+            'created': time.strftime('%Y-%m-%d %H:%M:%S'),
+            'output_folder': output_folder,
+            'options': options,
+            'items': [{'input': input_file, 'output': output_file, 'status': 'pending'}
+                      for input_file, output_file in jobs],
+        }
+        journal = cls(os.path.join(output_folder, BATCH_JOURNAL_NAME), data)
+        journal.save(force=True)
+        return journal
+
+    @classmethod
+    def load(cls, path):
+        """Load an existing journal"""
+        with open(path, 'r', encoding='utf-8') as f:
+            return cls(path, json.load(f))
+
+    def update(self, input_file, **fields):
+        """Change the record of one file"""
+        with self.lock:
+            self.items[input_file].update(fields)
+            self.dirty = True
+        self.save()
+
+    def save(self, force=False):
+        """Write the journal if it changed and wasn't saved recently"""
+        with self.lock:
+            if not force and (not self.dirty or time.monotonic() - self.last_save < self.SAVE_INTERVAL):
+                return
+            temp_path = self.path + '.tmp'
+            with open(temp_path, 'w', encoding='utf-8') as f:
+                json.dump(self.data, f, indent=1, ensure_ascii=False)
+            os.replace(temp_path, self.path)
+            self.dirty = False
+            self.last_save = time.monotonic()
+
+    def is_complete(self):
+        """True when every file has been processed successfully"""
+        return all(item['status'] == 'done' for item in self.data['items'])
+
+    def output_intact(self, item):
+        """Check that a completed item's output is still the file that was written"""
+        output_file = item['output']
+        if not os.path.isfile(output_file):
+            return False
+        stat = os.stat(output_file)
+        if (stat.st_size, stat.st_mtime_ns) == (item.get('size'), item.get('mtime')):
+            return True
+        return item.get('checksum') == file_checksum(output_file)
+
+
+def batch_fingerprint(input_file, cmd):
+    """Fingerprint of an input file and the FFmpeg arguments applied to it.
+
+    Covers the input's identity and every argument except the executable,
+    the output path (the manifest key) and -threads, which only changes
+    scheduling.
+    """
+    args = list(cmd[1:-1])
+    if '-threads' in args:
+        index = args.index('-threads')
+        del args[index:index + 2]
+    _, size, mtime = file_identity(input_file)
+    payload = json.dumps([size, mtime, args], ensure_ascii=False)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+class OutputManifest:
+    """Which fingerprint produced each output in a folder"""
+
+    def __init__(self, folder):
+        self.path = os.path.join(folder, OUTPUT_MANIFEST_NAME)
+        self.lock = threading.Lock()
+        self.entries = {}
+        if os.path.exists(self.path):
+            try:
+                with open(self.path, 'r', encoding='utf-8') as f:
+                    self.entries = json.load(f)
+            except (OSError, ValueError):
+                self.entries = {}
+
+    def is_current(self, output_file, fingerprint):
+        """True if output_file exists unchanged and was made from fingerprint"""
+        entry = self.entries.get(os.path.basename(output_file))
+        if not entry or entry['fingerprint'] != fingerprint or not os.path.isfile(output_file):
+            return False
+        stat = os.stat(output_file)
+        return (stat.st_size, stat.st_mtime_ns) == (entry['size'], entry['mtime'])
+
+    def record(self, output_file, fingerprint):
+        """Remember that output_file was just produced from fingerprint"""
+        stat = os.stat(output_file)
+        with self.lock:
+            self.entries[os.path.basename(output_file)] = {
+                'fingerprint': fingerprint, 'size': stat.st_size, 'mtime': stat.st_mtime_ns}
+        # Each output takes far longer to make than to record, so save eagerly
+        self.save()
+
+    def save(self):
+        """Write the manifest atomically"""
+        with self.lock:
+            temp_path = self.path + '.tmp'
+            with open(temp_path, 'w', encoding='utf-8') as f:
+                json.dump(self.entries, f, indent=1, ensure_ascii=False)
+            os.replace(temp_path, self.path)
+
+
+class OutputCache:
+    """FFmpeg outputs kept in a temp folder for reuse.
+
+    Files are named by the batch_fingerprint of the command that produced
+    them, so running the same command on an unchanged input again finds
+    the earlier result. Least recently used files are removed once the
+    folder outgrows its size limit.
+    """
+
+    def __init__(self, folder, limit):
+        import tempfile
+        # A bare name is a folder under the system temp folder
+        self.folder = os.path.join(tempfile.gettempdir(), folder)
+        self.limit = limit
+        os.makedirs(self.folder, exist_ok=True)
+
+    def path(self, input_file, cmd):
+        """Cache file for the output of cmd (which reads input_file)"""
+        extension = os.path.splitext(cmd[-1])[1]
+        return os.path.join(self.folder, batch_fingerprint(input_file, cmd) + extension)
+
+    def lookup(self, path):
+        """True if path is cached, marking it as recently used"""
+        if not os.path.exists(path):
+            return False
+        os.utime(path)
+        return True
+
+    def encode(self, run, input_file, cmd):
+        """Run cmd into the cache with run(cmd) unless its result is already there.
+
+        Returns the cached file's path.
+        """
+        path = self.path(input_file, cmd)
+        if self.lookup(path):
+            return path
+        # Write under a temporary name so an interrupted encode is never reused
+        base, extension = os.path.splitext(path)
+        partial = f"{base}.partial{extension}"
+        try:
+            run(cmd[:-1] + [partial])
+            os.replace(partial, path)
+        finally:
+            if os.path.exists(partial):
+                os.remove(partial)
+        return path
+
+    def prune(self, keep=()):
+        """Delete least recently used files until the cache fits its limit"""
+        keep = set(keep)
+        entries = []
+        for name in os.listdir(self.folder):
+            path = os.path.join(self.folder, name)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.limit:
+                break
+            if path in keep or '.partial' in path:
+                continue
+            try:
+                os.remove(path)
+                total -= size
+            except OSError:
+                pass
+
+
+def write_concat_list(list_file, files):
+    """Write an FFmpeg concat demuxer list"""
+    with open(list_file, 'w', encoding='utf-8') as f:
+        for file in files:
+            escaped = os.path.abspath(file).replace("'", "'\\''")
+            f.write(f"file '{escaped}'\n")
+
+
+# Settings of each operation as the GUI tabs start out. Option dicts passed
+# to the builders below may leave out any of these keys.
+OPTION_DEFAULTS = {
+    'convert': {
+        'format': 'mp4', 'vcodec': 'libx264', 'acodec': 'aac', 'preset': 'medium',
+        'crf': '23', 'vbitrate': '', 'resize': False, 'resolution': '1920x1080',
+        'width': '', 'height': '', 'fps': False, 'fps_value': '30',
+        'hw_accel': False, 'chunked': False, 'segments': '0', 'custom_args': '',
+        'renditions_enable': False, 'renditions': '1080,720,480',
+        'target_enable': False, 'target_sizes': '25MB', 'abitrate': '128k',
+        'quality_enable': False, 'quality_metric': 'ssim', 'quality_target': '0.98',
+    },
+    'trim': {
+        'start': '00:00:00', 'mode': 'duration', 'duration': '00:00:10',
+        'end': '00:00:10', 'reencode': False, 'smartcut': False,
+    },
+    'merge': {
+        'files': [], 'reencode': False, 'analyze': True,
+    },
+    'filter': {
+        'rotate': 'none', 'hflip': False, 'vflip': False, 'speed': '1.0',
+        'brightness': '0', 'contrast': '1.0', 'saturation': '1.0',
+        'blur': False, 'blur_radius': '5', 'scale': 'none', 'optimize': True,
+    },
+    'audio': {
+        'format': 'mp3', 'codec': 'auto', 'bitrate': '192k', 'sample': 'keep',
+        'channels': 'keep', 'volume_enable': False, 'volume': '1.0',
+        'trim_enable': False, 'trim_start': '00:00:00', 'trim_duration': '00:00:30',
+        'fadein': False, 'fadein_duration': '3', 'fadeout': False, 'fadeout_duration': '3',
+        'loudnorm': False, 'loudnorm_target': '-16', 'loudnorm_peak': '-1.5', 'loudnorm_range': '11',
+        'stream_copy': True, 'multi_enable': False, 'outputs': 'mp3:320k, m4a:192k, flac',
+    },
+    'subtitle': {
+        'type': 'soft', 'fontsize': '24', 'color': 'white',
+    },
+    'watermark': {
+        'position': 'top-right', 'margin': '10', 'opacity': '0.8',
+    },
+    'pipeline': {
+        'steps': [], 'crf': '23', 'preset': 'medium',
+    },
+    'thumbnail': {
+        'columns': '4', 'rows': '4', 'width': '320',
+    },
+    'gif': {
+        'start': '00:00:00', 'duration': '5', 'fps': '12', 'width': '480', 'colors': '256',
+        'dither': 'sierra2_4a', 'loop': '0',
+    },
+    'batch': {
+        'operation': 'convert', 'pattern': '{name}_converted{ext}', 'jobs': '0',
+        'incremental': False, 'convert_format': 'mp4', 'convert_codec': 'libx264',
+        'convert_crf': '23', 'convert_auto_crf': False, 'convert_quality_metric': 'ssim',
+        'convert_quality_target': '0.98', 'audio_format': 'mp3', 'audio_bitrate': '192k',
+        'audio_fadein': False, 'audio_fadeout': False, 'audio_fade': '3', 'audio_loudnorm': False,
+        'audio_copy': True,
+        'resize_resolution': '1920x1080', 'filter_type': 'none',
+    },
+}
+
+# Audio encoder for each output format when the codec is 'auto'
+AUDIO_FORMAT_CODECS = {
+    'mp3': 'libmp3lame',
+    'aac': 'aac',
+    'm4a': 'aac',
+    'wav': 'pcm_s16le',
+    'flac': 'flac',
+    'ogg': 'libvorbis',
+    'opus': 'libopus',
+    'ac3': 'ac3',
+}
+
+
+# Channel counts of the channel settings
+AUDIO_CHANNEL_COUNTS = {'mono': 1, 'stereo': 2}
+
+# How far a requested bitrate may be from the source's for a stream copy
+AUDIO_COPY_BITRATE_TOLERANCE = 0.05
+
+# Probed source codecs each audio output format can hold without re-encoding
+AUDIO_COPY_CODECS = {
+    'mp3': ('mp3',),
+    'aac': ('aac',),
+    'm4a': ('aac', 'alac'),
+    'wav': ('pcm_s16le', 'pcm_s24le', 'pcm_f32le'),
+    'flac': ('flac',),
+    'ogg': ('vorbis', 'opus', 'flac'),
+    'opus': ('opus',),
+    'ac3': ('ac3',),
+}
+
+
+def with_defaults(operation, options):
+    """Fill in the settings an option dict leaves out"""
+    merged = dict(OPTION_DEFAULTS[operation])
+    merged.update(options)
+    return merged
+
+
+def require(options, keys, message):
+    """Return the stripped values of the given path options, or raise ValueError"""
+    values = [str(options.get(key) or '').strip() for key in keys]
+    if not all(values):
+        raise ValueError(message)
+    return values
+
+
+def ffprobe_path_for(ffmpeg_path):
+    """Find ffprobe next to an ffmpeg executable, falling back to PATH"""
+    if ffmpeg_path == 'ffmpeg':
+        return 'ffprobe'
+    ffprobe_path = os.path.join(os.path.dirname(ffmpeg_path), 'ffprobe.exe')
+    if not os.path.exists(ffprobe_path):
+        ffprobe_path = 'ffprobe'
+    return ffprobe_path
+
+
+# Command builders, one per GUI tab
+
+def build_convert_video_args(options):
+    """Video codec, quality, resolution and FPS arguments for conversion"""
+    options = with_defaults('convert', options)
+    args = []
+
+    # Video codec
+    vcodec = options['vcodec']
+    args.extend(['-c:v', vcodec])
+
+    # Quality settings (only if not copying)
+    if vcodec != 'copy':
+        # CRF
+        if vcodec in ['libx264', 'libx265']:
+            args.extend(['-crf', str(options['crf'])])
+
+        # Preset
+        if vcodec in ['libx264', 'libx265']:
+            args.extend(['-preset', options['preset']])
+
+        # Bitrate (if specified)
+        bitrate = str(options['vbitrate']).strip()
+        if bitrate:
+            args.extend(['-b:v', bitrate])
+
+    args.extend(convert_frame_args(options))
+    return args
+
+
+def convert_frame_args(options):
+    """Resolution and FPS arguments for conversion"""
+    options = with_defaults('convert', options)
+    args = []
+
+    # Resolution
+    if options['resize']:
+        width = str(options['width']).strip()
+        height = str(options['height']).strip()
+
+        if width and height:
+            args.extend(['-vf', f'scale={width}:{height}'])
+        elif width:
+            args.extend(['-vf', f'scale={width}:-2'])
+        elif height:
+            args.extend(['-vf', f'scale=-2:{height}'])
+        else:
+            # Use preset resolution
+            resolution = options['resolution']
+            if resolution != 'Custom':
+                args.extend(['-vf', f'scale={resolution}'])
+
+    # FPS
+    if options['fps']:
+        args.extend(['-r', str(options['fps_value'])])
+
+    return args
+
+
+def convert_custom_args(options):
+    """Extra FFmpeg arguments given for a conversion"""
+    custom_args = str(options.get('custom_args') or '').strip()
+    return custom_args.split() if custom_args else []
+
+
+def convert_paths(options):
+    """Validated (input, output) of a conversion"""
+    input_file, output_file = require(options, ['input', 'output'],
+                                      "Please specify both input and output files")
+    if not os.path.exists(input_file):
+        raise FileNotFoundError(f"Input file not found: {input_file}")
+    return input_file, output_file
+
+
+def build_convert_command(ffmpeg_path, options):
+    """FFmpeg command for a conversion"""
+    options = with_defaults('convert', options)
+    if options['target_enable']:
+        raise ValueError("Target size conversions run in two passes, see target_size_encode")
+    if options['renditions_enable']:
+        return build_renditions_command(ffmpeg_path, options)
+    input_file, output_file = convert_paths(options)
+
+    cmd = [ffmpeg_path, '-i', input_file]
+
+    # Hardware acceleration
+    if options['hw_accel']:
+        cmd.extend(['-hwaccel', 'auto'])
+
+    # Video codec, quality, resolution and FPS
+    cmd.extend(build_convert_video_args(options))
+
+    # Audio codec
+    cmd.extend(['-c:a', options['acodec']])
+
+    # Custom arguments
+    cmd.extend(convert_custom_args(options))
+
+    # Output file
+    cmd.extend(['-y', output_file])
+    return cmd
+
+
+def parse_renditions(text):
+    """[(width or None, height, bitrate or None)] from a list like '1080:5M, 1280x720, 480'"""
+    renditions = []
+    names = set()
+    for part in str(text).replace(';', ',').split(','):
+        size, _, bitrate = part.strip().partition(':')
+        size = size.strip().lower().rstrip('p')
+        if not size:
+            continue
+        try:
+            if 'x' in size:
+                width, height = size.split('x', 1)
+                width, height = int(width), int(height)
+            else:
+                width, height = None, int(size)
+        except ValueError:
+            raise ValueError(f"Invalid rendition: {part.strip()} "
+                             "(use a height like 720 or WxH like 1280x720, optionally :bitrate)")
+        # Each rendition needs a file name of its own
+        name = rendition_name(width, height)
+        if name in names:
+            raise ValueError(f"Rendition {name} is listed twice")
+        names.add(name)
+        renditions.append((width, height, bitrate.strip() or None))
+    if not renditions:
+        raise ValueError("Please specify at least one rendition")
+    return renditions
+
+
+def rendition_name(width, height):
+    """File name suffix of a rendition: 720p, or 1280x720 when the width is given"""
+    return f"{width}x{height}" if width else f"{height}p"
+
+
+def rendition_output(output_file, width, height):
+    """Output path of one rendition, e.g. movie.mp4 -> movie_720p.mp4 or movie_1280x720.mp4"""
+    base, ext = os.path.splitext(output_file)
+    return f"{base}_{rendition_name(width, height)}{ext}"
+
+
+def build_renditions_command(ffmpeg_path, options):
+    """One FFmpeg command encoding several sizes of a conversion.
+
+    The input is demuxed and decoded once; a split filter fans the frames
+    out to one scaler and encoder per rendition. A rendition without a
+    bitrate of its own uses the conversion's video bitrate (if any).
+    """
+    options = with_defaults('convert', options)
+    input_file, output_file = convert_paths(options)
+    renditions = parse_renditions(options['renditions'])
+    if options['vcodec'] == 'copy':
+        raise ValueError("Renditions need a video encoder, not 'copy'")
+
+    cmd = [ffmpeg_path]
+    if options['hw_accel']:
+        cmd.extend(['-hwaccel', 'auto'])
+    cmd.extend(['-i', input_file])
+
+    # [0:v]split=N[s0][s1]...;[s0]scale=...[v0];[s1]scale=...[v1]...
+    count = len(renditions)
+    graph = [f"[0:v]split={count}" + ''.join(f'[s{i}]' for i in range(count))]
+    for i, (width, height, _) in enumerate(renditions):
+        graph.append(f"[s{i}]scale={width or -2}:{height}[v{i}]")
+    cmd.extend(['-filter_complex', ';'.join(graph), '-y'])
+
+    # Codec, quality and FPS are shared; the scale comes from the graph
+    for i, (width, height, bitrate) in enumerate(renditions):
+        video_args = build_convert_video_args(dict(options, resize=False,
+                                                   vbitrate=bitrate or options['vbitrate']))
+        cmd.extend(['-map', f'[v{i}]', '-map', '0:a?'] + video_args)
+        cmd.extend(['-c:a', options['acodec']] + convert_custom_args(options))
+        cmd.append(rendition_output(output_file, width, height))
+    return cmd
+
+
+def chunked_settings(options):
+    """(input, output, parallel encodes, threads each, segment count or 0) of a chunked encode"""
+    options = with_defaults('convert', options)
+    input_file, output_file = convert_paths(options)
+    vcodec = options['vcodec']
+    if vcodec == 'copy':
+        raise ValueError("Chunked encode needs a video encoder, not 'copy'")
+    if options['renditions_enable']:
+        raise ValueError("Chunked encode and renditions can't be combined")
+    if options['target_enable']:
+        raise ValueError("Chunked encode and target size can't be combined")
+    if options['quality_enable']:
+        raise ValueError("Chunked encode and auto CRF can't be combined")
+
+    workers, threads = batch_concurrency(vcodec)
+    try:
+        segments = max(0, int(options['segments']))
+    except ValueError:
+        segments = 0
+    return input_file, output_file, workers, threads, segments
+
+
+def chunked_encode(ffmpeg_path, options, probe_cache, job, log=None):
+    """Split at keyframes, encode segments in parallel and concat them losslessly"""
+    import tempfile
+    import shutil
+
+    log = log or (lambda message: None)
+    options = with_defaults('convert', options)
+    input_file, output_file, workers, threads, segments = chunked_settings(options)
+    video_args = build_convert_video_args(options) + convert_custom_args(options)
+
+    started = time.monotonic()
+    temp_dir = tempfile.mkdtemp(prefix='ffgui_chunks_',
+                                dir=os.path.dirname(os.path.abspath(output_file)))
+    try:
+        # 1. Plan GOP-aligned split points
+        job.report(status="probing keyframes")
+        keyframes, duration = probe_cache.keyframes(input_file)
+        count = segments or min(workers * 2, int(duration // 10))
+        split_times = plan_segments(keyframes, duration, count)
+        log(f"Found {len(keyframes)} keyframes in {duration:.1f}s, "
+            f"splitting into {len(split_times) + 1} segment(s)")
+
+        # 2. Cut the video stream losslessly at those keyframes
+        source_pattern = os.path.join(temp_dir, 'source_%05d.mkv')
+        cut_cmd = [ffmpeg_path, '-i', input_file, '-map', '0:v:0', '-c', 'copy']
+        if split_times:
+            cut_cmd.extend(['-f', 'segment', '-reset_timestamps', '1',
+                            '-segment_times', ','.join(f'{t:.6f}' for t in split_times)])
+        else:
+            cut_cmd.extend(['-f', 'segment', '-segment_time', str(int(duration) + 1)])
+        cut_cmd.extend(['-y', source_pattern])
+        job.run_checked(cut_cmd)
+        sources = sorted(os.path.join(temp_dir, f) for f in os.listdir(temp_dir)
+                         if f.startswith('source_'))
+        cut_done = time.monotonic()
+
+        # 3. Encode the segments concurrently
+        encode_cmds = []
+        encoded = []
+        for source in sources:
+            target = source.replace('source_', 'encoded_')
+            cmd = [ffmpeg_path]
+            if options['hw_accel']:
+                cmd.extend(['-hwaccel', 'auto'])
+            cmd.extend(['-i', source] + video_args +
+                       ['-an', '-threads', str(threads), '-y', target])
+            encode_cmds.append(cmd)
+            encoded.append(target)
+
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            futures = [pool.submit(job.run_checked, cmd) for cmd in encode_cmds]
+            for finished, future in enumerate(as_completed(futures), 1):
+                future.result()
+                job.report(100.0 * finished / len(encode_cmds),
+                           f"encoded segment {finished}/{len(encode_cmds)}")
+        encode_done = time.monotonic()
+
+        # 4. Stitch the encoded video back together with the original audio
+        job.report(status="joining segments")
+        list_file = os.path.join(temp_dir, 'segments.txt')
+        write_concat_list(list_file, encoded)
+        job.run_checked([ffmpeg_path, '-f', 'concat', '-safe', '0', '-i', list_file,
+                         '-i', input_file, '-map', '0:v:0', '-map', '1:a?', '-c:v', 'copy',
+                         '-c:a', options['acodec'], '-y', output_file])
+        finished_at = time.monotonic()
+
+        elapsed = finished_at - started
+        log(f"✓ Chunked encode finished in {elapsed:.1f}s "
+            f"(cut {cut_done - started:.1f}s, encode {encode_done - cut_done:.1f}s, "
+            f"concat {finished_at - encode_done:.1f}s, "
+            f"{duration / elapsed if elapsed else 0:.2f}x realtime)")
+    finally:
+        shutil.rmtree(temp_dir, ignore_errors=True)
+
+
+def parse_target_sizes(text):
+    """Sizes in bytes from a list like '25MB, 50MB, 1GB', largest first"""
+    sizes = [parse_size(part) for part in str(text).replace(';', ',').split(',') if part.strip()]
+    if not sizes:
+        raise ValueError("Please specify at least one target size")
+    return sorted(set(sizes), reverse=True)
+
+
+def target_output(output_file, size, count):
+    """Output path for one target size, e.g. movie.mp4 -> movie_25MB.mp4 when there are several"""
+    if count == 1:
+        return output_file
+    base, ext = os.path.splitext(output_file)
+    label = f"{size / 1024 ** 2:g}MB" if size < 1024 ** 3 else f"{size / 1024 ** 3:g}GB"
+    return f"{base}_{label}{ext}"
+
+
+def target_audio_bitrate(options, info):
+    """Audio bitrate (bits/s) a target size has to leave room for"""
+    options = with_defaults('convert', options)
+    audio = first_stream(info, 'audio')
+    if not audio:
+        return 0
+    if options['acodec'] == 'copy':
+        # Stream copy keeps the source bitrate, which MKV sources often leave unset
+        return float(audio.get('bit_rate') or parse_bitrate(options['abitrate']))
+    return parse_bitrate(options['abitrate'])
+
+
+def target_video_bitrate(size, duration, audio_bitrate):
+    """Video bitrate (bits/s) that fills `size` bytes over `duration` seconds"""
+    if not duration:
+        raise ValueError("Target size needs the input duration, which could not be probed")
+    total = size * 8 * (1 - TARGET_SIZE_OVERHEAD) / duration
+    video = total - audio_bitrate
+    if video < TARGET_MIN_VIDEO_BITRATE:
+        raise ValueError(f"{format_size(size)} is too small for {format_duration(duration)} "
+                         f"of video with {audio_bitrate / 1000:.0f}k audio")
+    return int(video)
+
+
+def build_target_pass_command(ffmpeg_path, options, passlog, pass_number, bitrate,
+                              output_file=None, threads=None):
+    """FFmpeg command for one pass of a two-pass target size encode.
+
+    Pass 1 analyses the video only and writes its stats to `passlog`;
+    pass 2 reads them and writes `output_file` with the audio.
+    """
+    options = with_defaults('convert', options)
+    input_file, _ = convert_paths(options)
+    vcodec = options['vcodec']
+    if vcodec not in ('libx264', 'libx265'):
+        raise ValueError("Target size encoding needs libx264 or libx265")
+
+    cmd = [ffmpeg_path]
+    if options['hw_accel']:
+        cmd.extend(['-hwaccel', 'auto'])
+    cmd.extend(['-i', input_file, '-c:v', vcodec, '-preset', options['preset'],
+                '-b:v', str(bitrate)])
+    if vcodec == 'libx265':
+        # x265-params splits on ':', so escape the drive colon of Windows paths
+        stats = passlog.replace('\\', '/').replace(':', '\\:')
+        cmd.extend(['-x265-params', f'pass={pass_number}:stats={stats}.log'])
+    else:
+        cmd.extend(['-pass', str(pass_number), '-passlogfile', passlog])
+    cmd.extend(convert_frame_args(options))
+    if threads:
+        cmd.extend(['-threads', str(threads)])
+
+    if pass_number == 1:
+        cmd.extend(['-an', '-f', 'null', '-y', os.devnull])
+        return cmd
+    cmd.extend(['-c:a', options['acodec']])
+    if options['acodec'] != 'copy':
+        cmd.extend(['-b:a', str(options['abitrate'])])
+    cmd.extend(convert_custom_args(options))
+    cmd.extend(['-y', output_file])
+    return cmd
+
+
+def build_target_size_commands(ffmpeg_path, options, info, passlog, threads=None):
+    """(first pass, [(size, output, second pass)]) of a target size encode.
+
+    All target sizes share the first pass: its stats describe the
+    content, not the bitrate, so only the cheaper second pass runs per
+    size. The first pass is run at the largest bitrate with all threads;
+    `threads` limits each second pass so several can run side by side.
+    """
+    options = with_defaults('convert', options)
+    _, output_file = convert_paths(options)
+    if options['renditions_enable']:
+        raise ValueError("Target size and renditions can't be combined")
+    sizes = parse_target_sizes(options['target_sizes'])
+    duration = probe_duration(info)
+    audio_bitrate = target_audio_bitrate(options, info)
+    bitrates = [target_video_bitrate(size, duration, audio_bitrate) for size in sizes]
+
+    first_pass = build_target_pass_command(ffmpeg_path, options, passlog, 1, bitrates[0])
+    second_passes = []
+    for size, bitrate in zip(sizes, bitrates):
+        output = target_output(output_file, size, len(sizes))
+        second_passes.append((size, output, build_target_pass_command(
+            ffmpeg_path, options, passlog, 2, bitrate, output, threads)))
+    return first_pass, second_passes
+
+
+def target_size_encode(ffmpeg_path, options, probe_cache, job, log=None):
+    """Two-pass encode of a conversion into one or more target file sizes.
+
+    The bitrate comes from the cached probe duration and the audio
+    bitrate. The second passes of several sizes run in parallel, and
+    each output's achieved size is logged against its target.
+    """
+    import tempfile
+    import shutil
+
+    log = log or (lambda message: None)
+    options = with_defaults('convert', options)
+    input_file, output_file = convert_paths(options)
+    info = probe_cache.probe(input_file)
+    duration = probe_duration(info)
+    workers, threads = batch_concurrency(options['vcodec'])
+    if len(parse_target_sizes(options['target_sizes'])) == 1:
+        threads = None
+
+    temp_dir = tempfile.mkdtemp(prefix='ffgui_2pass_',
+                                dir=os.path.dirname(os.path.abspath(output_file)))
+    try:
+        passlog = os.path.join(temp_dir, 'passlog')
+        first_pass, second_passes = build_target_size_commands(ffmpeg_path, options, info,
+                                                               passlog, threads)
+        steps = len(second_passes) + 1
+
+        job.report(0.0, "pass 1")
+        job.run_ffmpeg(first_pass, duration, log,
+                       lambda report, seconds: job.report(report.percent(seconds) / steps))
+
+        if len(second_passes) == 1:
+            job.report(status="pass 2")
+            job.run_ffmpeg(second_passes[0][2], duration, log,
+                           lambda report, seconds: job.report((100 + report.percent(seconds)) / steps))
+        else:
+            log(f"Target size: {len(second_passes)} second passes sharing one first pass")
+            with ThreadPoolExecutor(max_workers=min(workers, len(second_passes))) as pool:
+                futures = [pool.submit(job.run_checked, cmd) for _, _, cmd in second_passes]
+                for finished, future in enumerate(as_completed(futures), 1):
+                    future.result()
+                    job.report(100.0 * (finished + 1) / steps,
+                               f"pass 2: {finished}/{len(second_passes)} sizes")
+    finally:
+        shutil.rmtree(temp_dir, ignore_errors=True)
+
+    results = []
+    for size, output, _ in second_passes:
+        achieved = os.path.getsize(output)
+        mark = '✓' if achieved <= size else '✗'
+        log(f"{mark} Target {format_size(size)}: {format_size(achieved)} "
+            f"({100.0 * achieved / size:.1f}%) - {output}")
+        results.append((size, output, achieved))
+    return results
+
+
+def quality_settings(metric, target):
+    """Validated (metric, target score) of a CRF search"""
+    metric = str(metric).lower()
+    try:
+        target = float(target)
+    except ValueError:
+        raise ValueError(f"Invalid quality target: {target}")
+    if metric == 'ssim' and not 0 < target < 1:
+        raise ValueError("SSIM targets lie between 0 and 1, e.g. 0.98")
+    if metric == 'psnr' and target <= 1:
+        raise ValueError("PSNR targets are in dB, e.g. 42")
+    if metric not in ('ssim', 'psnr'):
+        raise ValueError(f"Unknown quality metric: {metric}")
+    return metric, target
+
+
+def plan_sample_windows(duration, count=CRF_SAMPLE_WINDOWS, seconds=CRF_SAMPLE_SECONDS):
+    """[(start, length)] of evenly spread sample windows, the whole file if it is short"""
+    if not duration or duration <= count * seconds:
+        return [(0.0, duration or seconds)]
+    return [(max(0.0, duration * (index + 0.5) / count - seconds / 2), seconds)
+            for index in range(count)]
+
+
+def build_sample_reference_command(ffmpeg_path, input_file, start, seconds, frame_args, output_file):
+    """FFmpeg command cutting a sample window into a lossless reference clip.
+
+    The conversion's resolution and FPS are applied here, so candidate
+    encodes and the quality metric all work on the output frames.
+    """
+    return ([ffmpeg_path, '-ss', f'{start:.3f}', '-t', f'{seconds:.3f}', '-i', input_file,
+             '-map', '0:v:0'] + list(frame_args) + ['-c:v', 'ffv1', '-an', '-y', output_file])
+
+
+def build_sample_encode_command(ffmpeg_path, reference, vcodec, preset, crf, output_file, threads=None):
+    """FFmpeg command encoding a reference clip at one candidate CRF"""
+    cmd = [ffmpeg_path, '-i', reference, '-c:v', vcodec, '-preset', preset, '-crf', str(crf)]
+    if threads:
+        cmd.extend(['-threads', str(threads)])
+    return cmd + ['-an', '-y', output_file]
+
+
+def build_quality_command(ffmpeg_path, encoded, reference, metric):
+    """FFmpeg command measuring SSIM or PSNR of an encode against its reference"""
+    return [ffmpeg_path, '-i', encoded, '-i', reference,
+            '-lavfi', f'[0:v][1:v]{metric}', '-f', 'null', '-']
+
+
+def parse_quality(lines, metric):
+    """Overall score from the summary line the ssim or psnr filter prints"""
+    pattern = r'SSIM .*All:([\d.]+)' if metric == 'ssim' else r'PSNR .*average:([\d.]+|inf)'
+    for line in reversed(lines):
+        match = re.search(pattern, line)
+        if match:
+            # Identical frames give an infinite PSNR
+            return 100.0 if match.group(1) == 'inf' else float(match.group(1))
+    raise RuntimeError(f"{metric} printed no score")
+
+
+def search_crf(low, high, target, measure, candidates=1):
+    """(highest CRF in [low, high] scoring at least target or None, {crf: score}).
+
+    measure(crfs) scores several CRFs at once, so each round can try
+    `candidates` CRFs in parallel; with one it is a binary search. The
+    score is assumed to fall as the CRF rises.
+    """
+    scores = {}
+    best = None
+    while low <= high:
+        count = min(candidates, high - low + 1)
+        step = (high - low + 1) / (count + 1)
+        crfs = sorted({low + int(step * (index + 1)) for index in range(count)})
+        scores.update(measure(crfs))
+
+        passing = [crf for crf in crfs if scores[crf] >= target]
+        if passing:
+            best = max(passing)
+            low = best + 1
+        failing = [crf for crf in crfs if scores[crf] < target and (best is None or crf > best)]
+        if failing:
+            high = min(failing) - 1
+    return best, scores
+
+
+def find_crf(ffmpeg_path, input_file, duration, vcodec, preset, frame_args, metric, target,
+             run, log=None):
+    """Search the CRF an input needs to reach a quality target.
+
+    Sample windows are cut once into lossless references; every round
+    encodes them at the candidate CRFs in parallel and scores each CRF
+    by its worst window, so hard scenes are not starved. run(cmd) runs
+    an FFmpeg command and returns its output lines.
+    """
+    import tempfile
+    import shutil
+
+    log = log or (lambda message: None)
+    if vcodec not in CRF_SEARCH_RANGE:
+        raise ValueError("CRF search needs libx264 or libx265")
+    windows = plan_sample_windows(duration)
+    workers, threads = batch_concurrency(vcodec)
+    candidates = max(1, min(3, workers // len(windows)))
+
+    temp_dir = tempfile.mkdtemp(prefix='ffgui_crf_')
+    try:
+        references = [os.path.join(temp_dir, f'reference_{index}.mkv') for index in range(len(windows))]
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            list(pool.map(run, [build_sample_reference_command(ffmpeg_path, input_file, start, seconds,
+                                                               frame_args, reference)
+                                for (start, seconds), reference in zip(windows, references)]))
+
+            def score(crf, index):
+                encoded = os.path.join(temp_dir, f'sample_{index}_crf{crf}.mkv')
+                run(build_sample_encode_command(ffmpeg_path, references[index], vcodec, preset,
+                                                crf, encoded, threads))
+                lines = run(build_quality_command(ffmpeg_path, encoded, references[index], metric))
+                os.remove(encoded)
+                return parse_quality(lines, metric)
+
+            def measure(crfs):
+                tasks = [(crf, index) for crf in crfs for index in range(len(windows))]
+                results = list(pool.map(lambda task: score(*task), tasks))
+                scores = {crf: min(result for (task_crf, _), result in zip(tasks, results)
+                                   if task_crf == crf) for crf in crfs}
+                log("CRF search: " + ', '.join(f"CRF {crf} = {scores[crf]:.4g} {metric}"
+                                               for crf in crfs))
+                return scores
+
+            low, high = CRF_SEARCH_RANGE[vcodec]
+            crf, scores = search_crf(low, high, target, measure, candidates)
+    finally:
+        shutil.rmtree(temp_dir, ignore_errors=True)
+
+    if crf is None:
+        # Even the best CRF searched misses the target; it is still the closest
+        crf = low
+    return {'crf': crf, 'score': scores[crf], 'reached': scores[crf] >= target}
+
+
+def cached_crf(ffmpeg_path, probe_cache, input_file, vcodec, preset, frame_args, metric, target,
+               run, log=None):
+    """find_crf result of a file, cached in the probe cache per encoder and quality target"""
+    metric, target = quality_settings(metric, target)
+    kind = ' '.join(['crf', vcodec, preset, metric, f'{target:g}'] + list(frame_args))
+    return probe_cache.get(input_file, kind, lambda path: find_crf(
+        ffmpeg_path, path, probe_cache.duration(path), vcodec, preset, frame_args, metric, target,
+        run, log))
+
+
+def convert_crf(ffmpeg_path, options, probe_cache, run, log=None):
+    """cached_crf of a conversion's input, codec, preset, frame settings and quality target"""
+    options = with_defaults('convert', options)
+    input_file, _ = convert_paths(options)
+    return cached_crf(ffmpeg_path, probe_cache, input_file, options['vcodec'], options['preset'],
+                      convert_frame_args(options), options['quality_metric'],
+                      options['quality_target'], run, log)
+
+
+def trim_settings(options):
+    """(input, output, start seconds, length seconds or None) of a trim"""
+    options = with_defaults('trim', options)
+    input_file, output_file = require(options, ['input', 'output'],
+                                      "Please specify both input and output files")
+
+    start_time = str(options['start']).strip()
+    start = parse_time(start_time) if start_time else 0.0
+
+    # Duration or end time
+    length = None
+    if options['mode'] == "duration":
+        duration = str(options['duration']).strip()
+        if duration:
+            length = parse_time(duration)
+    else:
+        end_time = str(options['end']).strip()
+        if end_time:
+            length = parse_time(end_time) - start
+            if length <= 0:
+                raise ValueError("End time must be after start time")
+
+    return input_file, output_file, start, length
+
+
+def build_trim_command(ffmpeg_path, options, keyframes=None):
+    """FFmpeg command for a trim; keyframes lets stream copy start on one"""
+    options = with_defaults('trim', options)
+    input_file, output_file, start, length = trim_settings(options)
+
+    if options['reencode']:
+        # Input seeking is frame accurate when re-encoding
+        seek = start
+    else:
+        # Stream copy starts on a keyframe, so seek to the one before the
+        # start time and keep the end where it was asked for
+        seek = keyframe_at_or_before(keyframes, start) if keyframes else start
+        if length is not None:
+            length += start - seek
+
+    # Seek before -i so FFmpeg jumps to the start instead of decoding up to it
+    cmd = [ffmpeg_path]
+    if seek > 0:
+        cmd.extend(['-ss', f'{seek:.3f}'])
+    cmd.extend(['-i', input_file])
+    if length is not None:
+        cmd.extend(['-t', f'{length:.3f}'])
+
+    # Re-encode or copy
+    if options['reencode']:
+        cmd.extend(['-c:v', 'libx264', '-c:a', 'aac'])
+    else:
+        cmd.extend(['-c', 'copy'])
+
+    cmd.extend(['-y', output_file])
+    return cmd
+
+
+# Stream parameters the re-encoded parts of a smart cut must share with the source
+SMART_CUT_KEYS = ('codec_name', 'profile', 'level', 'width', 'height', 'pix_fmt')
+
+# Sample entries that allow parameter sets inside the stream, for MP4/MOV outputs
+IN_BAND_TAGS = {'h264': 'avc3', 'hevc': 'hev1'}
+
+
+def smart_cut_encoder_args(video):
+    """Encoder arguments reproducing the profile, level and pixel format of a probed stream.
+
+    Parameter sets are repeated at every keyframe, so each part carries
+    its own SPS/PPS into the join.
+    """
+    codec = video.get('codec_name')
+    encoder = {'h264': 'libx264', 'hevc': 'libx265'}.get(codec)
+    if encoder is None:
+        raise ValueError("Smart cut supports H.264 and HEVC sources, "
+                         "use Re-encode for other codecs")
+    args = ['-c:v', encoder, '-crf', '18', '-preset', 'medium',
+            '-pix_fmt', video.get('pix_fmt', 'yuv420p')]
+    profile = encoder_profile(video.get('profile'))
+    if profile:
+        args.extend(['-profile:v', profile])
+    level = video.get('level') or 0
+    if encoder == 'libx264':
+        if level > 0:
+            # ffprobe reports H.264 levels times ten (40 = 4.0)
+            args.extend(['-level', f'{level / 10:.1f}'])
+        args.extend(['-x264-params', 'repeat-headers=1'])
+    else:
+        params = ['repeat-headers=1']
+        if level > 0:
+            # and HEVC levels times thirty (120 = 4.0)
+            params.append(f'level-idc={level / 30:.1f}')
+        args.extend(['-x265-params', ':'.join(params)])
+    return args
+
+
+def smart_cut(ffmpeg_path, options, probe_cache, job, log=None):
+    """Frame-accurate trim: re-encode the boundary parts, stream copy the rest and join them.
+
+    The boundary parts are encoded with the source's profile, level and
+    pixel format. If a part still comes out with other stream
+    parameters, joining would produce an undecodable file, so the whole
+    range is re-encoded instead.
+    """
+    import tempfile
+    import shutil
+
+    log = log or (lambda message: None)
+    input_file, output_file, start, length = trim_settings(options)
+
+    job.report(status="indexing keyframes")
+    keyframes, duration = probe_cache.keyframes(input_file)
+    end = min(start + length, duration) if length is not None else duration
+    if end <= start:
+        raise ValueError("Start time is beyond the end of the video")
+
+    video = first_stream(probe_cache.probe(input_file), 'video') or {}
+    encoder_args = smart_cut_encoder_args(video)
+    output_args = ['-map', '0:v:0', '-map', '1:a?', '-c', 'copy']
+    if os.path.splitext(output_file)[1].lower() in TIMESCALE_FORMATS:
+        # Later parts bring their own parameter sets, which avc1/hvc1 don't allow
+        output_args.extend(['-tag:v', IN_BAND_TAGS[video['codec_name']]])
+
+    parts = plan_smart_cut(keyframes, start, end)
+    copied = sum(b - a for kind, a, b in parts if kind == 'copy')
+    log(f"Starting smart cut: {start:.3f}s - {end:.3f}s "
+        f"({copied:.1f}s stream copied, {end - start - copied:.1f}s re-encoded)")
+
+    temp_dir = tempfile.mkdtemp(prefix='ffgui_smartcut_',
+                                dir=os.path.dirname(os.path.abspath(output_file)))
+    try:
+        # MPEG-TS (Annex B) parts carry their parameter sets in-band, so
+        # re-encoded and copied parts can be joined without a decoder reset
+        part_files = []
+        for index, (kind, part_start, part_end) in enumerate(parts):
+            job.report(100.0 * index / (len(parts) + 1), f"part {index + 1}/{len(parts)}")
+            part_file = os.path.join(temp_dir, f'part_{index:02d}.ts')
+            cmd = [ffmpeg_path, '-ss', f'{part_start:.6f}', '-i', input_file,
+                   '-t', f'{part_end - part_start:.6f}', '-map', '0:v:0', '-an']
+            if kind == 'copy':
+                cmd.extend(['-c:v', 'copy'])
+            else:
+                cmd.extend(encoder_args)
+            cmd.extend(['-y', part_file])
+            job.run_checked(cmd)
+            part_files.append(part_file)
+
+            if kind == 'encode':
+                encoded = first_stream(run_ffprobe(probe_cache.ffprobe_path, part_file), 'video') or {}
+                mismatched = [key for key in SMART_CUT_KEYS if encoded.get(key) != video.get(key)]
+                if mismatched:
+                    log(f"Smart cut: re-encoded part differs from the source in "
+                        f"{', '.join(mismatched)}, re-encoding the whole range")
+                    job.report(status="re-encoding")
+                    job.run_checked([ffmpeg_path, '-ss', f'{start:.6f}', '-i', input_file,
+                                     '-t', f'{end - start:.6f}', '-map', '0:v:0', '-map', '0:a?']
+                                    + encoder_args + ['-c:a', 'copy', '-y', output_file])
+                    return
+
+        job.report(status="joining parts")
+        list_file = os.path.join(temp_dir, 'parts.txt')
+        write_concat_list(list_file, part_files)
+        job.run_checked([ffmpeg_path, '-f', 'concat', '-safe', '0', '-i', list_file,
+                         '-ss', f'{start:.6f}', '-t', f'{end - start:.6f}', '-i', input_file]
+                        + output_args + ['-y', output_file])
+    finally:
+        shutil.rmtree(temp_dir, ignore_errors=True)
+
+
+def build_merge_command(ffmpeg_path, options, list_file):
+    """FFmpeg command for merging; writes the concat list to list_file"""
+    options = with_defaults('merge', options)
+    if len(options['files']) < 2:
+        raise ValueError("Please add at least 2 files to merge")
+    output_file, = require(options, ['output'], "Please specify output file")
+
+    write_concat_list(list_file, options['files'])
+    cmd = [ffmpeg_path, '-f', 'concat', '-safe', '0', '-i', list_file]
+
+    if options['reencode']:
+        cmd.extend(['-c:v', 'libx264', '-c:a', 'aac'])
+    else:
+        cmd.extend(['-c', 'copy'])
+
+    cmd.extend(['-y', output_file])
+    return cmd
+
+
+# Encoders that reproduce a probed codec when a merge input has to be
+# re-encoded to match the others
+MERGE_VIDEO_ENCODERS = {
+    'h264': 'libx264', 'hevc': 'libx265', 'vp9': 'libvpx-vp9', 'vp8': 'libvpx',
+    'av1': 'libaom-av1', 'mpeg4': 'mpeg4', 'mpeg2video': 'mpeg2video',
+}
+AUDIO_ENCODERS = {
+    'aac': 'aac', 'mp3': 'libmp3lame', 'opus': 'libopus', 'vorbis': 'libvorbis',
+    'ac3': 'ac3', 'flac': 'flac', 'pcm_s16le': 'pcm_s16le',
+}
+ENCODER_PROFILES = {'baseline', 'main', 'high', 'high10', 'high422', 'high444', 'main10'}
+CHANNEL_LAYOUTS = {1: 'mono', 2: 'stereo', 6: '5.1', 8: '7.1'}
+TIMESCALE_FORMATS = ('.mp4', '.m4v', '.mov')
+
+
+def encoder_profile(profile):
+    """x264/x265 profile name of a probed profile, None if the encoders lack it"""
+    # ffprobe says 'High 10', the encoders want 'high10'
+    profile = re.sub(r'constrained |[ :]', '', (profile or '').lower())
+    return profile if profile in ENCODER_PROFILES else None
+
+
+def merge_signature(info):
+    """Stream parameters that have to match for a lossless concat.
+
+    Returns (video, audio) tuples; audio is None for inputs without sound.
+    """
+    video = first_stream(info, 'video') or {}
+    audio = first_stream(info, 'audio')
+    video_key = (video.get('codec_name'), video.get('profile'), video.get('width'),
+                 video.get('height'), video.get('pix_fmt'), video.get('r_frame_rate'),
+                 video.get('time_base'))
+    audio_key = None
+    if audio:
+        audio_key = (audio.get('codec_name'), audio.get('sample_rate'), audio.get('channels'))
+    return video_key, audio_key
+
+
+def plan_merge(infos):
+    """Return (target signature, indexes of the inputs that don't match it).
+
+    The target is the signature most inputs share; ties go to the group
+    with the longest total duration so the least footage gets re-encoded.
+    """
+    groups = OrderedDict()
+    for index, info in enumerate(infos):
+        groups.setdefault(merge_signature(info), []).append(index)
+
+    def weight(group):
+        return len(group[1]), sum(probe_duration(infos[i]) or 0 for i in group[1])
+
+    target, members = max(groups.items(), key=weight)
+    outliers = [i for i in range(len(infos)) if i not in members]
+    return target, outliers
+
+
+def build_normalize_command(ffmpeg_path, input_file, info, target, output_file, threads=None):
+    """FFmpeg command re-encoding one merge input to the target signature"""
+    (vcodec, profile, width, height, pix_fmt, frame_rate, time_base), audio = target
+    encoder = MERGE_VIDEO_ENCODERS.get(vcodec)
+    if encoder is None or not width or not height:
+        raise ValueError(f"Can't re-encode to match {vcodec or 'unknown'} video, "
+                         "enable Re-encode to convert all inputs")
+
+    has_audio = first_stream(info, 'audio') is not None
+    cmd = [ffmpeg_path, '-i', input_file]
+    if audio and not has_audio:
+        # Silent track so the concatenated audio stays in sync
+        layout = CHANNEL_LAYOUTS.get(audio[2], 'stereo')
+        cmd.extend(['-f', 'lavfi', '-i', f'anullsrc=r={audio[1]}:cl={layout}'])
+
+    # Letterbox instead of stretching when the aspect ratio differs
+    filters = [f"scale={width}:{height}:force_original_aspect_ratio=decrease",
+               f"pad={width}:{height}:(ow-iw)/2:(oh-ih)/2", "setsar=1"]
+    if frame_rate and frame_rate != '0/0':
+        filters.append(f"fps={frame_rate}")
+    if pix_fmt:
+        filters.append(f"format={pix_fmt}")
+    cmd.extend(['-map', '0:v:0', '-vf', ','.join(filters), '-c:v', encoder])
+    if encoder in ('libx264', 'libx265'):
+        cmd.extend(['-crf', '18', '-preset', 'fast'])
+        profile = encoder_profile(profile)
+        if profile:
+            cmd.extend(['-profile:v', profile])
+
+    if audio:
+        acodec, sample_rate, channels = audio
+        if acodec not in AUDIO_ENCODERS:
+            raise ValueError(f"Can't re-encode to match {acodec} audio, "
+                             "enable Re-encode to convert all inputs")
+        cmd.extend(['-map', '0:a:0' if has_audio else '1:a:0',
+                    '-c:a', AUDIO_ENCODERS[acodec]])
+        if sample_rate:
+            cmd.extend(['-ar', str(sample_rate)])
+        if channels:
+            cmd.extend(['-ac', str(channels)])
+        if not has_audio:
+            cmd.append('-shortest')
+    else:
+        cmd.append('-an')
+
+    # Same timescale as the untouched inputs so timestamps line up after concat
+    if time_base and os.path.splitext(output_file)[1].lower() in TIMESCALE_FORMATS:
+        cmd.extend(['-video_track_timescale', time_base.split('/')[-1]])
+    if threads:
+        cmd.extend(['-threads', str(threads)])
+    cmd.extend(['-y', output_file])
+    return cmd
+
+
+def reencode_target(target, infos):
+    """Target signature for re-encoding every merge input to H.264/AAC"""
+    (vcodec, profile, width, height, pix_fmt, frame_rate, time_base), audio = target
+    if audio is None and any(first_stream(info, 'audio') for info in infos):
+        audio = ('aac', '48000', 2)
+    elif audio is not None:
+        audio = ('aac',) + tuple(audio[1:])
+    return ('h264', None, width, height, pix_fmt, frame_rate, time_base), audio
+
+
+def smart_merge_enabled(options):
+    """Whether merge options ask for smart_merge rather than one concat command"""
+    options = with_defaults('merge', options)
+    return options['analyze'] or options['reencode']
+
+
+def smart_merge(ffmpeg_path, files, output_file, probe_cache, job, log=None,
+                reencode=False, cache=None):
+    """Merge files by stream copy, re-encoding only the inputs that differ.
+
+    Inputs are probed and grouped by merge_signature; the ones outside the
+    majority group (or all of them with reencode, to H.264/AAC) are
+    normalized to match it several at a time into the segment cache, then
+    the concat demuxer joins everything losslessly.
+    """
+    import tempfile
+    import shutil
+
+    log = log or (lambda message: None)
+    if len(files) < 2:
+        raise ValueError("Please add at least 2 files to merge")
+
+    job.report(status="probing inputs")
+    with ThreadPoolExecutor(max_workers=PROBE_WORKERS) as pool:
+        infos = list(pool.map(probe_cache.probe, files))
+    target, outliers = plan_merge(infos)
+    if reencode:
+        target = reencode_target(target, infos)
+        outliers = list(range(len(files)))
+        log(f"Merge: re-encoding all {len(files)} inputs to h264 {target[0][2]}x{target[0][3]}")
+    else:
+        log(f"Merge: {len(files) - len(outliers)} of {len(files)} input(s) match "
+            f"{target[0][0]} {target[0][2]}x{target[0][3]}, re-encoding {len(outliers)}")
+
+    cache = cache or OutputCache(*SEGMENT_CACHE)
+    temp_dir = tempfile.mkdtemp(prefix='ffgui_merge_',
+                                dir=os.path.dirname(os.path.abspath(output_file)))
+    try:
+        parts = list(files)
+        if outliers:
+            extension = os.path.splitext(output_file)[1] or '.mkv'
+            workers, threads = batch_concurrency(MERGE_VIDEO_ENCODERS.get(target[0][0], ''))
+            pending = []
+            for index in outliers:
+                cmd = build_normalize_command(ffmpeg_path, files[index], infos[index], target,
+                                              f'normalized{extension}', threads)
+                parts[index] = cache.path(files[index], cmd)
+                if not cache.lookup(parts[index]):
+                    pending.append((files[index], cmd))
+            if len(pending) < len(outliers):
+                log(f"Reusing {len(outliers) - len(pending)} cached normalized input(s)")
+
+            if pending:
+                with ThreadPoolExecutor(max_workers=min(workers, len(pending))) as pool:
+                    futures = [pool.submit(cache.encode, job.run_checked, input_file, cmd)
+                               for input_file, cmd in pending]
+                    for finished, future in enumerate(as_completed(futures), 1):
+                        future.result()
+                        job.report(100.0 * finished / (len(pending) + 1),
+                                   f"normalized {finished}/{len(pending)} input(s)")
+
+        job.report(status="joining")
+        list_file = os.path.join(temp_dir, 'inputs.txt')
+        write_concat_list(list_file, parts)
+        job.run_checked([ffmpeg_path, '-f', 'concat', '-safe', '0', '-i', list_file,
+                         '-c', 'copy', '-y', output_file])
+        job.report(100.0, "done")
+    finally:
+        shutil.rmtree(temp_dir, ignore_errors=True)
+        cache.prune(keep=parts)
+
+
+def filter_chain(options):
+    """Video filters of the Filters tab settings, in order.
+
+    Settings at their neutral value add no filter, so an empty list
+    means the picture is left unchanged.
+    """
+    options = with_defaults('filter', options)
+    filters = []
+
+    # Rotation
+    rotate = str(options['rotate'])
+    if rotate != "none":
+        if rotate == "90":
+            filters.append("transpose=1")
+        elif rotate == "270":
+            filters.append("transpose=2")
+        elif rotate == "180":
+            filters.extend(["transpose=1", "transpose=1"])
+
+    # Flip
+    if options['hflip']:
+        filters.append("hflip")
+    if options['vflip']:
+        filters.append("vflip")
+
+    # Speed
+    speed = float(options['speed'])
+    if speed != 1.0:
+        filters.append(f"setpts={1/speed}*PTS")
+
+    # Brightness/Contrast/Saturation
+    brightness = float(options['brightness'])
+    contrast = float(options['contrast'])
+    saturation = float(options['saturation'])
+    if brightness != 0 or contrast != 1.0 or saturation != 1.0:
+        filters.append(f"eq=brightness={brightness}:contrast={contrast}:saturation={saturation}")
+
+    # Blur (a zero radius leaves the frames as they are)
+    if options['blur'] and float(options['blur_radius']) > 0:
+        radius = options['blur_radius']
+        filters.append(f"boxblur={radius}:{radius}")
+
+    # Resize (to a height, keeping the aspect ratio)
+    if str(options['scale']) not in ('', 'none'):
+        filters.append(f"scale=-2:{options['scale']}")
+
+    return filters
+
+
+# Rotations and flips as 2x2 matrices acting on (x, y) with y pointing down,
+# and the cheapest filters producing each of the eight possible transforms
+GEOMETRIC_FILTERS = {
+    'hflip': ((-1, 0), (0, 1)),
+    'vflip': ((1, 0), (0, -1)),
+    'transpose=0': ((0, 1), (1, 0)),
+    'transpose=1': ((0, -1), (1, 0)),
+    'transpose=2': ((0, 1), (-1, 0)),
+    'transpose=3': ((0, -1), (-1, 0)),
+}
+MINIMAL_TRANSFORMS = {
+    ((1, 0), (0, 1)): [],
+    ((-1, 0), (0, -1)): ['hflip', 'vflip'],
+}
+for _name, _matrix in GEOMETRIC_FILTERS.items():
+    MINIMAL_TRANSFORMS[_matrix] = [_name]
+
+# Filters that work on each pixel (or only on timestamps) on their own, so a
+# downscale gives the same picture (up to rounding) whether it runs before
+# or after them. Blurs are not among them: their radius is in pixels.
+POINTWISE_FILTERS = ('eq', 'hue', 'setpts', 'format', 'colorchannelmixer')
+
+
+def _matmul(a, b):
+    return tuple(tuple(sum(a[i][k] * b[k][j] for k in range(2)) for j in range(2)) for i in range(2))
+
+
+def _scale_size(arguments, size):
+    """Output size of scale=W:H for an input size, or None if unknown"""
+    try:
+        width, height = (float(value) for value in arguments.split(':')[:2])
+    except ValueError:
+        return None
+    in_width, in_height = size
+    if width < 0 and height < 0:
+        return size
+    # -n keeps the aspect ratio and rounds to a multiple of n, as FFmpeg does
+    if width < 0:
+        width = int(in_width * height / (in_height * -width) + 0.5) * -width
+    elif height < 0:
+        height = int(in_height * width / (in_width * -height) + 0.5) * -height
+    return width, height
+
+
+def optimize_filter_chain(filters, source_size=None):
+    """Cheaper video filter chain producing the same picture.
+
+    - Runs of rotations/flips collapse into the one transform they amount
+      to, e.g. transpose=1,transpose=1 becomes hflip,vflip, and vanish
+      when they cancel out.
+    - With source_size (width, height, see frame_size) known, scales to
+      the size the frames already have are dropped and a downscale moves
+      ahead of pointwise filters, so those run on fewer pixels.
+
+    An empty result means the video can be stream copied.
+    """
+    # 1. Collapse geometric runs
+    collapsed = []
+    matrix = None
+    for item in list(filters) + [None]:
+        if item in GEOMETRIC_FILTERS:
+            current = matrix or ((1, 0), (0, 1))
+            matrix = _matmul(GEOMETRIC_FILTERS[item], current)
+            continue
+        if matrix is not None:
+            collapsed.extend(MINIMAL_TRANSFORMS[matrix])
+            matrix = None
+        if item is not None:
+            collapsed.append(item)
+
+    chain = collapsed
+
+    # 2. Hoist downscales ahead of the per-pixel work
+    if source_size:
+        size = source_size
+        sizes = []
+        for item in chain:
+            sizes.append(size)
+            name, _, arguments = item.partition('=')
+            if item in GEOMETRIC_FILTERS and GEOMETRIC_FILTERS[item][0][0] == 0:
+                size = (size[1], size[0])
+            elif name == 'scale':
+                size = _scale_size(arguments, size) or size
+
+        for index in range(len(chain)):
+            name, _, arguments = chain[index].partition('=')
+            if name != 'scale':
+                continue
+            scaled = _scale_size(arguments, sizes[index])
+            if scaled is None:
+                continue
+            if scaled == sizes[index]:
+                # Scaling to the size it already has
+                chain[index] = None
+                continue
+            factor = min(scaled[0] / sizes[index][0], scaled[1] / sizes[index][1])
+            if factor >= 1:
+                continue
+
+            position = index
+            while position > 0 and (chain[position - 1] is None or
+                                    chain[position - 1].partition('=')[0] in POINTWISE_FILTERS):
+                position -= 1
+            if position < index:
+                chain[position:index + 1] = [chain[index]] + chain[position:index]
+        chain = [item for item in chain if item is not None]
+
+    return chain
+
+
+def benchmark_filter_chains(ffmpeg_path, input_file, chains, seconds=10, run=None):
+    """Time decoding the first seconds of a file through each filter chain.
+
+    chains is a list of (label, filters); returns [(label, filters, elapsed)].
+    Output goes to the null muxer, so only decoding and filtering are timed.
+    run(cmd) runs a command to completion and raises on failure.
+    """
+    def run_command(cmd):
+        result = subprocess.run(cmd, capture_output=True, text=True,
+                                creationflags=subprocess.CREATE_NO_WINDOW if os.name == 'nt' else 0)
+        if result.returncode != 0:
+            raise RuntimeError(f"FFmpeg failed with code {result.returncode}:\n{result.stderr[-500:]}")
+
+    run = run or run_command
+    results = []
+    for label, filters in chains:
+        cmd = [ffmpeg_path, '-t', str(seconds), '-i', input_file, '-an']
+        if filters:
+            cmd.extend(['-vf', ','.join(filters)])
+        cmd.extend(['-f', 'null', '-'])
+        started = time.monotonic()
+        run(cmd)
+        results.append((label, filters, time.monotonic() - started))
+    return results
+
+
+def build_filter_command(ffmpeg_path, options, source_size=None):
+    """FFmpeg command applying the video filters"""
+    options = with_defaults('filter', options)
+    input_file, output_file = require(options, ['input', 'output'],
+                                      "Please specify both input and output files")
+
+    cmd = [ffmpeg_path, '-i', input_file]
+
+    filters = filter_chain(options)
+    if options['optimize']:
+        filters = optimize_filter_chain(filters, source_size)
+        if not filters:
+            # Nothing left to do to the picture, so don't re-encode it
+            cmd.extend(['-c', 'copy', '-y', output_file])
+            return cmd
+
+    # Apply filters
+    if filters:
+        cmd.extend(['-vf', ','.join(filters)])
+
+    cmd.extend(['-c:v', 'libx264', '-c:a', 'copy', '-y', output_file])
+    return cmd
+
+
+def audio_copy_compatible(output_format, codec, source_codec):
+    """Whether source audio can be remuxed into output_format as is.
+
+    codec is the requested encoder; 'auto' (or 'copy') accepts whatever the
+    format can hold, otherwise it has to be the source codec's own encoder.
+    """
+    if source_codec not in AUDIO_COPY_CODECS.get(output_format, ()):
+        return False
+    return codec in ('auto', 'copy') or codec == AUDIO_ENCODERS.get(source_codec)
+
+
+def audio_copy_matches(output_format, codec, bitrate, sample, channels, source):
+    """Whether a probed source audio stream can be remuxed for these settings.
+
+    Besides a codec that fits (audio_copy_compatible), the requested
+    sample rate and channels must be 'keep' or equal the source's, PCM
+    must already be in the encoder's sample format, and a lossy output's
+    bitrate must be within AUDIO_COPY_BITRATE_TOLERANCE of the source
+    bitrate.
+    """
+    if not source or not audio_copy_compatible(output_format, codec, source.get('codec_name')):
+        return False
+    if sample != 'keep' and str(sample) != str(source.get('sample_rate')):
+        return False
+    if channels != 'keep' and AUDIO_CHANNEL_COUNTS.get(channels) != source.get('channels'):
+        return False
+    encoder = AUDIO_FORMAT_CODECS.get(output_format) if codec in ('auto', 'copy') else codec
+    if encoder.startswith('pcm_'):
+        # The sample format is the codec, a copy would keep another one
+        return source.get('codec_name') == encoder
+    if encoder == 'flac':
+        return True
+    source_bitrate = float(source.get('bit_rate') or 0)
+    if not source_bitrate:
+        return False
+    return abs(parse_bitrate(bitrate) - source_bitrate) <= source_bitrate * AUDIO_COPY_BITRATE_TOLERANCE
+
+
+def audio_output_duration(options, source_duration):
+    """Length of the extracted audio given the source duration and trim settings"""
+    options = with_defaults('audio', options)
+    if source_duration is None or not options['trim_enable']:
+        return source_duration
+    start = parse_time(options['trim_start'] or 0)
+    remaining = max(0.0, source_duration - start)
+    if str(options['trim_duration']).strip():
+        return min(parse_time(options['trim_duration']), remaining)
+    return remaining
+
+
+def audio_fade_filters(fadein, fadeout, duration):
+    """afade filters for fade-in/out lengths in seconds (0 for none).
+
+    The fade-out needs the output duration to know where to start.
+    """
+    filters = []
+    if fadein:
+        filters.append(f"afade=t=in:st=0:d={fadein}")
+    if fadeout:
+        if duration is None:
+            raise ValueError("Fade out needs the input duration, but it couldn't be probed")
+        fadeout = min(fadeout, duration)
+        filters.append(f"afade=t=out:st={max(0.0, duration - fadeout):.3f}:d={fadeout}")
+    return filters
+
+
+def loudnorm_targets(options):
+    """loudnorm target arguments (integrated loudness, true peak, range) from audio options"""
+    options = with_defaults('audio', options)
+    return (f"I={float(options['loudnorm_target'])}:TP={float(options['loudnorm_peak'])}"
+            f":LRA={float(options['loudnorm_range'])}")
+
+
+def audio_trim_range(options):
+    """(start, duration) input seek arguments of audio options, '' when unused"""
+    options = with_defaults('audio', options)
+    if not options['trim_enable']:
+        return '', ''
+    start = str(options['trim_start']).strip()
+    if start == "00:00:00":
+        start = ''
+    return start, str(options['trim_duration']).strip()
+
+
+def build_loudness_command(ffmpeg_path, input_file, targets, start='', duration=''):
+    """FFmpeg command for loudnorm's measuring pass (decodes only, writes nothing)"""
+    cmd = [ffmpeg_path, '-hide_banner', '-nostats']
+    if start:
+        cmd.extend(['-ss', start])
+    if duration:
+        cmd.extend(['-t', duration])
+    cmd.extend(['-i', input_file, '-vn', '-af', f'loudnorm={targets}:print_format=json',
+                '-f', 'null', '-'])
+    return cmd
+
+
+def parse_loudness(lines):
+    """Measurements from the JSON block loudnorm prints at the end of the first pass"""
+    text = '\n'.join(lines)
+    start, end = text.rfind('{'), text.rfind('}')
+    if start < 0 or end < start:
+        raise RuntimeError("loudnorm printed no measurements")
+    data = json.loads(text[start:end + 1])
+    return {key: data[key] for key in
+            ('input_i', 'input_tp', 'input_lra', 'input_thresh', 'target_offset')}
+
+
+def cached_loudness(ffmpeg_path, probe_cache, input_file, targets, run, start='', duration=''):
+    """loudnorm measurements of a file (or range of it), cached in the probe cache.
+
+    run(cmd) runs the measuring pass and returns its output lines; it is
+    only called when the file changed or was never measured with these
+    targets and range.
+    """
+    kind = ' '.join(part for part in ('loudnorm', targets, start, duration) if part)
+    return probe_cache.get(input_file, kind, lambda path: parse_loudness(
+        run(build_loudness_command(ffmpeg_path, path, targets, start, duration))))
+
+
+def audio_loudness(ffmpeg_path, options, probe_cache, run):
+    """cached_loudness of the input and trim range of audio options, None unless loudnorm is on"""
+    options = with_defaults('audio', options)
+    if not options['loudnorm']:
+        return None
+    start, duration = audio_trim_range(options)
+    return cached_loudness(ffmpeg_path, probe_cache, options['input'], loudnorm_targets(options),
+                           run, start, duration)
+
+
+def loudnorm_filter(targets, measured=None):
+    """loudnorm filter: a linear correction from first-pass measurements, or
+    single-pass dynamic normalization without them. None for silent input."""
+    if measured is None:
+        return f"loudnorm={targets}"
+    if 'inf' in str(measured['input_i']):
+        return None
+    return (f"loudnorm={targets}:measured_I={measured['input_i']}:measured_TP={measured['input_tp']}"
+            f":measured_LRA={measured['input_lra']}:measured_thresh={measured['input_thresh']}"
+            f":offset={measured['target_offset']}:linear=true")
+
+
+def audio_filter_chain(options, source_duration=None, loudness=None):
+    """Audio filters (loudness/volume, fades) of audio extraction options"""
+    options = with_defaults('audio', options)
+    audio_filters = []
+
+    # Loudness normalization replaces the manual volume
+    if options['loudnorm']:
+        loudnorm = loudnorm_filter(loudnorm_targets(options), loudness)
+        if loudnorm:
+            audio_filters.append(loudnorm)
+    elif options['volume_enable']:
+        volume = float(options['volume'])
+        if volume != 1.0:
+            audio_filters.append(f"volume={volume}")
+
+    # Fades, placed from the probed duration minus what the trim cuts off
+    audio_filters.extend(audio_fade_filters(
+        float(options['fadein_duration']) if options['fadein'] else 0,
+        float(options['fadeout_duration']) if options['fadeout'] else 0,
+        audio_output_duration(options, source_duration)))
+    return audio_filters
+
+
+def audio_input_args(ffmpeg_path, options):
+    """FFmpeg executable and input of audio extraction, with the trim as input seek"""
+    options = with_defaults('audio', options)
+    cmd = [ffmpeg_path]
+
+    # Seeking the input keeps output timestamps starting at 0 for the fades
+    start, duration = audio_trim_range(options)
+    if start:
+        cmd.extend(['-ss', start])
+    if duration:
+        cmd.extend(['-t', duration])
+    cmd.extend(['-i', options['input']])
+    return cmd
+
+
+def audio_encode_args(options, output_format, codec, bitrate):
+    """Encoder arguments of one audio output"""
+    # Auto-select codec based on format
+    if codec == "auto":
+        codec = AUDIO_FORMAT_CODECS.get(output_format, "aac")
+    args = ['-c:a', codec]
+
+    # Bitrate (if not using lossless codec)
+    if codec not in ['flac', 'pcm_s16le']:
+        args.extend(['-b:a', bitrate])
+
+    # Sample rate and channels, unless the source's are kept
+    if options['sample'] != 'keep':
+        args.extend(['-ar', str(options['sample'])])
+    elif options['loudnorm']:
+        # loudnorm outputs 192 kHz
+        args.extend(['-ar', '48000'])
+    if options['channels'] != 'keep':
+        args.extend(['-ac', str(AUDIO_CHANNEL_COUNTS[options['channels']])])
+    return args
+
+
+def build_audio_command(ffmpeg_path, options, source_duration=None, loudness=None,
+                        source=None):
+    """FFmpeg command for audio extraction.
+
+    source_duration (seconds, from the probe cache) is needed for a
+    fade-out, loudness (cached_loudness) for two-pass loudness
+    normalization and source (the probed audio stream, audio_stream) for
+    the stream copy fast path.
+    """
+    options = with_defaults('audio', options)
+    if options['multi_enable']:
+        return build_multi_audio_command(ffmpeg_path, options, source_duration, loudness, source)
+    input_file, output_file = require(options, ['input', 'output'],
+                                      "Please specify both input and output files")
+
+    cmd = audio_input_args(ffmpeg_path, options)
+    audio_filters = audio_filter_chain(options, source_duration, loudness)
+    if audio_filters:
+        cmd.extend(['-af', ','.join(audio_filters)])
+
+    # No video
+    cmd.append('-vn')
+
+    # Remux instead of re-encoding when nothing touches the samples and the
+    # source already is what was asked for; the trim then cuts on packet boundaries
+    codec = options['codec']
+    if codec == 'copy' and audio_filters:
+        raise ValueError("Volume, fades and loudness normalization need an encoder, not 'copy'")
+    if codec == 'copy' or (options['stream_copy'] and not audio_filters and audio_copy_matches(
+            options['format'], codec, options['bitrate'], options['sample'], options['channels'], source)):
+        cmd.extend(['-c:a', 'copy', '-y', output_file])
+        return cmd
+
+    cmd.extend(audio_encode_args(options, options['format'], codec, options['bitrate']))
+    cmd.extend(['-y', output_file])
+    return cmd
+
+
+def parse_audio_outputs(text):
+    """[(format, bitrate or None)] from a list like 'mp3:320k, m4a:192k, flac'"""
+    outputs = []
+    for part in str(text).replace(';', ',').split(','):
+        output_format, _, bitrate = part.strip().lower().lstrip('.').partition(':')
+        if not output_format:
+            continue
+        if output_format not in AUDIO_FORMAT_CODECS:
+            raise ValueError(f"Unsupported audio format: {output_format} "
+                             f"(use {', '.join(AUDIO_FORMAT_CODECS)})")
+        if any(output_format == existing for existing, _ in outputs):
+            raise ValueError(f"{output_format} is listed twice")
+        outputs.append((output_format, bitrate.strip() or None))
+    if not outputs:
+        raise ValueError("Please specify at least one output format")
+    return outputs
+
+
+def audio_output_files(options):
+    """Output path of each format of a multi-format export (movie.mp3 -> movie.flac, ...)"""
+    options = with_defaults('audio', options)
+    base = os.path.splitext(options['output'])[0]
+    return [f"{base}.{output_format}" for output_format, _ in parse_audio_outputs(options['outputs'])]
+
+
+def build_multi_audio_command(ffmpeg_path, options, source_duration=None, loudness=None,
+                              source=None):
+    """One FFmpeg command exporting the audio in several formats.
+
+    The input is decoded and filtered once; asplit fans the samples out
+    to one encoder per format. Every format uses its own encoder, so the
+    codec setting has to be 'auto'. Formats without their own bitrate
+    are stream copied when nothing needs filtering and the source
+    already matches the settings (audio_copy_matches).
+    """
+    options = with_defaults('audio', options)
+    require(options, ['input', 'output'], "Please specify both input and output files")
+    if options['codec'] != 'auto':
+        raise ValueError("Multi-format export picks each format's own codec, "
+                         "set the codec to auto")
+    outputs = list(zip(parse_audio_outputs(options['outputs']), audio_output_files(options)))
+
+    audio_filters = audio_filter_chain(options, source_duration, loudness)
+    # A bitrate given for one format asks for an encode at that bitrate
+    copied = [options['stream_copy'] and not audio_filters and bitrate is None and
+              audio_copy_matches(output_format, 'auto', options['bitrate'],
+                                 options['sample'], options['channels'], source)
+              for (output_format, bitrate), _ in outputs]
+    encoded = copied.count(False)
+
+    cmd = audio_input_args(ffmpeg_path, options)
+    # A single unfiltered encode maps the input directly
+    graph = encoded > 1 or bool(audio_filters)
+    if graph:
+        chain = list(audio_filters)
+        if encoded > 1:
+            chain.append(f"asplit={encoded}")
+        labels = ''.join(f"[a{index}]" for index in range(encoded))
+        cmd.extend(['-filter_complex', f"[0:a:0]{','.join(chain)}{labels}"])
+    cmd.append('-y')
+
+    labels = itertools.count()
+    for ((output_format, bitrate), output_file), copy in zip(outputs, copied):
+        if copy:
+            cmd.extend(['-map', '0:a:0', '-c:a', 'copy', output_file])
+            continue
+        cmd.extend(['-map', f"[a{next(labels)}]" if graph else '0:a:0'])
+        cmd.extend(audio_encode_args(options, output_format, 'auto', bitrate or options['bitrate']))
+        cmd.append(output_file)
+    return cmd
+
+
+def subtitle_filter(options):
+    """subtitles filter burning in the subtitle file ('file') of the settings"""
+    options = with_defaults('subtitle', options)
+    # Escape path for Windows
+    subtitle_path = options['file'].replace('\\', '/').replace(':', '\\:')
+    fontsize = options['fontsize']
+    color = options['color']
+    return f"subtitles='{subtitle_path}':force_style='FontSize={fontsize},PrimaryColour=&H{color}&'"
+
+
+def build_subtitle_command(ffmpeg_path, options):
+    """FFmpeg command adding a subtitle file ('file') to a video"""
+    options = with_defaults('subtitle', options)
+    input_file, subtitle_file, output_file = require(
+        options, ['input', 'file', 'output'],
+        "Please specify input video, subtitle file, and output file")
+
+    cmd = [ffmpeg_path, '-i', input_file]
+
+    if options['type'] == "soft":
+        # Soft subtitle (embedded in container)
+        cmd.extend(['-i', subtitle_file, '-c', 'copy', '-c:s', 'mov_text'])
+    else:
+        # Hard subtitle (burned into video)
+        cmd.extend(['-vf', subtitle_filter(options), '-c:v', 'libx264', '-c:a', 'copy'])
+
+    cmd.extend(['-y', output_file])
+    return cmd
+
+
+def overlay_position(options):
+    """overlay x:y expression for the watermark position and margin"""
+    options = with_defaults('watermark', options)
+    position = options['position']
+    margin = options['margin']
+
+    # Position mapping
+    position_map = {
+        "top-left": f"{margin}:{margin}",
+        "top-right": f"W-w-{margin}:{margin}",
+        "bottom-left": f"{margin}:H-h-{margin}",
+        "bottom-right": f"W-w-{margin}:H-h-{margin}",
+        "center": "(W-w)/2:(H-h)/2"
+    }
+
+    return position_map.get(position, f"{margin}:{margin}")
+
+
+def build_watermark_command(ffmpeg_path, options):
+    """FFmpeg command overlaying a watermark image ('file') on a video"""
+    options = with_defaults('watermark', options)
+    input_file, watermark_file, output_file = require(
+        options, ['input', 'file', 'output'],
+        "Please specify input video, watermark image, and output file")
+
+    cmd = [ffmpeg_path, '-i', input_file, '-i', watermark_file]
+
+    # Build overlay filter with opacity
+    overlay_filter = f"[1:v]format=rgba,colorchannelmixer=aa={options['opacity']}[wm];[0:v][wm]overlay={overlay_position(options)}"
+
+    cmd.extend(['-filter_complex', overlay_filter, '-c:v', 'libx264', '-c:a', 'copy', '-y', output_file])
+    return cmd
+
+
+def build_preview_command(ffmpeg_path, operation, options, timestamp, width, source_size=None):
+    """FFmpeg command rendering one frame of an operation's output as PPM on stdout.
+
+    The inputs and filter graph are taken from the operation's real
+    command, so the preview shows exactly what the encode would; the
+    main input is seeked to timestamp, the result scaled down to at most
+    width pixels and nothing is encoded.
+    """
+    options = dict(options, output='preview.ppm')
+    if operation == 'filter':
+        cmd = build_filter_command(ffmpeg_path, options, source_size)
+    elif operation == 'watermark':
+        cmd = build_watermark_command(ffmpeg_path, options)
+    else:
+        raise ValueError(f"No preview for {operation}")
+
+    inputs = []
+    graph_option, graph = '-vf', []
+    args = cmd[1:-1]
+    for index, arg in enumerate(args[:-1]):
+        if arg == '-i':
+            inputs.extend(['-i', args[index + 1]])
+        elif arg in ('-vf', '-filter_complex'):
+            graph_option, graph = arg, [args[index + 1]]
+
+    # Appending to the last chain works for -vf and -filter_complex alike
+    graph.append(f"scale='min({width},iw)':-2")
+    return ([ffmpeg_path, '-hide_banner', '-loglevel', 'error', '-ss', f'{timestamp:.3f}'] + inputs +
+            [graph_option, ','.join(graph), '-frames:v', '1', '-an', '-sn',
+             '-f', 'image2pipe', '-c:v', 'ppm', '-'])
+
+
+def render_preview(cmd):
+    """Run a build_preview_command command and return the PPM image bytes"""
+    result = subprocess.run(
+        cmd, capture_output=True, timeout=30,
+        creationflags=subprocess.CREATE_NO_WINDOW if os.name == 'nt' else 0
+    )
+    if result.returncode != 0 or not result.stdout:
+        message = result.stderr.decode('utf-8', 'replace').strip().splitlines()
+        raise RuntimeError(message[-1] if message else f"FFmpeg failed with code {result.returncode}")
+    return result.stdout
+
+
+def atempo_chain(speed):
+    """atempo filters changing audio speed by any factor (each one is limited to 0.5-2)"""
+    filters = []
+    while speed > 2.0:
+        filters.append("atempo=2.0")
+        speed /= 2.0
+    while speed < 0.5:
+        filters.append("atempo=0.5")
+        speed /= 0.5
+    if speed != 1.0:
+        filters.append(f"atempo={speed:.6g}")
+    return filters
+
+
+def build_pipeline_command(ffmpeg_path, options):
+    """One FFmpeg command running several edit steps with a single encode.
+
+    options['steps'] is an ordered list of trim, filter, watermark and
+    subtitle settings, each with an 'operation' key. A leading trim becomes
+    input seeking; every other step becomes part of one filter graph.
+    """
+    options = with_defaults('pipeline', options)
+    input_file, output_file = require(options, ['input', 'output'],
+                                      "Please specify both input and output files")
+    if not options['steps']:
+        raise ValueError("Please add at least one operation to the pipeline")
+
+    inputs = [['-i', input_file]]
+    graph = []          # finished filter_complex chains
+    pending = []        # simple filters not yet attached to a label
+    video = '0:v'       # label of the current video stream
+    labels = itertools.count()
+    audio_filters = []
+    output_args = []
+    offset = 0.0        # source time of the current first frame, for subtitles
+    retimed = False     # a speed change makes source times meaningless
+
+    def flush():
+        nonlocal video
+        if pending:
+            label = f'v{next(labels)}'
+            graph.append(f"[{video}]{','.join(pending)}[{label}]")
+            pending.clear()
+            video = label
+
+    for step in options['steps']:
+        operation = step.get('operation')
+        if operation == 'trim':
+            _, _, start, length = trim_settings(dict(step, input=input_file, output=output_file))
+            if len(inputs) == 1 and not graph and not pending and not audio_filters and offset == 0:
+                # Nothing happened yet: seek the input instead of decoding up to the start
+                seek = ['-ss', f'{start:.3f}'] if start > 0 else []
+                inputs[0] = seek + (['-t', f'{length:.3f}'] if length is not None else []) + inputs[0]
+            else:
+                bounds = f"start={start:.3f}" + (f":duration={length:.3f}" if length is not None else '')
+                pending.extend([f"trim={bounds}", "setpts=PTS-STARTPTS"])
+                audio_filters.extend([f"atrim={bounds}", "asetpts=PTS-STARTPTS"])
+            offset += start
+
+        elif operation == 'filter':
+            chain = filter_chain(step)
+            if with_defaults('filter', step)['optimize']:
+                chain = optimize_filter_chain(chain)
+            pending.extend(chain)
+            speed = float(with_defaults('filter', step)['speed'])
+            if speed != 1.0:
+                # Keep the audio in sync with the retimed video
+                audio_filters.extend(atempo_chain(speed))
+                retimed = True
+
+        elif operation == 'watermark':
+            watermark_file, = require(step, ['file'], "Please specify the watermark image")
+            index = len(inputs)
+            inputs.append(['-i', watermark_file])
+            flush()
+            opacity = with_defaults('watermark', step)['opacity']
+            label = f'v{next(labels)}'
+            graph.append(f"[{index}:v]format=rgba,colorchannelmixer=aa={opacity}[wm{index}];"
+                         f"[{video}][wm{index}]overlay={overlay_position(step)}[{label}]")
+            video = label
+
+        elif operation == 'subtitle':
+            subtitle_file, = require(step, ['file'], "Please specify the subtitle file")
+            if with_defaults('subtitle', step)['type'] == 'soft':
+                index = len(inputs)
+                shift = ['-itsoffset', f'{-offset:.3f}'] if offset and not retimed else []
+                inputs.append(shift + ['-i', subtitle_file])
+                output_args.extend(['-map', f'{index}:s', '-c:s', 'mov_text'])
+            elif offset and not retimed:
+                # Subtitle times refer to the source, so render them at source time
+                pending.extend([f"setpts=PTS+{offset:.3f}/TB", subtitle_filter(step),
+                                "setpts=PTS-STARTPTS"])
+            else:
+                pending.append(subtitle_filter(step))
+
+        else:
+            raise ValueError(f"Unknown pipeline operation: {operation}")
+
+    flush()
+    cmd = [ffmpeg_path]
+    for args in inputs:
+        cmd.extend(args)
+    if graph:
+        cmd.extend(['-filter_complex', ';'.join(graph), '-map', f'[{video}]'])
+    else:
+        cmd.extend(['-map', '0:v:0'])
+
+    # Audio is only re-encoded when a step changes it
+    cmd.extend(['-map', '0:a?'])
+    if audio_filters:
+        cmd.extend(['-af', ','.join(audio_filters), '-c:a', 'aac'])
+    else:
+        cmd.extend(['-c:a', 'copy'])
+
+    cmd.extend(output_args)
+    cmd.extend(['-c:v', 'libx264', '-crf', str(options['crf']), '-preset', options['preset']])
+    cmd.extend(['-y', output_file])
+    return cmd
+
+
+def build_thumbnail_command(ffmpeg_path, options, duration=None):
+    """FFmpeg command tiling evenly spaced keyframes into one contact sheet.
+
+    Only keyframes are decoded (-skip_frame nokey), in the decoder's fast
+    mode and on one thread. With the duration known, sheets of up to
+    THUMBNAIL_SEEK_LIMIT thumbnails open the file once per thumbnail and
+    seek straight to its pick time, taking the keyframe at or before it
+    (-noaccurate_seek). Larger sheets read the file once and keep the
+    first keyframe of each of the evenly spaced slots, so a long gap
+    between keyframes leaves slots out instead of bunching the picks.
+    Without the duration, the first keyframes are used.
+    """
+    options = with_defaults('thumbnail', options)
+    input_file, output_file = require(options, ['input', 'output'],
+                                      "Please specify both input and output files")
+    try:
+        columns, rows, width = (int(options[key]) for key in ('columns', 'rows', 'width'))
+    except ValueError:
+        raise ValueError("Columns, rows and thumbnail width must be whole numbers")
+    if min(columns, rows, width) < 1:
+        raise ValueError("Columns, rows and thumbnail width must be at least 1")
+
+    decode_args = ['-skip_frame', 'nokey', '-flags2', '+fast', '-threads', '1']
+    tile = f"tile={columns}x{rows}:padding=4:margin=4"
+    count = columns * rows
+    if not duration or count > THUMBNAIL_SEEK_LIMIT:
+        filters = [f"scale={width}:-2", tile]
+        if duration:
+            interval = duration / count
+            filters.insert(0, f"select='isnan(prev_selected_t)+"
+                              f"gt(floor(t/{interval:.3f}),floor(prev_selected_t/{interval:.3f}))'")
+        return ([ffmpeg_path] + decode_args + ['-i', input_file, '-an', '-sn',
+                '-vf', ','.join(filters), '-frames:v', '1', '-y', output_file])
+
+    interval = duration / count
+    cmd = [ffmpeg_path]
+    graph = []
+    for index in range(count):
+        # Input -t stops the demuxer right after the picked keyframe
+        cmd.extend(decode_args + ['-noaccurate_seek', '-ss', f'{(index + 0.5) * interval:.3f}',
+                                  '-t', '1', '-i', input_file])
+        graph.append(f"[{index}:v:0]trim=end_frame=1,scale={width}:-2,setsar=1[t{index}]")
+    graph.append(''.join(f"[t{index}]" for index in range(count)) +
+                 f"concat=n={count}:v=1:a=0,{tile}[sheet]")
+    return cmd + ['-filter_complex', ';'.join(graph), '-map', '[sheet]',
+                  '-frames:v', '1', '-y', output_file]
+
+
+def cached_thumbnail_sheet(ffmpeg_path, input_file, probe_cache, cache, run, options=None):
+    """Path of a PNG contact sheet of input_file from the thumbnail cache.
+
+    run(cmd) makes the sheet on a cache miss; options may set columns,
+    rows and width.
+    """
+    options = dict(options or {}, input=input_file, output='sheet.png')
+    cmd = build_thumbnail_command(ffmpeg_path, options, probe_cache.duration(input_file))
+    path = cache.encode(run, input_file, cmd)
+    cache.prune(keep=[path])
+    return path
+
+
+def gif_settings(options):
+    """(input, output, start seconds, length seconds, fps) of a GIF"""
+    options = with_defaults('gif', options)
+    input_file, output_file = require(options, ['input', 'output'],
+                                      "Please specify both input and output files")
+    start = parse_time(options['start'] or 0)
+    length = parse_time(options['duration'] or 0)
+    fps = float(options['fps'])
+    if length <= 0:
+        raise ValueError("Please specify the GIF duration")
+    if fps <= 0:
+        raise ValueError("FPS must be above 0")
+    return input_file, output_file, start, length, fps
+
+
+def gif_filters(options):
+    """Frame rate and size filters shared by the palette and GIF passes"""
+    options = with_defaults('gif', options)
+    scale = f",scale={int(options['width'])}:-1:flags=lanczos" if int(options['width']) > 0 else ''
+    return f"fps={options['fps']}{scale}"
+
+
+def build_palette_command(ffmpeg_path, options, palette_file):
+    """FFmpeg command for the palettegen pass over the GIF's time range"""
+    options = with_defaults('gif', options)
+    input_file, _, start, length, _ = gif_settings(options)
+    return [ffmpeg_path, '-ss', f'{start:.3f}', '-t', f'{length:.3f}', '-i', input_file,
+            '-vf', f"{gif_filters(options)},palettegen=max_colors={int(options['colors'])}:stats_mode=diff",
+            '-frames:v', '1', '-y', palette_file]
+
+
+def build_gif_command(ffmpeg_path, options, palette_file, start=None, length=None, output_file=None):
+    """FFmpeg command mapping the frames of a time range onto the palette.
+
+    Defaults to the whole range of the options; segments of it are written
+    as paletted PNG frames in NUT so they can be joined into the GIF later.
+    """
+    options = with_defaults('gif', options)
+    input_file, gif_file, range_start, range_length, _ = gif_settings(options)
+    start = range_start if start is None else start
+    length = range_length if length is None else length
+    output_file = output_file or gif_file
+
+    cmd = [ffmpeg_path, '-ss', f'{start:.3f}', '-t', f'{length:.3f}', '-i', input_file,
+           '-i', palette_file, '-lavfi',
+           f"{gif_filters(options)}[frames];[frames][1:v]paletteuse=dither={options['dither']}"]
+    if output_file.lower().endswith('.gif'):
+        cmd.extend(['-loop', str(options['loop'])])
+    else:
+        cmd.extend(['-c:v', 'png', '-f', 'nut'])
+    cmd.extend(['-y', output_file])
+    return cmd
+
+
+def plan_gif_segments(length, fps, workers):
+    """[(offset, length)] splitting a GIF range for parallel rendering.
+
+    Ranges shorter than two GIF_SEGMENT_SECONDS stay whole; segment
+    lengths are whole frame counts so the joined frames stay evenly spaced.
+    """
+    count = min(workers, int(length // GIF_SEGMENT_SECONDS))
+    if count < 2:
+        return [(0.0, length)]
+    frames = int(round(length * fps))
+    per_segment = -(-frames // count)
+    segments = []
+    for first in range(0, frames, per_segment):
+        last = min(frames, first + per_segment)
+        segments.append((first / fps, (last - first) / fps))
+    return segments
+
+
+def make_gif(ffmpeg_path, options, job, log=None, cache=None):
+    """Create a GIF: generate (or reuse) the palette, then map the frames onto it.
+
+    The palette of an input, range and settings is kept in an OutputCache,
+    so variants with another dither or loop setting skip the analysis
+    pass. Long ranges are rendered as segments in parallel against the
+    same palette and joined into the GIF at the end.
+    """
+    import tempfile
+    import shutil
+
+    log = log or (lambda message: None)
+    options = with_defaults('gif', options)
+    input_file, output_file, start, length, fps = gif_settings(options)
+    cache = cache or OutputCache(*PALETTE_CACHE)
+
+    palette_cmd = build_palette_command(ffmpeg_path, options, 'palette.png')
+    palette = cache.path(input_file, palette_cmd)
+    if cache.lookup(palette):
+        log("GIF: reusing the cached palette")
+    else:
+        job.report(status="generating palette")
+        palette = cache.encode(job.run_checked, input_file, palette_cmd)
+    cache.prune(keep=[palette])
+
+    # paletteuse runs on one thread, the decoder takes about one more
+    segments = plan_gif_segments(length, fps, max(1, (os.cpu_count() or 1) // 2))
+    if len(segments) == 1:
+        job.report(status="rendering")
+        job.run_ffmpeg(build_gif_command(ffmpeg_path, options, palette), length, log,
+                       lambda report, duration: job.report(report.percent(duration)))
+        return
+
+    log(f"GIF: rendering {len(segments)} segments in parallel")
+    temp_dir = tempfile.mkdtemp(prefix='ffgui_gif_',
+                                dir=os.path.dirname(os.path.abspath(output_file)))
+    try:
+        parts = [os.path.join(temp_dir, f'segment_{index:03d}.nut') for index in range(len(segments))]
+        commands = [build_gif_command(ffmpeg_path, options, palette, start + offset, seconds, part)
+                    for (offset, seconds), part in zip(segments, parts)]
+        with ThreadPoolExecutor(max_workers=len(commands)) as pool:
+            futures = [pool.submit(job.run_checked, cmd) for cmd in commands]
+            for finished, future in enumerate(as_completed(futures), 1):
+                future.result()
+                job.report(100.0 * finished / (len(commands) + 1),
+                           f"rendered segment {finished}/{len(commands)}")
+
+        # The segments already hold paletted frames, so this only packs them
+        job.report(status="joining")
+        list_file = os.path.join(temp_dir, 'segments.txt')
+        write_concat_list(list_file, parts)
+        job.run_checked([ffmpeg_path, '-f', 'concat', '-safe', '0', '-i', list_file,
+                         '-loop', str(options['loop']), '-y', output_file])
+    finally:
+        shutil.rmtree(temp_dir, ignore_errors=True)
+
+
+def build_batch_command(ffmpeg_path, options, input_file, output_file, threads=None,
+                        duration=None, loudness=None, source=None, crf=None):
+    """FFmpeg command for one file of a batch.
+
+    Audio fade-outs need the duration, loudness normalization the
+    cached_loudness measurements (single-pass without them), the audio
+    stream copy the probed source audio stream and an automatic CRF the
+    cached_crf result (the fixed CRF without it).
+    """
+    options = with_defaults('batch', options)
+    operation = options['operation']
+    cmd = [ffmpeg_path, '-i', input_file]
+
+    if operation == "convert":
+        # Format conversion
+        codec = options['convert_codec']
+        cmd.extend(['-c:v', codec])
+        if codec != 'copy':
+            cmd.extend(['-crf', str(crf if crf is not None else options['convert_crf'])])
+        cmd.extend(['-c:a', 'aac'])
+
+    elif operation == "audio":
+        # Audio extraction
+        cmd.append('-vn')
+        filters = []
+        if options['audio_loudnorm']:
+            loudnorm = loudnorm_filter(loudnorm_targets({}), loudness)
+            if loudnorm:
+                filters.append(loudnorm)
+        fade = float(options['audio_fade'] or 0)
+        filters.extend(audio_fade_filters(fade if options['audio_fadein'] else 0,
+                                          fade if options['audio_fadeout'] else 0, duration))
+        if filters:
+            cmd.extend(['-af', ','.join(filters)])
+        if options['audio_loudnorm']:
+            # loudnorm outputs 192 kHz
+            cmd.extend(['-ar', '48000'])
+        codec = AUDIO_FORMAT_CODECS.get(options['audio_format'], "aac")
+        if options['audio_copy'] and not filters and audio_copy_matches(
+                options['audio_format'], 'auto', options['audio_bitrate'], 'keep', 'keep', source):
+            codec = 'copy'
+        cmd.extend(['-c:a', codec])
+        if codec not in ['flac', 'pcm_s16le', 'copy']:
+            cmd.extend(['-b:a', options['audio_bitrate']])
+
+    elif operation == "resize":
+        # Resize video
+        cmd.extend(['-vf', f"scale={options['resize_resolution']}"])
+        cmd.extend(['-c:v', 'libx264', '-c:a', 'copy'])
+
+    elif operation == "filter":
+        # Apply filter
+        filter_type = options['filter_type']
+        if filter_type == "grayscale":
+            cmd.extend(['-vf', 'hue=s=0'])
+        elif filter_type == "blur":
+            cmd.extend(['-vf', 'boxblur=5:5'])
+        elif filter_type == "sharpen":
+            cmd.extend(['-vf', 'unsharp=5:5:1.0:5:5:0.0'])
+        cmd.extend(['-c:a', 'copy'])
+
+    # Per-job thread budget so parallel jobs don't oversubscribe the CPU
+    if threads and batch_codec(options) != 'copy':
+        cmd.extend(['-threads', str(threads)])
+
+    cmd.extend(['-y', output_file])
+    return cmd
+
+
+def batch_codec(options):
+    """The encoder that dominates the cost of a batch operation"""
+    options = with_defaults('batch', options)
+    operation = options['operation']
+    if operation == "convert":
+        return options['convert_codec']
+    elif operation == "audio":
+        return 'audio'
+    return 'libx264'
+
+
+def batch_jobs(options):
+    """(parallel jobs, threads per job) of a batch"""
+    try:
+        jobs = max(0, int(with_defaults('batch', options)['jobs']))
+    except ValueError:
+        jobs = 0
+    return batch_concurrency(batch_codec(options), jobs)
+
+
+def batch_output_file(options, input_file, output_folder):
+    """Output path of a batch file from the filename pattern"""
+    options = with_defaults('batch', options)
+    operation = options['operation']
+
+    # Determine output extension
+    if operation == "audio":
+        out_ext = f".{options['audio_format']}"
+    elif operation == "convert":
+        out_ext = f".{options['convert_format']}"
+    else:
+        out_ext = ".mp4"
+
+    base_name = os.path.splitext(os.path.basename(input_file))[0]
+    output_name = options['pattern'].replace("{name}", base_name).replace("{ext}", out_ext)
+    return os.path.join(output_folder, output_name)
+
+
+# Running FFmpeg
+
+def expected_duration(cmd, probe_cache):
+    """Estimate the output duration of a command from cached probe data"""
+    if '-i' not in cmd:
+        return None
+    input_file = cmd[cmd.index('-i') + 1]
+    if not os.path.isfile(input_file):
+        return None
+
+    def option(name):
+        if name in cmd:
+            try:
+                return parse_time(cmd[cmd.index(name) + 1])
+            except (IndexError, ValueError):
+                return None
+        return None
+
+    start = option('-ss') or 0.0
+    length = option('-t')
+    end = option('-to')
+    duration = probe_cache.duration(input_file)
+    if duration is not None:
+        duration = max(0.0, duration - start)
+    if length is not None:
+        duration = min(length, duration) if duration is not None else length
+    elif end is not None:
+        duration = max(0.0, end - start)
+    return duration
+
+
+def run_ffmpeg(cmd, duration=None, log=None, progress=None, started=None):
+    """Run an FFmpeg command with progress reporting and return its exit code.
+
+    log(message) gets the duration and any error/warning lines,
+    progress(report, duration) each FFmpegProgress once the duration is
+    known, and started(process) the Popen object so it can be terminated.
+    """
+    log = log or (lambda message: None)
+
+    # Machine-readable progress goes to stdout, the human log stays on stderr
+    cmd_with_progress = cmd[:1] + ['-progress', 'pipe:1', '-nostats'] + cmd[1:]
+    process = subprocess.Popen(
+        cmd_with_progress,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        text=True,
+        creationflags=subprocess.CREATE_NO_WINDOW if os.name == 'nt' else 0
+    )
+    if started:
+        started(process)
+
+    # Expected duration if known, else filled in by the log reader
+    media = {'duration': duration}
+
+    def read_log():
+        for line in process.stderr:
+            line_stripped = line.strip()
+
+            # Parse duration from FFmpeg output
+            if not media['duration']:
+                duration_match = DURATION_RE.search(line)
+                if duration_match:
+                    hours, minutes, seconds = duration_match.groups()
+                    media['duration'] = int(hours) * 3600 + int(minutes) * 60 + float(seconds)
+                    log(f"Video duration: {media['duration']:.2f}s")
+
+            # Log important messages
+            lowered = line_stripped.lower()
+            if 'error' in lowered or 'warning' in lowered:
+                log(line_stripped)
+
+    log_thread = threading.Thread(target=read_log)
+    log_thread.daemon = True
+    log_thread.start()
+
+    for report in iter_progress(process.stdout):
+        if progress and media['duration']:
+            progress(report, media['duration'])
+
+    process.wait()
+    log_thread.join()
+    return process.returncode
+
+
+class BatchRunner:
+    """Runs the files of a batch journal several at a time.
+
+    The callbacks are called from worker threads: log(message),
+    on_state(input_file, state) and on_progress(finished, total).
+    concurrency (parallel jobs, threads per job) defaults to batch_jobs
+    of the journal's options.
+    """
+
+    def __init__(self, ffmpeg_path, journal, durations=None, log=None,
+                 on_state=None, on_progress=None, probe_cache=None, concurrency=None):
+        self.ffmpeg_path = ffmpeg_path
+        self.journal = journal
+        self.options = journal.data['options']
+        self.concurrency = concurrency
+        self.durations = durations or {}
+        self.probe_cache = probe_cache
+        self.log = log or (lambda message: None)
+        self.on_state = on_state or (lambda input_file, state: None)
+        self.on_progress = on_progress or (lambda finished, total: None)
+        self.running = True
+        self.processes = set()
+        self.lock = threading.Lock()
+
+    def stop(self):
+        """Stop starting new files and terminate the running ones"""
+        self.running = False
+        with self.lock:
+            for process in self.processes:
+                process.terminate()
+
+    def run(self):
+        """Process the batch, returning a count of files per final state"""
+        journal = self.journal
+        # Longest files first, so the pool isn't left waiting on one long job at the end
+        items = sorted(journal.data['items'],
+                       key=lambda item: -(self.durations.get(item['input']) or 0))
+        total = len(items)
+        workers, threads = self.concurrency or batch_jobs(self.options)
+        self.log(f"Batch: {total} file(s), {workers} parallel job(s), {threads} thread(s) per job")
+
+        options = with_defaults('batch', self.options)
+        incremental = options['incremental']
+        manifest = OutputManifest(journal.data['output_folder'])
+
+        # First loudnorm pass for every file still to do, cached per input
+        loudness = {}
+        if options['operation'] == 'audio' and options['audio_loudnorm'] and self.probe_cache:
+            loudness = self.measure_loudness([item['input'] for item in items
+                                              if item['status'] != 'done'])
+        copy_audio = options['operation'] == 'audio' and options['audio_copy'] and self.probe_cache
+
+        # CRF search for every file still to do, cached per input
+        crfs = {}
+        if options['operation'] == 'convert' and options['convert_auto_crf'] and self.probe_cache \
+                and options['convert_codec'] in CRF_SEARCH_RANGE:
+            crfs = self.search_crfs([item['input'] for item in items if item['status'] != 'done'])
+
+        results = {'done': 0, 'failed': 0, 'stopped': 0, 'up to date': 0}
+        finished = 0
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            futures = []
+            for position, item in enumerate(items, 1):
+                input_file, output_file = item['input'], item['output']
+
+                # Skip files a previous run already completed
+                if item['status'] == 'done' and journal.output_intact(item):
+                    results['done'] += 1
+                    finished += 1
+                    self.on_state(input_file, 'done')
+                    continue
+
+                try:
+                    source = audio_stream(self.probe_cache, input_file) if copy_audio else None
+                    cmd = build_batch_command(self.ffmpeg_path, self.options, input_file,
+                                              output_file, threads, self.durations.get(input_file),
+                                              loudness.get(input_file), source,
+                                              crfs.get(input_file))
+                    fingerprint = batch_fingerprint(input_file, cmd)
+                except Exception as e:
+                    cmd, fingerprint = None, None
+                    self.log(f"✗ Cannot prepare {os.path.basename(input_file)}: {str(e)}")
+
+                # Skip files whose output came from the same input and arguments
+                if incremental and fingerprint and manifest.is_current(output_file, fingerprint):
+                    stat = os.stat(output_file)
+                    journal.update(input_file, status='done', size=stat.st_size, mtime=stat.st_mtime_ns)
+                    results['up to date'] += 1
+                    finished += 1
+                    self.on_state(input_file, 'up to date')
+                    continue
+
+                # Anything else may have left a partial output behind
+                if os.path.exists(output_file):
+                    try:
+                        os.remove(output_file)
+                    except OSError as e:
+                        self.log(f"Cannot remove partial output {output_file}: {str(e)}")
+
+                futures.append(pool.submit(self.run_job, f"{position}/{total}",
+                                           input_file, output_file, cmd,
+                                           manifest, fingerprint))
+
+            if finished:
+                self.log(f"Skipping {finished} file(s) that are already done or up to date")
+                self.on_progress(finished, total)
+
+            for future in as_completed(futures):
+                results[future.result()] += 1
+                finished += 1
+                self.on_progress(finished, total)
+
+        journal.save(force=True)
+        if journal.is_complete():
+            # Nothing left to resume
+            try:
+                os.remove(journal.path)
+            except OSError:
+                pass
+        return results
+
+    def run_job(self, position, input_file, output_file, cmd, manifest, fingerprint):
+        """Process one file on a worker thread, returning its final state"""
+        journal = self.journal
+        if not self.running:
+            journal.update(input_file, status='stopped')
+            self.on_state(input_file, 'stopped')
+            return 'stopped'
+
+        name = os.path.basename(input_file)
+        journal.update(input_file, status='running')
+        self.on_state(input_file, 'running')
+        self.log(f"Processing {position}: {name}")
+
+        state = 'failed'
+        error = ''
+        try:
+            if cmd is None:
+                raise ValueError("Command could not be built")
+            self.log(f"Command: {' '.join(cmd)}")
+
+            returncode, output_lines = self.run_process(cmd)
+
+            if returncode == 0:
+                state = 'done'
+                stat = os.stat(output_file)
+                journal.update(input_file, status='done', checksum=file_checksum(output_file),
+                               size=stat.st_size, mtime=stat.st_mtime_ns)
+                if fingerprint:
+                    try:
+                        manifest.record(output_file, fingerprint)
+                    except OSError as e:
+                        self.log(f"Cannot update output manifest: {str(e)}")
+                self.log(f"✓ Completed: {name}")
+            elif not self.running:
+                state = 'stopped'
+                self.log(f"Stopped: {name}")
+            else:
+                error = f"return code {returncode}"
+                self.log(f"✗ Failed: {name} (return code: {returncode})")
+                # Log last few lines of output for debugging
+                for line in output_lines[-5:]:
+                    if line:
+                        self.log(f"  {line}")
+
+        except Exception as e:
+            state = 'failed'
+            error = str(e)
+            self.log(f"✗ Error processing {name}: {str(e)}")
+            import traceback
+            self.log(traceback.format_exc())
+
+        if state != 'done':
+            journal.update(input_file, status=state, error=error)
+        self.on_state(input_file, state)
+        return state
+
+    def run_process(self, cmd):
+        """Run an FFmpeg command so stop() can terminate it; returns (exit code, output lines)"""
+        process = subprocess.Popen(
+            cmd,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.STDOUT,  # Redirect stderr to stdout
+            text=True,
+            creationflags=subprocess.CREATE_NO_WINDOW if os.name == 'nt' else 0
+        )
+        with self.lock:
+            self.processes.add(process)
+
+        # Read output to prevent buffer blocking
+        output_lines = []
+        try:
+            for line in process.stdout:
+                output_lines.append(line.strip())
+
+            # Wait for process to complete
+            process.wait()
+        finally:
+            with self.lock:
+                self.processes.discard(process)
+        return process.returncode, output_lines
+
+    def measure_loudness(self, input_files):
+        """loudnorm measurements of the files, several decodes at a time"""
+        def run(cmd):
+            returncode, output_lines = self.run_process(cmd)
+            if returncode != 0:
+                raise RuntimeError(f"measurement failed with code {returncode}")
+            return output_lines
+
+        def measure(input_file):
+            if not self.running:
+                return None
+            try:
+                return cached_loudness(self.ffmpeg_path, self.probe_cache, input_file,
+                                       loudnorm_targets({}), run)
+            except Exception as e:
+                self.log(f"✗ Loudness of {os.path.basename(input_file)}: {str(e)} "
+                         f"(falling back to single-pass normalization)")
+                return None
+
+        self.log(f"Measuring loudness of {len(input_files)} file(s)")
+        # The measuring pass is a single-threaded decode, so one per core
+        with ThreadPoolExecutor(max_workers=os.cpu_count() or 1) as pool:
+            return dict(zip(input_files, pool.map(measure, input_files)))
+
+    def search_crfs(self, input_files):
+        """cached_crf of each file, one file at a time (each search is parallel itself)"""
+        def run(cmd):
+            returncode, output_lines = self.run_process(cmd)
+            if returncode != 0:
+                raise RuntimeError(f"CRF search failed with code {returncode}")
+            return output_lines
+
+        options = with_defaults('batch', self.options)
+        self.log(f"Searching the CRF of {len(input_files)} file(s)")
+        crfs = {}
+        for input_file in input_files:
+            if not self.running:
+                break
+            name = os.path.basename(input_file)
+            try:
+                result = cached_crf(self.ffmpeg_path, self.probe_cache, input_file,
+                                    options['convert_codec'], 'medium', [],
+                                    options['convert_quality_metric'],
+                                    options['convert_quality_target'], run)
+            except Exception as e:
+                self.log(f"✗ CRF search of {name}: {str(e)} (using CRF {options['convert_crf']})")
+                continue
+            crfs[input_file] = result['crf']
+            self.log(f"{name}: CRF {result['crf']} "
+                     f"({options['convert_quality_metric']} {result['score']:.4g})")
+        return crfs
+
+
+class JobCancelled(Exception):
+    """Raised inside a job's work once the job has been cancelled"""
+
+
+class Job:
+    """A unit of work for JobScheduler; work(job) runs on a worker thread.
+
+    Work should start FFmpeg through run_ffmpeg/run_checked so cancel()
+    can terminate it, and may call report() to publish its progress.
+    """
+
+    _ids = itertools.count(1)
+
+    def __init__(self, title, work, kind=''):
+        self.id = next(self._ids)
+        self.title = title
+        self.work = work
+        self.kind = kind
+        self.state = 'queued'
+        self.progress = 0.0
+        self.status = ''
+        self.error = ''
+        self.cancelled = False
+        self.on_change = lambda job: None
+        self.processes = set()
+        self.lock = threading.Lock()
+
+    def report(self, progress=None, status=None):
+        """Publish the job's progress (percent) and/or a short status text"""
+        if progress is not None:
+            self.progress = progress
+        if status is not None:
+            self.status = status
+        self.on_change(self)
+
+    def check_cancelled(self):
+        """Raise JobCancelled if the job was cancelled"""
+        if self.cancelled:
+            raise JobCancelled(self.title)
+
+    def cancel(self):
+        """Mark the job cancelled and terminate its FFmpeg processes"""
+        self.cancelled = True
+        with self.lock:
+            for process in self.processes:
+                process.terminate()
+
+    def track(self, process):
+        """Register a process of this job so cancel() can terminate it"""
+        with self.lock:
+            self.processes.add(process)
+        if self.cancelled:
+            process.terminate()
+
+    def untrack(self, process):
+        """Forget a process that has exited"""
+        with self.lock:
+            self.processes.discard(process)
+
+    def run_ffmpeg(self, cmd, duration=None, log=None, progress=None):
+        """run_ffmpeg as part of this job, raising if it fails or is cancelled"""
+        self.check_cancelled()
+        processes = []
+
+        def started(process):
+            processes.append(process)
+            self.track(process)
+
+        try:
+            returncode = run_ffmpeg(cmd, duration, log, progress, started)
+        finally:
+            for process in processes:
+                self.untrack(process)
+        self.check_cancelled()
+        if returncode != 0:
+            raise RuntimeError(f"FFmpeg failed with code {returncode}")
+
+    def run_checked(self, cmd):
+        """Run a helper FFmpeg command to completion, returning its output lines.
+
+        Raises on failure or when the job is cancelled.
+        """
+        self.check_cancelled()
+        process = subprocess.Popen(
+            cmd,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.STDOUT,
+            text=True,
+            creationflags=subprocess.CREATE_NO_WINDOW if os.name == 'nt' else 0
+        )
+        self.track(process)
+        try:
+            output_lines = [line.strip() for line in process.stdout]
+            process.wait()
+        finally:
+            self.untrack(process)
+
+        self.check_cancelled()
+        if process.returncode != 0:
+            tail = '\n'.join(line for line in output_lines[-5:] if line)
+            raise RuntimeError(f"FFmpeg failed with code {process.returncode}:\n{tail}")
+        return output_lines
+
+
+class JobScheduler:
+    """Runs submitted Jobs on their own threads, at most `concurrency` at once.
+
+    on_change(job) is called, possibly from a worker thread, whenever a
+    job's state or progress changes. Finished jobs end up 'done',
+    'failed' (job.error says why) or 'cancelled'.
+    """
+
+    def __init__(self, concurrency=1, on_change=None):
+        self.concurrency = max(1, concurrency)
+        self.on_change = on_change or (lambda job: None)
+        self.pending = []
+        self.running = set()
+        self.lock = threading.Lock()
+
+    def submit(self, job):
+        """Queue a job; it starts as soon as a slot is free"""
+        job.on_change = self.on_change
+        with self.lock:
+            self.pending.append(job)
+        self.on_change(job)
+        self._start_jobs()
+        return job
+
+    def cancel(self, job):
+        """Cancel a queued or running job"""
+        with self.lock:
+            queued = job in self.pending
+            if queued:
+                self.pending.remove(job)
+        if queued:
+            job.cancelled = True
+            job.state = 'cancelled'
+            self.on_change(job)
+        elif job.state == 'running':
+            job.cancel()
+
+    def set_concurrency(self, concurrency):
+        """Change how many jobs may run at once"""
+        self.concurrency = max(1, concurrency)
+        self._start_jobs()
+
+    def snapshot(self):
+        """(running jobs, queued jobs) as lists"""
+        with self.lock:
+            return list(self.running), list(self.pending)
+
+    def _start_jobs(self):
+        started = []
+        with self.lock:
+            while self.pending and len(self.running) < self.concurrency:
+                job = self.pending.pop(0)
+                job.state = 'running'
+                self.running.add(job)
+                started.append(job)
+        for job in started:
+            self.on_change(job)
+            thread = threading.Thread(target=self._run, args=(job,))
+            thread.daemon = True
+            thread.start()
+
+    def _run(self, job):
+        try:
+            job.work(job)
+            job.state = 'cancelled' if job.cancelled else 'done'
+            if job.state == 'done':
+                job.progress = 100.0
+        except Exception as e:
+            if job.cancelled:
+                job.state = 'cancelled'
+            else:
+                job.state = 'failed'
+                job.error = str(e)
+        finally:
+            with self.lock:
+                self.running.discard(job)
+            self.on_change(job)
+            self._start_jobs()
+
+
+# Headless mode
+
+# Single-file operations of a job spec and their builders
+COMMAND_BUILDERS = {
+    'convert': build_convert_command,
+    'filter': build_filter_command,
+    'subtitle': build_subtitle_command,
+    'watermark': build_watermark_command,
+    'pipeline': build_pipeline_command,
+}
+
+
+def run_job(ffmpeg_path, job, probe_cache, log=print):
+    """Run one job of a job spec, returning True on success"""
+    operation = job.get('operation')
+    if operation == 'batch':
+        return run_batch_spec(ffmpeg_path, job, probe_cache, log)
+
+    list_file = None
+    try:
+        if operation == 'convert' and with_defaults('convert', job)['chunked']:
+            chunked_encode(ffmpeg_path, job, probe_cache, Job(operation, None), log)
+            log(f"✓ {operation} completed: {job['output']}")
+            return True
+        elif operation == 'convert' and with_defaults('convert', job)['target_enable']:
+            target_size_encode(ffmpeg_path, job, probe_cache, Job(operation, None), log)
+            log(f"✓ {operation} completed: {job['output']}")
+            return True
+        elif operation == 'trim' and with_defaults('trim', job)['smartcut']:
+            smart_cut(ffmpeg_path, job, probe_cache, Job(operation, None), log)
+            log(f"✓ {operation} completed: {job['output']}")
+            return True
+        elif operation == 'convert' and with_defaults('convert', job)['quality_enable']:
+            result = convert_crf(ffmpeg_path, job, probe_cache, Job(operation, None).run_checked, log)
+            log(f"Quality target: CRF {result['crf']} ({result['score']:.4g})")
+            cmd = build_convert_command(ffmpeg_path, dict(job, crf=result['crf']))
+        elif operation == 'filter':
+            cmd = build_filter_command(ffmpeg_path, job, frame_size(probe_cache, job.get('input')))
+        elif operation in COMMAND_BUILDERS:
+            cmd = COMMAND_BUILDERS[operation](ffmpeg_path, job)
+        elif operation == 'audio':
+            require(job, ['input', 'output'], "Please specify both input and output files")
+            loudness = audio_loudness(ffmpeg_path, job, probe_cache, Job(operation, None).run_checked)
+            cmd = build_audio_command(ffmpeg_path, job, probe_cache.duration(job['input'])
+                                      if with_defaults('audio', job)['fadeout'] else None, loudness,
+                                      audio_stream(probe_cache, job['input']))
+        elif operation == 'gif':
+            make_gif(ffmpeg_path, job, Job(operation, None), log)
+            log(f"✓ {operation} completed: {job['output']}")
+            return True
+        elif operation == 'thumbnail':
+            cmd = build_thumbnail_command(ffmpeg_path, job, probe_cache.duration(job.get('input')))
+        elif operation == 'trim':
+            keyframes = None
+            if not with_defaults('trim', job)['reencode']:
+                keyframes = probe_cache.keyframes(job['input'])[0]
+            cmd = build_trim_command(ffmpeg_path, job, keyframes)
+        elif operation == 'merge' and smart_merge_enabled(job):
+            output_file, = require(job, ['output'], "Please specify output file")
+            smart_merge(ffmpeg_path, job.get('files', []), output_file, probe_cache,
+                        Job(operation, None), log, with_defaults('merge', job)['reencode'])
+            log(f"✓ {operation} completed: {output_file}")
+            return True
+        elif operation == 'merge':
+            import tempfile
+            fd, list_file = tempfile.mkstemp(suffix='.txt')
+            os.close(fd)
+            cmd = build_merge_command(ffmpeg_path, job, list_file)
+        else:
+            raise ValueError(f"Unknown operation: {operation}")
+
+        log(f"Command: {' '.join(cmd)}")
+        last_report = [0.0]
+
+        def progress(report, duration):
+            # A line every few seconds is plenty for a log file
+            now = time.monotonic()
+            if now - last_report[0] >= 5 or report.done:
+                last_report[0] = now
+                log(f"  {report.percent(duration):.1f}% ({report.out_time:.1f}s / {duration:.1f}s)"
+                    f" {report.fps:.0f} fps, {report.speed:.2f}x")
+
+        returncode = run_ffmpeg(cmd, expected_duration(cmd, probe_cache), log, progress)
+        if returncode != 0:
+            log(f"✗ {operation} failed with code {returncode}")
+            return False
+        log(f"✓ {operation} completed: {cmd[-1]}")
+        return True
+
+    except Exception as e:
+        log(f"✗ {operation}: {str(e)}")
+        return False
+    finally:
+        if list_file and os.path.exists(list_file):
+            os.remove(list_file)
+
+
+def run_batch_spec(ffmpeg_path, job, probe_cache, log=print):
+    """Run (or with 'journal', resume) a batch job of a job spec"""
+    if job.get('journal'):
+        journal = BatchJournal.load(job['journal'])
+    else:
+        output_folder = job['output_folder']
+        options = with_defaults('batch', job.get('options', {}))
+        os.makedirs(output_folder, exist_ok=True)
+        jobs = [(input_file, batch_output_file(options, input_file, output_folder))
+                for input_file in job['files']]
+        journal = BatchJournal.create(output_folder, options, jobs)
+
+    # Durations order the work longest-first
+    inputs = [item['input'] for item in journal.data['items']]
+    with ThreadPoolExecutor(max_workers=PROBE_WORKERS) as pool:
+        durations = dict(zip(inputs, pool.map(probe_cache.duration, inputs)))
+
+    runner = BatchRunner(ffmpeg_path, journal, durations, log=log,
+                         on_progress=lambda finished, total: log(f"Finished {finished}/{total}"),
+                         probe_cache=probe_cache)
+    results = runner.run()
+    summary = ', '.join(f"{count} {state}" for state, count in results.items() if count)
+    log(f"Batch processing complete! {summary or 'nothing to do'}")
+    return journal.is_complete()
+
+
+def run_headless(argv):
+    """Entry point of python main.py --headless job.json; returns the exit code"""
+    import argparse
+
+    parser = argparse.ArgumentParser(prog='main.py --headless',
+                                     description="Run FFmpeg GUI jobs without a display")
+    parser.add_argument('--headless', metavar='JOB_FILE', required=True,
+                        help="JSON job spec: one job object, a list of jobs or {\"jobs\": [...]}")
+    parser.add_argument('--ffmpeg', metavar='PATH', help="FFmpeg executable (default: from the spec or config.json)")
+    args = parser.parse_args(argv)
+
+    with open(args.headless, 'r', encoding='utf-8') as f:
+        spec = json.load(f)
+    if isinstance(spec, list):
+        spec = {'jobs': spec}
+    elif 'jobs' not in spec:
+        spec = {'jobs': [spec]}
+
+    # Same settings and probe cache as the GUI when run from its folder
+    config_file = Path("config.json")
+    config = {}
+    if config_file.exists():
+        with open(config_file, 'r', encoding='utf-8') as f:
+            config = json.load(f)
+    ffmpeg_path = args.ffmpeg or spec.get('ffmpeg_path') or config.get('ffmpeg_path', 'ffmpeg')
+    probe_cache = ProbeCache(config_file.with_name('probe_cache.db'), ffprobe_path_for(ffmpeg_path))
+
+    def log(message):
+        print(message, flush=True)
+
+    failed = 0
+    for number, job in enumerate(spec['jobs'], 1):
+        log(f"Job {number}/{len(spec['jobs'])}: {job.get('operation')}")
+        if not run_job(ffmpeg_path, job, probe_cache, log):
+            failed += 1
+    if failed:
+        log(f"{failed} job(s) failed")
+    return 1 if failed else 0
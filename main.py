@@ -3,14 +3,65 @@ FFmpeg GUI - Main Application
 Supports video conversion, editing, audio extraction and more
 """
 
+import sys
+
+if __name__ == "__main__" and '--headless' in sys.argv[1:]:
+    # Render nodes have no display: run the job spec before Tk is imported
+    from ffmpeg_core import run_headless
+    sys.exit(run_headless(sys.argv[1:]))
+
 import tkinter as tk
 from tkinter import ttk, filedialog, messagebox, scrolledtext
 import os
 import subprocess
 import threading
+import queue
 import json
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 
+import ffmpeg_core
+from ffmpeg_core import (
+    OPTION_DEFAULTS, PROBE_WORKERS, BATCH_JOURNAL_NAME, THUMBNAIL_CACHE, BatchJournal, BatchRunner,
+    Job, JobScheduler, OutputCache, ProbeCache,
+    batch_jobs, batch_output_file, convert_paths,
+    expected_duration, ffprobe_path_for, format_duration, format_size,
+    cached_thumbnail_sheet, parse_bitrate, summarize_probe, trim_settings,
+)
+
+# How often worker-thread UI updates are applied, in milliseconds
+UI_REFRESH_MS = 100
+
+# Oldest log lines are dropped beyond this, keeping inserts cheap
+MAX_LOG_LINES = 5000
+
+# Inline previews: quiet time after the last settings change before rendering,
+# and the largest width a preview frame is rendered at
+PREVIEW_DELAY_MS = 250
+PREVIEW_WIDTH = 400
+
+# Batch list columns: (id, heading, width)
+BATCH_COLUMNS = [
+    ('duration', 'Duration', 80),
+    ('resolution', 'Resolution', 90),
+    ('codecs', 'Codecs', 110),
+    ('size', 'Size', 80),
+    ('estimate', 'Est. Output', 90),
+    ('status', 'Status', 80),
+]
+
+# Colors for batch file and queued job states
+STATE_COLORS = {
+    'queued': 'black',
+    'running': 'blue',
+    'done': 'green',
+    'up to date': 'dark green',
+    'failed': 'red',
+    'stopped': 'gray',
+    'cancelled': 'gray',
+}
+
+
 class FFmpegGUI:
     def __init__(self, root):
         self.root = root
@@ -21,17 +72,36 @@ class FFmpegGUI:
         self.config_file = Path("config.json")
         self.load_config()
 
-        # Current processing task
-        self.current_process = None
-        self.is_processing = False
+        # Probe results shared by all tabs, stored next to the config
+        self.probe_cache = ProbeCache(self.config_file.with_name('probe_cache.db'),
+                                      self.get_ffprobe_path())
+        # Contact sheets, kept in the temp folder
+        self.thumbnail_cache = OutputCache(*THUMBNAIL_CACHE)
+
+        # Inline previews of the Filters and Watermark tabs, rendered one at a time
+        self.previews = {}
+        self.preview_pool = ThreadPoolExecutor(max_workers=1)
+
+        # Jobs started from the tabs, run a few at a time and listed in the queue panel
+        self.scheduler = JobScheduler(self.config.get('queue_jobs', 1), on_change=self.on_job_change)
+        self.queue_items = {}
+
+        # UI updates from worker threads, applied by process_ui_queue
+        self.ui_queue = queue.Queue()
+        self.ui_pending = {}
+        self.ui_lock = threading.Lock()
 
         # Create main UI
         self.create_menu()
         self.create_main_ui()
+        self.root.after(UI_REFRESH_MS, self.process_ui_queue)
 
         # Check FFmpeg
         self.check_ffmpeg()
 
+        # Point out a batch that was interrupted last time
+        self.check_unfinished_batch()
+
     def load_config(self):
         """Load configuration file"""
         if self.config_file.exists():
@@ -173,6 +243,35 @@ class FFmpegGUI:
                  width=15).pack(side='left', padx=5)
         ttk.Label(bitrate_frame, text="(e.g., 2M, 5000k)").pack(side='left', padx=5)
 
+        # Target file size (two-pass)
+        target_frame = ttk.Frame(quality_frame)
+        target_frame.pack(fill='x', pady=5)
+        self.convert_target_enable_var = tk.BooleanVar(value=False)
+        ttk.Checkbutton(target_frame, text="Target Size (2-pass):",
+                       variable=self.convert_target_enable_var).pack(side='left', padx=5)
+        self.convert_target_sizes_var = tk.StringVar(value="25MB")
+        ttk.Entry(target_frame, textvariable=self.convert_target_sizes_var,
+                 width=20).pack(side='left', padx=5)
+        ttk.Label(target_frame, text="Audio Bitrate:").pack(side='left', padx=5)
+        self.convert_abitrate_var = tk.StringVar(value="128k")
+        ttk.Combobox(target_frame, textvariable=self.convert_abitrate_var,
+                    values=["64k", "96k", "128k", "160k", "192k", "256k"], width=8).pack(side='left', padx=5)
+        ttk.Label(target_frame, text="(e.g., 25MB or 10MB, 50MB; libx264/libx265)").pack(side='left', padx=5)
+
+        # Quality target (CRF search)
+        quality_target_frame = ttk.Frame(quality_frame)
+        quality_target_frame.pack(fill='x', pady=5)
+        self.convert_quality_enable_var = tk.BooleanVar(value=False)
+        ttk.Checkbutton(quality_target_frame, text="Auto CRF for quality:",
+                       variable=self.convert_quality_enable_var).pack(side='left', padx=5)
+        self.convert_quality_metric_var = tk.StringVar(value="ssim")
+        ttk.Combobox(quality_target_frame, textvariable=self.convert_quality_metric_var,
+                    values=["ssim", "psnr"], width=6, state='readonly').pack(side='left', padx=5)
+        self.convert_quality_target_var = tk.StringVar(value="0.98")
+        ttk.Entry(quality_target_frame, textvariable=self.convert_quality_target_var,
+                 width=8).pack(side='left', padx=5)
+        ttk.Label(quality_target_frame, text="(SSIM 0.95-0.99 or PSNR 38-45 dB; sampled, cached per file)").pack(side='left', padx=5)
+
         # Resolution
         resolution_frame = ttk.LabelFrame(main_container, text="Resolution", padding=10)
         resolution_frame.pack(fill='x', pady=5)
@@ -219,14 +318,33 @@ class FFmpegGUI:
         adv_controls = ttk.Frame(advanced_frame)
         adv_controls.pack(fill='x', pady=5)
 
-        self.convert_2pass_var = tk.BooleanVar(value=False)
-        ttk.Checkbutton(adv_controls, text="2-Pass Encoding",
-                       variable=self.convert_2pass_var).pack(side='left', padx=5)
-
         self.convert_hw_accel_var = tk.BooleanVar(value=False)
         ttk.Checkbutton(adv_controls, text="Hardware Acceleration",
                        variable=self.convert_hw_accel_var).pack(side='left', padx=5)
 
+        # Chunked encode
+        chunk_frame = ttk.Frame(advanced_frame)
+        chunk_frame.pack(fill='x', pady=5)
+        self.convert_chunked_var = tk.BooleanVar(value=False)
+        ttk.Checkbutton(chunk_frame, text="Chunked Encode (split at keyframes, encode in parallel)",
+                       variable=self.convert_chunked_var).pack(side='left', padx=5)
+        ttk.Label(chunk_frame, text="Segments:").pack(side='left', padx=5)
+        self.convert_segments_var = tk.StringVar(value="0")
+        ttk.Spinbox(chunk_frame, from_=0, to=256, textvariable=self.convert_segments_var,
+                   width=8).pack(side='left', padx=5)
+        ttk.Label(chunk_frame, text="(0=auto)").pack(side='left', padx=5)
+
+        # Several sizes from one decode
+        renditions_frame = ttk.Frame(advanced_frame)
+        renditions_frame.pack(fill='x', pady=5)
+        self.convert_renditions_enable_var = tk.BooleanVar(value=False)
+        ttk.Checkbutton(renditions_frame, text="Renditions (decode once, encode several sizes):",
+                       variable=self.convert_renditions_enable_var).pack(side='left', padx=5)
+        self.convert_renditions_var = tk.StringVar(value="1080,720,480")
+        ttk.Entry(renditions_frame, textvariable=self.convert_renditions_var,
+                 width=25).pack(side='left', padx=5)
+        ttk.Label(renditions_frame, text="(height or WxH, optional :bitrate, e.g. 1080:5M; output_720p.mp4 ...)").pack(side='left', padx=5)
+
         # Custom FFmpeg arguments
         custom_frame = ttk.Frame(advanced_frame)
         custom_frame.pack(fill='x', pady=5)
@@ -246,7 +364,7 @@ class FFmpegGUI:
         ttk.Button(button_frame, text="Preview Input",
                   command=lambda: self.preview_video(self.convert_input_entry.get())).pack(side='left', padx=5)
         ttk.Button(button_frame, text="Stop",
-                  command=self.stop_process).pack(side='left', padx=5)
+                  command=lambda: self.stop_process('convert')).pack(side='left', padx=5)
 
     def create_edit_tab(self):
         """Video editing tab"""
@@ -266,6 +384,15 @@ class FFmpegGUI:
         # Filters tab
         self.create_filter_tab(edit_notebook)
 
+        # Pipeline tab (several edits, one encode)
+        self.create_pipeline_tab(edit_notebook)
+
+        # Thumbnails tab
+        self.create_thumbnail_tab(edit_notebook)
+
+        # GIF tab
+        self.create_gif_tab(edit_notebook)
+
     def create_trim_tab(self, parent):
         """Create trim/cut video tab"""
         trim_frame = ttk.Frame(parent)
@@ -327,6 +454,10 @@ class FFmpegGUI:
         ttk.Checkbutton(reencode_frame, text="Re-encode (slower but more accurate)",
                        variable=self.trim_reencode_var).pack(side='left', padx=5)
 
+        self.trim_smartcut_var = tk.BooleanVar(value=False)
+        ttk.Checkbutton(reencode_frame, text="Smart Cut (frame-accurate, re-encodes only the cut GOPs)",
+                       variable=self.trim_smartcut_var).pack(side='left', padx=5)
+
         # Output file
         output_frame = ttk.LabelFrame(main_container, text="Output File", padding=10)
         output_frame.pack(fill='x', pady=5)
@@ -345,7 +476,7 @@ class FFmpegGUI:
         ttk.Button(button_frame, text="Show Command",
                   command=self.show_trim_command).pack(side='left', padx=5)
         ttk.Button(button_frame, text="Stop",
-                  command=self.stop_process).pack(side='left', padx=5)
+                  command=lambda: self.stop_process('trim')).pack(side='left', padx=5)
 
     def create_merge_tab(self, parent):
         """Create merge/concatenate videos tab"""
@@ -391,9 +522,13 @@ class FFmpegGUI:
         options_frame.pack(fill='x', pady=5)
 
         self.merge_reencode_var = tk.BooleanVar(value=False)
-        ttk.Checkbutton(options_frame, text="Re-encode (required if videos have different formats/resolutions)",
+        ttk.Checkbutton(options_frame, text="Re-encode all inputs (H.264/AAC)",
                        variable=self.merge_reencode_var).pack(side='left', padx=5)
 
+        self.merge_analyze_var = tk.BooleanVar(value=True)
+        ttk.Checkbutton(options_frame, text="Smart merge (re-encode only inputs that don't match the rest)",
+                       variable=self.merge_analyze_var).pack(side='left', padx=5)
+
         # Output file
         output_frame = ttk.LabelFrame(main_container, text="Output File", padding=10)
         output_frame.pack(fill='x', pady=5)
@@ -412,7 +547,7 @@ class FFmpegGUI:
         ttk.Button(button_frame, text="Show Command",
                   command=self.show_merge_command).pack(side='left', padx=5)
         ttk.Button(button_frame, text="Stop",
-                  command=self.stop_process).pack(side='left', padx=5)
+                  command=lambda: self.stop_process('merge')).pack(side='left', padx=5)
 
         # Store file list
         self.merge_files = []
@@ -519,6 +654,23 @@ class FFmpegGUI:
         ttk.Spinbox(blur_controls, from_=1, to=20, increment=1,
                    textvariable=self.filter_blur_radius_var, width=10).pack(side='left', padx=5)
 
+        # Resize and graph optimization
+        scale_frame = ttk.LabelFrame(filters_frame, text="Resize & Optimization", padding=5)
+        scale_frame.pack(fill='x', pady=5)
+
+        scale_controls = ttk.Frame(scale_frame)
+        scale_controls.pack(fill='x')
+
+        ttk.Label(scale_controls, text="Resize to height:").pack(side='left', padx=5)
+        self.filter_scale_var = tk.StringVar(value="none")
+        ttk.Combobox(scale_controls, textvariable=self.filter_scale_var, width=8,
+                    values=['none', '2160', '1440', '1080', '720', '480', '360']).pack(side='left', padx=5)
+
+        self.filter_optimize_var = tk.BooleanVar(value=True)
+        ttk.Checkbutton(scale_controls, text="Optimize filter graph (merge rotations/flips, "
+                                            "downscale first, stream copy if nothing changes)",
+                       variable=self.filter_optimize_var).pack(side='left', padx=15)
+
         # Output file
         output_frame = ttk.LabelFrame(main_container, text="Output File", padding=10)
         output_frame.pack(fill='x', pady=5)
@@ -536,8 +688,322 @@ class FFmpegGUI:
                   command=self.start_filter).pack(side='left', padx=5)
         ttk.Button(button_frame, text="Show Command",
                   command=self.show_filter_command).pack(side='left', padx=5)
+        ttk.Button(button_frame, text="Benchmark Optimizer",
+                  command=self.benchmark_filters).pack(side='left', padx=5)
+        ttk.Button(button_frame, text="Stop",
+                  command=lambda: self.stop_process('filter')).pack(side='left', padx=5)
+
+        self.create_preview_panel(main_container, 'filter')
+
+    def create_preview_panel(self, parent, tab):
+        """Inline preview of a tab's output, re-rendered as its settings change"""
+        preview_frame = ttk.LabelFrame(parent, text="Preview", padding=10)
+        preview_frame.pack(fill='both', expand=True, pady=5)
+
+        controls = ttk.Frame(preview_frame)
+        controls.pack(fill='x')
+
+        live_var = tk.BooleanVar(value=False)
+        ttk.Checkbutton(controls, text="Live preview", variable=live_var,
+                       command=lambda: self.schedule_preview(tab)).pack(side='left', padx=5)
+        ttk.Label(controls, text="Time:").pack(side='left', padx=5)
+        time_var = tk.DoubleVar(value=0.0)
+        time_scale = ttk.Scale(controls, from_=0.0, to=60.0, orient='horizontal', length=300,
+                               variable=time_var, command=lambda value: self.schedule_preview(tab))
+        time_scale.pack(side='left', padx=5)
+        time_label = ttk.Label(controls, text="00:00:00")
+        time_label.pack(side='left', padx=5)
+
+        image_label = ttk.Label(preview_frame, anchor='center')
+        image_label.pack(fill='both', expand=True, pady=5)
+
+        self.previews[tab] = {'live': live_var, 'time': time_var, 'scale': time_scale,
+                              'time_label': time_label, 'label': image_label,
+                              'after': None, 'generation': 0, 'image': None}
+
+        # Any setting of the tab refreshes the preview
+        for key in OPTION_DEFAULTS[tab]:
+            var = getattr(self, f'{tab}_{key}_var', None)
+            if var is not None:
+                var.trace_add('write', lambda *args: self.schedule_preview(tab))
+
+    def schedule_preview(self, tab):
+        """Render a tab's preview once its settings stop changing for a moment"""
+        preview = self.previews[tab]
+        preview['time_label'].config(text=format_duration(preview['time'].get()))
+        if preview['after'] is not None:
+            self.root.after_cancel(preview['after'])
+            preview['after'] = None
+        if preview['live'].get():
+            preview['after'] = self.root.after(PREVIEW_DELAY_MS, lambda: self.render_preview(tab))
+
+    def render_preview(self, tab):
+        """Render one downscaled frame of a tab's output in the background"""
+        preview = self.previews[tab]
+        preview['after'] = None
+        options = self.get_tab_options(tab)
+        if not options['input'] or not os.path.exists(options['input']):
+            preview['label'].config(image='', text="Select an input file to preview")
+            return
+        timestamp = preview['time'].get()
+        preview['generation'] += 1
+        generation = preview['generation']
+
+        def work():
+            # A newer render was requested while this one waited
+            if generation != preview['generation']:
+                return
+            duration = self.probe_cache.duration(options['input'])
+            # Stay clear of the end, where there may be no frame left to show
+            seek = min(timestamp, max(0.0, duration - 1)) if duration else timestamp
+            try:
+                cmd = ffmpeg_core.build_preview_command(
+                    self.config['ffmpeg_path'], tab, options, seek, PREVIEW_WIDTH,
+                    ffmpeg_core.frame_size(self.probe_cache, options['input']))
+                data = ffmpeg_core.render_preview(cmd)
+            except Exception as e:
+                message = str(e)
+                self.ui_call(lambda: fail(message))
+                return
+            self.ui_call(lambda: show(data, duration))
+
+        def fail(message):
+            # Only the latest render may replace what is shown
+            if generation == preview['generation']:
+                preview['label'].config(image='', text=f"Preview failed: {message}")
+
+        def show(data, duration):
+            if duration:
+                preview['scale'].config(to=duration)
+            if generation == preview['generation']:
+                preview['image'] = tk.PhotoImage(data=data, format='PPM')
+                preview['label'].config(image=preview['image'], text='')
+
+        self.preview_pool.submit(work)
+
+    def create_pipeline_tab(self, parent):
+        """Create tab that chains edits from the other tabs into one encode"""
+        pipeline_frame = ttk.Frame(parent)
+        parent.add(pipeline_frame, text="Pipeline")
+
+        main_container = ttk.Frame(pipeline_frame)
+        main_container.pack(fill='both', expand=True, padx=10, pady=10)
+
+        # Input file
+        input_frame = ttk.LabelFrame(main_container, text="Input File", padding=10)
+        input_frame.pack(fill='x', pady=5)
+
+        self.pipeline_input_entry = ttk.Entry(input_frame, width=70)
+        self.pipeline_input_entry.pack(side='left', fill='x', expand=True, padx=5)
+        ttk.Button(input_frame, text="Browse",
+                  command=self.browse_pipeline_input).pack(side='left', padx=5)
+
+        # Steps
+        steps_frame = ttk.LabelFrame(main_container,
+                                     text="Steps (run in order, in one pass; settings are taken from each tab when added)",
+                                     padding=10)
+        steps_frame.pack(fill='both', expand=True, pady=5)
+
+        list_container = ttk.Frame(steps_frame)
+        list_container.pack(fill='both', expand=True)
+
+        scrollbar = ttk.Scrollbar(list_container)
+        scrollbar.pack(side='right', fill='y')
+
+        self.pipeline_listbox = tk.Listbox(list_container, height=6,
+                                           yscrollcommand=scrollbar.set)
+        self.pipeline_listbox.pack(side='left', fill='both', expand=True)
+        scrollbar.config(command=self.pipeline_listbox.yview)
+
+        add_buttons = ttk.Frame(steps_frame)
+        add_buttons.pack(fill='x', pady=5)
+        for label, operation in [("Add Trim", 'trim'), ("Add Filters", 'filter'),
+                                 ("Add Watermark", 'watermark'), ("Add Subtitles", 'subtitle')]:
+            ttk.Button(add_buttons, text=label,
+                      command=lambda op=operation: self.add_pipeline_step(op)).pack(side='left', padx=5)
+
+        list_buttons = ttk.Frame(steps_frame)
+        list_buttons.pack(fill='x', pady=5)
+        ttk.Button(list_buttons, text="Remove Selected",
+                  command=self.remove_pipeline_step).pack(side='left', padx=5)
+        ttk.Button(list_buttons, text="Clear All",
+                  command=self.clear_pipeline_steps).pack(side='left', padx=5)
+        ttk.Button(list_buttons, text="Move Up",
+                  command=lambda: self.move_pipeline_step(-1)).pack(side='left', padx=5)
+        ttk.Button(list_buttons, text="Move Down",
+                  command=lambda: self.move_pipeline_step(1)).pack(side='left', padx=5)
+
+        # Encoding
+        encode_frame = ttk.LabelFrame(main_container, text="Encoding (libx264, once for all steps)", padding=10)
+        encode_frame.pack(fill='x', pady=5)
+
+        ttk.Label(encode_frame, text="CRF:").pack(side='left', padx=5)
+        self.pipeline_crf_var = tk.StringVar(value="23")
+        ttk.Spinbox(encode_frame, from_=0, to=51, textvariable=self.pipeline_crf_var,
+                   width=8).pack(side='left', padx=5)
+        ttk.Label(encode_frame, text="Preset:").pack(side='left', padx=10)
+        self.pipeline_preset_var = tk.StringVar(value="medium")
+        ttk.Combobox(encode_frame, textvariable=self.pipeline_preset_var, state='readonly', width=12,
+                    values=['ultrafast', 'superfast', 'veryfast', 'faster', 'fast', 'medium',
+                            'slow', 'slower', 'veryslow']).pack(side='left', padx=5)
+
+        # Output file
+        output_frame = ttk.LabelFrame(main_container, text="Output File", padding=10)
+        output_frame.pack(fill='x', pady=5)
+
+        self.pipeline_output_entry = ttk.Entry(output_frame, width=70)
+        self.pipeline_output_entry.pack(side='left', fill='x', expand=True, padx=5)
+        ttk.Button(output_frame, text="Browse",
+                  command=self.browse_pipeline_output).pack(side='left', padx=5)
+
+        # Action buttons
+        button_frame = ttk.Frame(main_container)
+        button_frame.pack(fill='x', pady=10)
+
+        ttk.Button(button_frame, text="Run Pipeline",
+                  command=self.start_pipeline).pack(side='left', padx=5)
+        ttk.Button(button_frame, text="Show Command",
+                  command=self.show_pipeline_command).pack(side='left', padx=5)
+        ttk.Button(button_frame, text="Stop",
+                  command=lambda: self.stop_process('pipeline')).pack(side='left', padx=5)
+
+        # Steps as option dicts for ffmpeg_core.build_pipeline_command
+        self.pipeline_steps = []
+
+    def create_thumbnail_tab(self, parent):
+        """Create contact sheet (thumbnail grid) tab"""
+        thumbnail_frame = ttk.Frame(parent)
+        parent.add(thumbnail_frame, text="Thumbnails")
+
+        main_container = ttk.Frame(thumbnail_frame)
+        main_container.pack(fill='both', expand=True, padx=10, pady=10)
+
+        # Input file
+        input_frame = ttk.LabelFrame(main_container, text="Input File", padding=10)
+        input_frame.pack(fill='x', pady=5)
+
+        self.thumbnail_input_entry = ttk.Entry(input_frame, width=70)
+        self.thumbnail_input_entry.pack(side='left', fill='x', expand=True, padx=5)
+        ttk.Button(input_frame, text="Browse",
+                  command=self.browse_thumbnail_input).pack(side='left', padx=5)
+
+        # Grid settings
+        settings_frame = ttk.LabelFrame(main_container, text="Contact Sheet (keyframes only, evenly spaced)",
+                                        padding=10)
+        settings_frame.pack(fill='x', pady=5)
+
+        ttk.Label(settings_frame, text="Columns:").pack(side='left', padx=5)
+        self.thumbnail_columns_var = tk.StringVar(value="4")
+        ttk.Spinbox(settings_frame, from_=1, to=12, textvariable=self.thumbnail_columns_var,
+                   width=5).pack(side='left', padx=5)
+        ttk.Label(settings_frame, text="Rows:").pack(side='left', padx=5)
+        self.thumbnail_rows_var = tk.StringVar(value="4")
+        ttk.Spinbox(settings_frame, from_=1, to=12, textvariable=self.thumbnail_rows_var,
+                   width=5).pack(side='left', padx=5)
+        ttk.Label(settings_frame, text="Thumbnail width:").pack(side='left', padx=5)
+        self.thumbnail_width_var = tk.StringVar(value="320")
+        ttk.Combobox(settings_frame, textvariable=self.thumbnail_width_var,
+                    values=["160", "240", "320", "480", "640"], width=8).pack(side='left', padx=5)
+
+        # Output file
+        output_frame = ttk.LabelFrame(main_container, text="Output File", padding=10)
+        output_frame.pack(fill='x', pady=5)
+
+        self.thumbnail_output_entry = ttk.Entry(output_frame, width=70)
+        self.thumbnail_output_entry.pack(side='left', fill='x', expand=True, padx=5)
+        ttk.Button(output_frame, text="Browse",
+                  command=self.browse_thumbnail_output).pack(side='left', padx=5)
+
+        # Action buttons
+        button_frame = ttk.Frame(main_container)
+        button_frame.pack(fill='x', pady=10)
+
+        ttk.Button(button_frame, text="Preview",
+                  command=self.preview_thumbnail_sheet).pack(side='left', padx=5)
+        ttk.Button(button_frame, text="Save Sheet",
+                  command=self.start_thumbnail_sheet).pack(side='left', padx=5)
+        ttk.Button(button_frame, text="Show Command",
+                  command=self.show_thumbnail_command).pack(side='left', padx=5)
         ttk.Button(button_frame, text="Stop",
-                  command=self.stop_process).pack(side='left', padx=5)
+                  command=lambda: self.stop_process('thumbnail')).pack(side='left', padx=5)
+
+        # Sheet preview
+        self.thumbnail_preview_label = ttk.Label(main_container)
+        self.thumbnail_preview_label.pack(fill='both', expand=True, pady=5)
+
+    def create_gif_tab(self, parent):
+        """Create GIF maker tab"""
+        gif_frame = ttk.Frame(parent)
+        parent.add(gif_frame, text="GIF")
+
+        main_container = ttk.Frame(gif_frame)
+        main_container.pack(fill='both', expand=True, padx=10, pady=10)
+
+        # Input file
+        input_frame = ttk.LabelFrame(main_container, text="Input File", padding=10)
+        input_frame.pack(fill='x', pady=5)
+
+        self.gif_input_entry = ttk.Entry(input_frame, width=70)
+        self.gif_input_entry.pack(side='left', fill='x', expand=True, padx=5)
+        ttk.Button(input_frame, text="Browse",
+                  command=self.browse_gif_input).pack(side='left', padx=5)
+
+        # Time range
+        range_frame = ttk.LabelFrame(main_container, text="Time Range", padding=10)
+        range_frame.pack(fill='x', pady=5)
+
+        ttk.Label(range_frame, text="Start (HH:MM:SS):").pack(side='left', padx=5)
+        self.gif_start_var = tk.StringVar(value="00:00:00")
+        ttk.Entry(range_frame, textvariable=self.gif_start_var, width=15).pack(side='left', padx=5)
+        ttk.Label(range_frame, text="Duration (seconds or HH:MM:SS):").pack(side='left', padx=10)
+        self.gif_duration_var = tk.StringVar(value="5")
+        ttk.Entry(range_frame, textvariable=self.gif_duration_var, width=15).pack(side='left', padx=5)
+
+        # Frame settings
+        settings_frame = ttk.LabelFrame(main_container, text="GIF Settings (two-pass palette)", padding=10)
+        settings_frame.pack(fill='x', pady=5)
+
+        ttk.Label(settings_frame, text="FPS:").pack(side='left', padx=5)
+        self.gif_fps_var = tk.StringVar(value="12")
+        ttk.Combobox(settings_frame, textvariable=self.gif_fps_var,
+                    values=["5", "8", "10", "12", "15", "20", "25", "30"], width=6).pack(side='left', padx=5)
+        ttk.Label(settings_frame, text="Width:").pack(side='left', padx=5)
+        self.gif_width_var = tk.StringVar(value="480")
+        ttk.Combobox(settings_frame, textvariable=self.gif_width_var,
+                    values=["240", "320", "480", "640", "800", "0"], width=6).pack(side='left', padx=5)
+        ttk.Label(settings_frame, text="Colors:").pack(side='left', padx=5)
+        self.gif_colors_var = tk.StringVar(value="256")
+        ttk.Combobox(settings_frame, textvariable=self.gif_colors_var,
+                    values=["32", "64", "128", "256"], width=6).pack(side='left', padx=5)
+        ttk.Label(settings_frame, text="Dither:").pack(side='left', padx=5)
+        self.gif_dither_var = tk.StringVar(value="sierra2_4a")
+        ttk.Combobox(settings_frame, textvariable=self.gif_dither_var, state='readonly', width=12,
+                    values=["sierra2_4a", "floyd_steinberg", "bayer", "none"]).pack(side='left', padx=5)
+        ttk.Label(settings_frame, text="Loop:").pack(side='left', padx=5)
+        self.gif_loop_var = tk.StringVar(value="0")
+        ttk.Combobox(settings_frame, textvariable=self.gif_loop_var,
+                    values=["0", "-1", "1", "3"], width=4).pack(side='left', padx=5)
+        ttk.Label(settings_frame, text="(width 0 = original, loop 0 = forever, -1 = once)").pack(side='left', padx=5)
+
+        # Output file
+        output_frame = ttk.LabelFrame(main_container, text="Output File", padding=10)
+        output_frame.pack(fill='x', pady=5)
+
+        self.gif_output_entry = ttk.Entry(output_frame, width=70)
+        self.gif_output_entry.pack(side='left', fill='x', expand=True, padx=5)
+        ttk.Button(output_frame, text="Browse",
+                  command=self.browse_gif_output).pack(side='left', padx=5)
+
+        # Action buttons
+        button_frame = ttk.Frame(main_container)
+        button_frame.pack(fill='x', pady=10)
+
+        ttk.Button(button_frame, text="Create GIF",
+                  command=self.start_gif).pack(side='left', padx=5)
+        ttk.Button(button_frame, text="Show Command",
+                  command=self.show_gif_command).pack(side='left', padx=5)
+        ttk.Button(button_frame, text="Stop",
+                  command=lambda: self.stop_process('gif')).pack(side='left', padx=5)
 
     def create_audio_extract_tab(self):
         """Audio extraction tab"""
@@ -579,6 +1045,23 @@ class FFmpegGUI:
                     values=codecs, width=15, state='readonly').pack(side='left', padx=5)
         ttk.Label(codec_frame, text="(auto = best for format)").pack(side='left', padx=5)
 
+        copy_frame = ttk.Frame(settings_frame)
+        copy_frame.pack(fill='x', pady=5)
+        self.audio_stream_copy_var = tk.BooleanVar(value=True)
+        ttk.Checkbutton(copy_frame, text="Copy without re-encoding when the source already matches "
+                                         "the format, bitrate, sample rate and channels",
+                       variable=self.audio_stream_copy_var).pack(side='left', padx=5)
+
+        # Several formats from one decode
+        multi_frame = ttk.Frame(settings_frame)
+        multi_frame.pack(fill='x', pady=5)
+        self.audio_multi_enable_var = tk.BooleanVar(value=False)
+        ttk.Checkbutton(multi_frame, text="Export several formats at once:",
+                       variable=self.audio_multi_enable_var).pack(side='left', padx=5)
+        self.audio_outputs_var = tk.StringVar(value="mp3:320k, m4a:192k, flac")
+        ttk.Entry(multi_frame, textvariable=self.audio_outputs_var, width=30).pack(side='left', padx=5)
+        ttk.Label(multi_frame, text="(format:bitrate, ...; files are named after the output file)").pack(side='left', padx=5)
+
         # Bitrate
         bitrate_frame = ttk.Frame(settings_frame)
         bitrate_frame.pack(fill='x', pady=5)
@@ -592,8 +1075,8 @@ class FFmpegGUI:
         sample_frame = ttk.Frame(settings_frame)
         sample_frame.pack(fill='x', pady=5)
         ttk.Label(sample_frame, text="Sample Rate:").pack(side='left', padx=5)
-        self.audio_sample_var = tk.StringVar(value="44100")
-        samples = ["22050", "44100", "48000", "96000"]
+        self.audio_sample_var = tk.StringVar(value="keep")
+        samples = ["keep", "22050", "44100", "48000", "96000"]
         ttk.Combobox(sample_frame, textvariable=self.audio_sample_var,
                     values=samples, width=15, state='readonly').pack(side='left', padx=5)
         ttk.Label(sample_frame, text="Hz").pack(side='left', padx=5)
@@ -602,7 +1085,9 @@ class FFmpegGUI:
         channel_frame = ttk.Frame(settings_frame)
         channel_frame.pack(fill='x', pady=5)
         ttk.Label(channel_frame, text="Channels:").pack(side='left', padx=5)
-        self.audio_channels_var = tk.StringVar(value="stereo")
+        self.audio_channels_var = tk.StringVar(value="keep")
+        ttk.Radiobutton(channel_frame, text="Keep", variable=self.audio_channels_var,
+                       value="keep").pack(side='left', padx=5)
         ttk.Radiobutton(channel_frame, text="Mono", variable=self.audio_channels_var,
                        value="mono").pack(side='left', padx=5)
         ttk.Radiobutton(channel_frame, text="Stereo", variable=self.audio_channels_var,
@@ -633,6 +1118,28 @@ class FFmpegGUI:
 
         self.audio_volume_var.trace_add('write', update_volume_label)
 
+        loudnorm_controls = ttk.Frame(volume_frame)
+        loudnorm_controls.pack(fill='x', pady=5)
+
+        self.audio_loudnorm_var = tk.BooleanVar(value=False)
+        ttk.Checkbutton(loudnorm_controls, text="Normalize loudness (EBU R128, two-pass):",
+                       variable=self.audio_loudnorm_var).pack(side='left', padx=5)
+
+        ttk.Label(loudnorm_controls, text="Target LUFS:").pack(side='left', padx=5)
+        self.audio_loudnorm_target_var = tk.StringVar(value="-16")
+        ttk.Combobox(loudnorm_controls, textvariable=self.audio_loudnorm_target_var,
+                    values=["-14", "-16", "-19", "-23", "-24"], width=6).pack(side='left', padx=5)
+
+        ttk.Label(loudnorm_controls, text="True peak:").pack(side='left', padx=5)
+        self.audio_loudnorm_peak_var = tk.StringVar(value="-1.5")
+        ttk.Entry(loudnorm_controls, textvariable=self.audio_loudnorm_peak_var,
+                 width=6).pack(side='left', padx=5)
+
+        ttk.Label(loudnorm_controls, text="LRA:").pack(side='left', padx=5)
+        self.audio_loudnorm_range_var = tk.StringVar(value="11")
+        ttk.Entry(loudnorm_controls, textvariable=self.audio_loudnorm_range_var,
+                 width=6).pack(side='left', padx=5)
+
         # Trim audio section
         trim_frame = ttk.LabelFrame(main_container, text="Trim Audio (Optional)", padding=10)
         trim_frame.pack(fill='x', pady=5)
@@ -695,7 +1202,7 @@ class FFmpegGUI:
         ttk.Button(button_frame, text="Show Command",
                   command=self.show_audio_command).pack(side='left', padx=5)
         ttk.Button(button_frame, text="Stop",
-                  command=self.stop_process).pack(side='left', padx=5)
+                  command=lambda: self.stop_process('audio')).pack(side='left', padx=5)
 
     def create_batch_tab(self):
         """Batch processing tab"""
@@ -709,17 +1216,32 @@ class FFmpegGUI:
         list_frame = ttk.LabelFrame(main_container, text="Input Files", padding=10)
         list_frame.pack(fill='both', expand=True, pady=5)
 
-        # Listbox with scrollbar
+        # File table with scrollbar (click a heading to sort)
         list_container = ttk.Frame(list_frame)
         list_container.pack(fill='both', expand=True)
 
         scrollbar = ttk.Scrollbar(list_container)
         scrollbar.pack(side='right', fill='y')
 
-        self.batch_listbox = tk.Listbox(list_container, height=12,
-                                        yscrollcommand=scrollbar.set)
-        self.batch_listbox.pack(side='left', fill='both', expand=True)
-        scrollbar.config(command=self.batch_listbox.yview)
+        self.batch_tree = ttk.Treeview(list_container, height=12,
+                                       columns=[col for col, _, _ in BATCH_COLUMNS],
+                                       yscrollcommand=scrollbar.set)
+        self.batch_tree.heading('#0', text='File', command=lambda: self.sort_batch_files('#0'))
+        self.batch_tree.column('#0', width=260)
+        for col, heading, width in BATCH_COLUMNS:
+            self.batch_tree.heading(col, text=heading, command=lambda c=col: self.sort_batch_files(c))
+            self.batch_tree.column(col, width=width, anchor='center')
+        for state, color in STATE_COLORS.items():
+            self.batch_tree.tag_configure(state, foreground=color)
+        self.batch_tree.pack(side='left', fill='both', expand=True)
+        scrollbar.config(command=self.batch_tree.yview)
+
+        # Contact sheet of the selected file
+        self.batch_preview_label = ttk.Label(list_container, text="Select a file\nto preview", anchor='center',
+                                             justify='center', width=24)
+        self.batch_preview_label.pack(side='right', fill='y', padx=(5, 0))
+        self.batch_preview_file = None
+        self.batch_tree.bind('<<TreeviewSelect>>', lambda event: self.show_batch_preview())
 
         # List control buttons
         list_buttons = ttk.Frame(list_frame)
@@ -790,6 +1312,19 @@ class FFmpegGUI:
                  width=30).pack(side='left', padx=5)
         ttk.Label(pattern_frame, text="({name}=original name, {ext}=extension)").pack(side='left', padx=5)
 
+        # Parallel jobs
+        jobs_frame = ttk.Frame(output_frame)
+        jobs_frame.pack(fill='x', pady=5)
+        ttk.Label(jobs_frame, text="Parallel Jobs:").pack(side='left', padx=5)
+        self.batch_jobs_var = tk.StringVar(value=str(self.config.get('batch_jobs', 0)))
+        ttk.Spinbox(jobs_frame, from_=0, to=64, textvariable=self.batch_jobs_var,
+                   width=8).pack(side='left', padx=5)
+        ttk.Label(jobs_frame, text=f"(0=auto from {os.cpu_count() or 1} cores and codec)").pack(side='left', padx=5)
+
+        self.batch_incremental_var = tk.BooleanVar(value=False)
+        ttk.Checkbutton(jobs_frame, text="Incremental (skip files whose output is up to date)",
+                       variable=self.batch_incremental_var).pack(side='left', padx=15)
+
         # Progress section
         progress_frame = ttk.LabelFrame(main_container, text="Progress", padding=10)
         progress_frame.pack(fill='x', pady=5)
@@ -806,12 +1341,27 @@ class FFmpegGUI:
 
         ttk.Button(button_frame, text="Start Batch Processing",
                   command=self.start_batch_processing).pack(side='left', padx=5)
+        ttk.Button(button_frame, text="Resume Batch",
+                  command=self.resume_batch_processing).pack(side='left', padx=5)
         ttk.Button(button_frame, text="Stop",
                   command=self.stop_batch_processing).pack(side='left', padx=5)
 
-        # Store batch file list
+        # Store batch file list, tree item per file and probed metadata per file
         self.batch_files = []
+        self.batch_items = {}
+        self.batch_info = {}
+        self.batch_sort = ('#0', False)
         self.batch_processing = False
+        self.probe_pool = ThreadPoolExecutor(max_workers=PROBE_WORKERS)
+
+        # Keep output size estimates in sync with the options
+        for var in [self.batch_convert_codec_var, self.batch_convert_crf_var,
+                    self.batch_audio_format_var, self.batch_audio_bitrate_var,
+                    self.batch_resize_resolution_var]:
+            var.trace_add('write', lambda *args: self.refresh_batch_estimates())
+
+        # Runner of the current batch, so Stop can terminate all of its jobs
+        self.batch_runner = None
 
     def create_batch_convert_options(self):
         """Create options for batch conversion"""
@@ -834,6 +1384,16 @@ class FFmpegGUI:
         ttk.Spinbox(self.batch_convert_frame, from_=0, to=51,
                    textvariable=self.batch_convert_crf_var, width=8).pack(side='left', padx=5)
 
+        self.batch_convert_auto_crf_var = tk.BooleanVar(value=False)
+        ttk.Checkbutton(self.batch_convert_frame, text="Auto CRF:",
+                       variable=self.batch_convert_auto_crf_var).pack(side='left', padx=(10, 5))
+        self.batch_convert_quality_metric_var = tk.StringVar(value="ssim")
+        ttk.Combobox(self.batch_convert_frame, textvariable=self.batch_convert_quality_metric_var,
+                    values=["ssim", "psnr"], width=6, state='readonly').pack(side='left', padx=5)
+        self.batch_convert_quality_target_var = tk.StringVar(value="0.98")
+        ttk.Entry(self.batch_convert_frame, textvariable=self.batch_convert_quality_target_var,
+                 width=6).pack(side='left', padx=5)
+
     def create_batch_audio_options(self):
         """Create options for batch audio extraction"""
         self.batch_audio_frame = ttk.Frame(self.batch_options_frame)
@@ -850,6 +1410,25 @@ class FFmpegGUI:
         ttk.Combobox(self.batch_audio_frame, textvariable=self.batch_audio_bitrate_var,
                     values=bitrates, width=10).pack(side='left', padx=5)
 
+        self.batch_audio_fadein_var = tk.BooleanVar(value=False)
+        ttk.Checkbutton(self.batch_audio_frame, text="Fade in",
+                       variable=self.batch_audio_fadein_var).pack(side='left', padx=(10, 5))
+        self.batch_audio_fadeout_var = tk.BooleanVar(value=False)
+        ttk.Checkbutton(self.batch_audio_frame, text="Fade out",
+                       variable=self.batch_audio_fadeout_var).pack(side='left', padx=5)
+        self.batch_audio_fade_var = tk.StringVar(value="3")
+        ttk.Spinbox(self.batch_audio_frame, from_=0.5, to=30, increment=0.5,
+                   textvariable=self.batch_audio_fade_var, width=6).pack(side='left', padx=5)
+        ttk.Label(self.batch_audio_frame, text="sec").pack(side='left')
+
+        self.batch_audio_loudnorm_var = tk.BooleanVar(value=False)
+        ttk.Checkbutton(self.batch_audio_frame, text="Normalize loudness",
+                       variable=self.batch_audio_loudnorm_var).pack(side='left', padx=(10, 5))
+
+        self.batch_audio_copy_var = tk.BooleanVar(value=True)
+        ttk.Checkbutton(self.batch_audio_frame, text="Copy if codec fits",
+                       variable=self.batch_audio_copy_var).pack(side='left', padx=5)
+
     def create_batch_resize_options(self):
         """Create options for batch resize"""
         self.batch_resize_frame = ttk.Frame(self.batch_options_frame)
@@ -888,6 +1467,9 @@ class FFmpegGUI:
         elif operation == "filter":
             self.batch_filter_frame.pack(fill='x', pady=5)
 
+        if hasattr(self, 'batch_info'):
+            self.refresh_batch_estimates()
+
     def create_advanced_tab(self):
         """Advanced features tab"""
         self.advanced_frame = ttk.Frame(self.notebook)
@@ -982,7 +1564,7 @@ class FFmpegGUI:
         ttk.Button(button_frame, text="Show Command",
                   command=self.show_subtitle_command).pack(side='left', padx=5)
         ttk.Button(button_frame, text="Stop",
-                  command=self.stop_process).pack(side='left', padx=5)
+                  command=lambda: self.stop_process('subtitle')).pack(side='left', padx=5)
 
     def create_watermark_tab(self, parent):
         """Create watermark tab"""
@@ -1072,7 +1654,9 @@ class FFmpegGUI:
         ttk.Button(button_frame, text="Show Command",
                   command=self.show_watermark_command).pack(side='left', padx=5)
         ttk.Button(button_frame, text="Stop",
-                  command=self.stop_process).pack(side='left', padx=5)
+                  command=lambda: self.stop_process('watermark')).pack(side='left', padx=5)
+
+        self.create_preview_panel(main_container, 'watermark')
 
     def create_video_info_tab(self, parent):
         """Create video info tab"""
@@ -1115,12 +1699,39 @@ class FFmpegGUI:
         progress_frame.pack(fill='x', pady=2)
 
         ttk.Label(progress_frame, text="Progress:").pack(side='left', padx=5)
-        self.progress_bar = ttk.Progressbar(progress_frame, mode='indeterminate', length=400)
+        self.progress_bar = ttk.Progressbar(progress_frame, mode='determinate', maximum=100, length=400)
         self.progress_bar.pack(side='left', fill='x', expand=True, padx=5)
 
         self.progress_label = ttk.Label(progress_frame, text="Ready")
         self.progress_label.pack(side='left', padx=5)
 
+        # Job queue
+        queue_frame = ttk.LabelFrame(bottom_frame, text="Job Queue")
+        queue_frame.pack(fill='x', pady=2)
+
+        self.queue_tree = ttk.Treeview(queue_frame, columns=('status', 'progress'), height=4)
+        self.queue_tree.heading('#0', text='Task')
+        self.queue_tree.heading('status', text='Status')
+        self.queue_tree.heading('progress', text='Progress')
+        self.queue_tree.column('#0', width=500)
+        self.queue_tree.column('status', width=90)
+        self.queue_tree.column('progress', width=250)
+        for state, color in STATE_COLORS.items():
+            self.queue_tree.tag_configure(state, foreground=color)
+        self.queue_tree.pack(side='left', fill='x', expand=True, padx=5, pady=5)
+
+        queue_buttons = ttk.Frame(queue_frame)
+        queue_buttons.pack(side='left', fill='y', padx=5, pady=5)
+        ttk.Label(queue_buttons, text="Parallel Jobs:").pack(anchor='w')
+        self.queue_jobs_var = tk.StringVar(value=str(self.config.get('queue_jobs', 1)))
+        ttk.Spinbox(queue_buttons, from_=1, to=max(1, os.cpu_count() or 1),
+                   textvariable=self.queue_jobs_var, width=5).pack(anchor='w', pady=2)
+        self.queue_jobs_var.trace_add('write', lambda *args: self.set_queue_concurrency())
+        ttk.Button(queue_buttons, text="Cancel Selected",
+                  command=self.cancel_selected_jobs).pack(fill='x', pady=2)
+        ttk.Button(queue_buttons, text="Clear Finished",
+                  command=self.clear_finished_jobs).pack(fill='x')
+
         # Log area
         log_frame = ttk.LabelFrame(bottom_frame, text="Log Output", height=150)
         log_frame.pack(fill='both', expand=True, pady=5)
@@ -1129,12 +1740,159 @@ class FFmpegGUI:
         self.log_text.pack(fill='both', expand=True, padx=5, pady=5)
 
     def log(self, message):
-        """Add log message"""
+        """Add log message (safe to call from any thread)"""
+        self.ui_queue.put(('log', message))
+
+    def ui_call(self, func):
+        """Run func on the Tk thread at the next UI refresh"""
+        with self.ui_lock:
+            # Later coalesced updates must not jump ahead of this call
+            self.ui_pending.clear()
+            self.ui_queue.put(('call', func))
+
+    def ui_latest(self, key, func):
+        """Like ui_call, but only the latest func per key runs each refresh"""
+        with self.ui_lock:
+            slot = self.ui_pending.get(key)
+            if slot:
+                slot[0] = func
+            else:
+                slot = self.ui_pending[key] = [func]
+                self.ui_queue.put(('latest', (key, slot)))
+
+    def process_ui_queue(self):
+        """Apply queued worker-thread UI updates, batching log inserts"""
+        log_lines = []
+        try:
+            # Only drain what is queued now so a busy worker can't starve Tk
+            for _ in range(self.ui_queue.qsize()):
+                kind, payload = self.ui_queue.get_nowait()
+                if kind == 'log':
+                    log_lines.append(payload)
+                    continue
+
+                self.flush_log(log_lines)
+                log_lines = []
+                if kind == 'latest':
+                    key, slot = payload
+                    with self.ui_lock:
+                        if self.ui_pending.get(key) is slot:
+                            del self.ui_pending[key]
+                        payload = slot[0]
+                try:
+                    payload()
+                except Exception as e:
+                    log_lines.append(f"✗ UI update failed: {str(e)}")
+            self.flush_log(log_lines)
+        finally:
+            self.root.after(UI_REFRESH_MS, self.process_ui_queue)
+
+    def flush_log(self, lines):
+        """Append log lines to the log widget in one insert"""
+        if not lines:
+            return
         self.log_text.config(state='normal')
-        self.log_text.insert('end', message + '\n')
+        self.log_text.insert('end', '\n'.join(lines) + '\n')
+        line_count = int(self.log_text.index('end-1c').split('.')[0])
+        if line_count > MAX_LOG_LINES:
+            self.log_text.delete('1.0', f'{line_count - MAX_LOG_LINES + 1}.0')
         self.log_text.see('end')
         self.log_text.config(state='disabled')
 
+    # Job queue
+    def enqueue_job(self, title, work, kind):
+        """Queue work(job) for a worker thread and list it in the queue panel"""
+        job = Job(title, work, kind)
+        self.queue_items[job.id] = self.queue_tree.insert('', 'end', text=title,
+                                                          values=('queued', ''), tags=('queued',))
+        self.scheduler.submit(job)
+        return job
+
+    def queue_ffmpeg_job(self, kind, title, cmd, temp_files=()):
+        """Queue a single FFmpeg command, removing temp_files when it ends"""
+        self.log(f"Queued {title}: {' '.join(cmd)}")
+
+        def work(job):
+            try:
+                self.run_ffmpeg_process(job, cmd)
+            finally:
+                for path in temp_files:
+                    if os.path.exists(path):
+                        os.remove(path)
+
+        return self.enqueue_job(f"{title}: {os.path.basename(cmd[-1])}", work, kind)
+
+    def queue_built_job(self, kind, title, build):
+        """Queue an FFmpeg command that build(probe_cache) makes on the worker thread,
+        so a probe cache miss doesn't hold up the UI"""
+        def work(job):
+            cmd = build(self.probe_cache)
+            self.log(f"Running {title}: {' '.join(cmd)}")
+            self.run_ffmpeg_process(job, cmd)
+
+        return self.enqueue_job(title, work, kind)
+
+    def prefetch_probe(self, path):
+        """Probe a newly chosen input in the background, so command previews find it cached"""
+        self.probe_pool.submit(self.probe_cache.duration, path)
+
+    def on_job_change(self, job):
+        """Scheduler callback (any thread): show a job's latest state"""
+        self.ui_latest(f'job{job.id}', lambda: self.show_job(job))
+        if job.state == 'done':
+            self.log(f"✓ {job.title} completed")
+        elif job.state == 'failed':
+            self.log(f"✗ {job.title} failed: {job.error}")
+            self.ui_call(lambda: messagebox.showerror("Error", f"{job.title} failed:\n{job.error}"))
+        elif job.state == 'cancelled':
+            self.log(f"{job.title} cancelled")
+
+    def show_job(self, job):
+        """Update a job's row in the queue panel and the overall progress bar"""
+        item = self.queue_items.get(job.id)
+        if item is not None and self.queue_tree.exists(item):
+            if job.state == 'failed':
+                detail = job.error.splitlines()[0] if job.error else ''
+            elif job.state == 'running':
+                detail = f"{job.progress:.1f}% {job.status}" if job.progress else job.status
+            else:
+                detail = ''
+            self.queue_tree.item(item, values=(job.state, detail), tags=(job.state,))
+
+        running, queued = self.scheduler.snapshot()
+        if running:
+            self.progress_bar.config(value=sum(job.progress for job in running) / len(running))
+            self.progress_label.config(text=f"{len(running)} running, {len(queued)} queued")
+        else:
+            self.progress_bar.config(value=0)
+            self.progress_label.config(text="Ready")
+
+    def set_queue_concurrency(self):
+        """Apply the Parallel Jobs setting of the queue panel"""
+        try:
+            jobs = max(1, int(self.queue_jobs_var.get()))
+        except ValueError:
+            return
+        self.config['queue_jobs'] = jobs
+        self.save_config()
+        self.scheduler.set_concurrency(jobs)
+
+    def cancel_selected_jobs(self):
+        """Cancel the jobs selected in the queue panel"""
+        selected = set(self.queue_tree.selection())
+        running, queued = self.scheduler.snapshot()
+        for job in running + queued:
+            if self.queue_items.get(job.id) in selected:
+                self.scheduler.cancel(job)
+
+    def clear_finished_jobs(self):
+        """Remove finished jobs from the queue panel"""
+        running, queued = self.scheduler.snapshot()
+        active = {job.id for job in running + queued}
+        for job_id in list(self.queue_items):
+            if job_id not in active:
+                self.queue_tree.delete(self.queue_items.pop(job_id))
+
     def check_ffmpeg(self):
         """Check if FFmpeg is available"""
         try:
@@ -1174,6 +1932,7 @@ class FFmpegGUI:
         if path:
             self.config['ffmpeg_path'] = path
             self.save_config()
+            self.probe_cache.ffprobe_path = self.get_ffprobe_path()
             self.log(f"FFmpeg path set to: {path}")
             self.check_ffmpeg()
 
@@ -1191,6 +1950,7 @@ class FFmpegGUI:
         if path:
             self.convert_input_entry.delete(0, 'end')
             self.convert_input_entry.insert(0, path)
+            self.prefetch_probe(path)
             self.config['last_input_dir'] = os.path.dirname(path)
             self.save_config()
 
@@ -1221,81 +1981,32 @@ class FFmpegGUI:
 
     def build_convert_command(self):
         """Build FFmpeg command for conversion"""
-        input_file = self.convert_input_entry.get().strip()
-        output_file = self.convert_output_entry.get().strip()
-
-        if not input_file or not output_file:
-            raise ValueError("Please specify both input and output files")
-
-        if not os.path.exists(input_file):
-            raise FileNotFoundError(f"Input file not found: {input_file}")
-
-        cmd = [self.config['ffmpeg_path'], '-i', input_file]
-
-        # Hardware acceleration
-        if self.convert_hw_accel_var.get():
-            cmd.extend(['-hwaccel', 'auto'])
-
-        # Video codec
-        vcodec = self.convert_vcodec_var.get()
-        cmd.extend(['-c:v', vcodec])
-
-        # Quality settings (only if not copying)
-        if vcodec != 'copy':
-            # CRF
-            if vcodec in ['libx264', 'libx265']:
-                cmd.extend(['-crf', self.convert_crf_var.get()])
-
-            # Preset
-            if vcodec in ['libx264', 'libx265']:
-                cmd.extend(['-preset', self.convert_preset_var.get()])
-
-            # Bitrate (if specified)
-            bitrate = self.convert_vbitrate_var.get().strip()
-            if bitrate:
-                cmd.extend(['-b:v', bitrate])
-
-        # Audio codec
-        acodec = self.convert_acodec_var.get()
-        cmd.extend(['-c:a', acodec])
-
-        # Resolution
-        if self.convert_resize_var.get():
-            width = self.convert_width_var.get().strip()
-            height = self.convert_height_var.get().strip()
-
-            if width and height:
-                cmd.extend(['-vf', f'scale={width}:{height}'])
-            elif width:
-                cmd.extend(['-vf', f'scale={width}:-2'])
-            elif height:
-                cmd.extend(['-vf', f'scale=-2:{height}'])
-            else:
-                # Use preset resolution
-                resolution = self.convert_resolution_var.get()
-                if resolution != 'Custom':
-                    cmd.extend(['-vf', f'scale={resolution}'])
-
-        # FPS
-        if self.convert_fps_var.get():
-            fps = self.convert_fps_value_var.get()
-            cmd.extend(['-r', fps])
-
-        # Custom arguments
-        custom_args = self.convert_custom_args_var.get().strip()
-        if custom_args:
-            cmd.extend(custom_args.split())
-
-        # Output file
-        cmd.extend(['-y', output_file])
-
-        return cmd
+        return ffmpeg_core.build_convert_command(self.config['ffmpeg_path'], self.get_tab_options('convert'))
+
+    def get_tab_options(self, tab):
+        """Read a tab's settings into an option dict for the ffmpeg_core builders"""
+        options = {key: getattr(self, f'{tab}_{key}_var').get()
+                   for key in OPTION_DEFAULTS[tab] if hasattr(self, f'{tab}_{key}_var')}
+        for key in ('input', 'file', 'output'):
+            entry = getattr(self, f'{tab}_{key}_entry', None)
+            if entry is not None:
+                options[key] = entry.get().strip()
+        return options
 
     def show_convert_command(self):
         """Show the FFmpeg command that will be executed"""
         try:
-            cmd = self.build_convert_command()
-            cmd_str = ' '.join(f'"{arg}"' if ' ' in arg else arg for arg in cmd)
+            options = self.get_tab_options('convert')
+            if options['target_enable']:
+                input_file, _ = convert_paths(options)
+                first_pass, second_passes = ffmpeg_core.build_target_size_commands(
+                    self.config['ffmpeg_path'], options, self.probe_cache.cached().probe(input_file),
+                    'passlog')
+                commands = [first_pass] + [cmd for _, _, cmd in second_passes]
+            else:
+                commands = [self.build_convert_command()]
+            cmd_str = '\n\n'.join(' '.join(f'"{arg}"' if ' ' in arg else arg for arg in cmd)
+                                   for cmd in commands)
 
             msg_window = tk.Toplevel(self.root)
             msg_window.title("FFmpeg Command")
@@ -1311,105 +2022,94 @@ class FFmpegGUI:
 
     def start_conversion(self):
         """Start the conversion process"""
-        if self.is_processing:
-            messagebox.showwarning("Busy", "A process is already running!")
-            return
-
         try:
-            cmd = self.build_convert_command()
-            self.log(f"Starting conversion: {' '.join(cmd)}")
-
-            self.is_processing = True
-            self.progress_label.config(text="Converting...")
-            self.progress_bar.start(10)
+            if self.convert_chunked_var.get():
+                self.start_chunked_conversion()
+                return
+            if self.convert_target_enable_var.get():
+                self.start_target_size_conversion()
+                return
+            if self.convert_quality_enable_var.get():
+                self.start_quality_conversion()
+                return
 
-            # Run in separate thread
-            thread = threading.Thread(target=self.run_ffmpeg_process, args=(cmd,))
-            thread.daemon = True
-            thread.start()
+            title = "Renditions" if self.convert_renditions_enable_var.get() else "Convert"
+            self.queue_ffmpeg_job('convert', title, self.build_convert_command())
 
         except Exception as e:
             messagebox.showerror("Error", str(e))
             self.log(f"Error: {str(e)}")
 
-    def run_ffmpeg_process(self, cmd):
-        """Run FFmpeg process in background with progress tracking"""
-        import re
-
-        try:
-            # Add progress flag to FFmpeg command
-            cmd_with_progress = cmd[:1] + ['-progress', 'pipe:2'] + cmd[1:]
-
-            self.current_process = subprocess.Popen(
-                cmd_with_progress,
-                stdout=subprocess.PIPE,
-                stderr=subprocess.PIPE,
-                text=True,
-                creationflags=subprocess.CREATE_NO_WINDOW if os.name == 'nt' else 0
-            )
-
-            # Get video duration first
-            duration_seconds = None
-
-            # Read stderr (FFmpeg outputs to stderr)
-            for line in self.current_process.stderr:
-                line_stripped = line.strip()
-
-                # Parse duration from FFmpeg output
-                if not duration_seconds:
-                    duration_match = re.search(r'Duration: (\d{2}):(\d{2}):(\d{2}\.\d{2})', line)
-                    if duration_match:
-                        hours, minutes, seconds = duration_match.groups()
-                        duration_seconds = int(hours) * 3600 + int(minutes) * 60 + float(seconds)
-                        self.log(f"Video duration: {duration_seconds:.2f}s")
-                        # Switch progress bar to determinate mode
-                        self.root.after(0, lambda: self.progress_bar.stop())
-                        self.root.after(0, lambda: self.progress_bar.config(mode='determinate', maximum=100))
-
-                # Parse progress
-                if duration_seconds:
-                    time_match = re.search(r'time=(\d{2}):(\d{2}):(\d{2}\.\d{2})', line)
-                    if time_match:
-                        hours, minutes, seconds = time_match.groups()
-                        current_seconds = int(hours) * 3600 + int(minutes) * 60 + float(seconds)
-                        progress = min((current_seconds / duration_seconds) * 100, 100)
-
-                        # Update progress bar and label
-                        self.root.after(0, lambda p=progress: self.progress_bar.config(value=p))
-                        self.root.after(0, lambda p=progress, c=current_seconds, d=duration_seconds:
-                                      self.progress_label.config(text=f"Processing: {p:.1f}% ({c:.1f}s / {d:.1f}s)"))
-
-                # Log important messages
-                if 'error' in line_stripped.lower() or 'warning' in line_stripped.lower():
-                    self.log(line_stripped)
-
-            self.current_process.wait()
-
-            if self.current_process.returncode == 0:
-                self.log("✓ Processing completed successfully!")
-                self.root.after(0, lambda: self.progress_bar.config(value=100))
-                self.root.after(0, lambda: messagebox.showinfo("Success", "Processing completed!"))
-            else:
-                self.log(f"✗ Processing failed with code {self.current_process.returncode}")
-                self.root.after(0, lambda: messagebox.showerror("Error", "Processing failed!"))
-
-        except Exception as e:
-            self.log(f"✗ Error: {str(e)}")
-            self.root.after(0, lambda: messagebox.showerror("Error", str(e)))
-        finally:
-            self.is_processing = False
-            self.current_process = None
-            self.root.after(0, lambda: self.progress_bar.config(mode='indeterminate', value=0))
-            self.root.after(0, lambda: self.progress_label.config(text="Ready"))
-
-    def stop_process(self):
-        """Stop the current process"""
-        if self.current_process:
-            self.current_process.terminate()
-            self.log("Process stopped by user")
-            self.is_processing = False
-            self.progress_bar.stop()
-            self.progress_label.config(text="Stopped")
+    def start_target_size_conversion(self):
+        """Queue a two-pass encode into one or more target file sizes"""
+        options = self.get_tab_options('convert')
+        convert_paths(options)
+        if options['vcodec'] not in ('libx264', 'libx265'):
+            raise ValueError("Target size encoding needs libx264 or libx265")
+        if options['renditions_enable']:
+            raise ValueError("Target size and renditions can't be combined")
+        if options['quality_enable']:
+            raise ValueError("Target size and auto CRF can't be combined")
+        ffmpeg_core.parse_target_sizes(options['target_sizes'])
+
+        def work(job):
+            ffmpeg_core.target_size_encode(self.config['ffmpeg_path'], options,
+                                           self.probe_cache, job, self.log)
+
+        self.enqueue_job(f"Target size: {os.path.basename(options['output'])}", work, 'convert')
+
+    def start_quality_conversion(self):
+        """Queue a CRF search against the quality target, then the full encode"""
+        options = self.get_tab_options('convert')
+        convert_paths(options)
+        if options['vcodec'] not in ffmpeg_core.CRF_SEARCH_RANGE:
+            raise ValueError("CRF search needs libx264 or libx265")
+        ffmpeg_core.quality_settings(options['quality_metric'], options['quality_target'])
+        ffmpeg = self.config['ffmpeg_path']
+
+        def work(job):
+            job.report(status="searching CRF")
+            result = ffmpeg_core.convert_crf(ffmpeg, options, self.probe_cache,
+                                             job.run_checked, self.log)
+            mark = '✓' if result['reached'] else '✗'
+            self.log(f"{mark} {options['quality_metric'].upper()} {options['quality_target']}: "
+                     f"CRF {result['crf']} scores {result['score']:.4g}")
+            cmd = ffmpeg_core.build_convert_command(ffmpeg, dict(options, crf=result['crf']))
+            self.run_ffmpeg_process(job, cmd)
+
+        self.enqueue_job(f"Auto CRF: {os.path.basename(options['output'])}", work, 'convert')
+
+    def start_chunked_conversion(self):
+        """Start a segment-parallel conversion of a single input"""
+        options = self.get_tab_options('convert')
+        input_file, output_file, workers, threads, _ = ffmpeg_core.chunked_settings(options)
+        self.log(f"Queued chunked conversion: {os.path.basename(input_file)} "
+                 f"({workers} parallel encodes, {threads} thread(s) each)")
+
+        def work(job):
+            ffmpeg_core.chunked_encode(self.config['ffmpeg_path'], options, self.probe_cache,
+                                       job, self.log)
+
+        self.enqueue_job(f"Chunked convert: {os.path.basename(output_file)}", work, 'convert')
+
+    def run_ffmpeg_process(self, job, cmd):
+        """Run one FFmpeg command as part of a job, reporting its progress"""
+        def progress(report, duration_seconds):
+            job.report(report.percent(duration_seconds),
+                       f"({report.out_time:.1f}s / {duration_seconds:.1f}s) "
+                       f"{report.fps:.0f} fps, {report.speed:.2f}x")
+
+        # Expected duration from the probe cache, else read from FFmpeg's log
+        job.run_ffmpeg(cmd, expected_duration(cmd, self.probe_cache), self.log, progress)
+
+    def stop_process(self, kind=None):
+        """Cancel the queued and running jobs of a tab (of all tabs if kind is None)"""
+        running, queued = self.scheduler.snapshot()
+        jobs = [job for job in running + queued if kind is None or job.kind == kind]
+        for job in jobs:
+            self.scheduler.cancel(job)
+        if jobs:
+            self.log(f"Stopping {len(jobs)} job(s)")
 
     def preview_video(self, video_path):
         """Preview video using FFplay"""
@@ -1467,37 +2167,10 @@ class FFmpegGUI:
 
     def build_trim_command(self):
         """Build FFmpeg command for trimming"""
-        input_file = self.trim_input_entry.get().strip()
-        output_file = self.trim_output_entry.get().strip()
-
-        if not input_file or not output_file:
-            raise ValueError("Please specify both input and output files")
-
-        cmd = [self.config['ffmpeg_path'], '-i', input_file]
-
-        # Start time
-        start_time = self.trim_start_var.get().strip()
-        if start_time and start_time != "00:00:00":
-            cmd.extend(['-ss', start_time])
-
-        # Duration or end time
-        if self.trim_mode_var.get() == "duration":
-            duration = self.trim_duration_var.get().strip()
-            if duration:
-                cmd.extend(['-t', duration])
-        else:
-            end_time = self.trim_end_var.get().strip()
-            if end_time:
-                cmd.extend(['-to', end_time])
-
-        # Re-encode or copy
-        if self.trim_reencode_var.get():
-            cmd.extend(['-c:v', 'libx264', '-c:a', 'aac'])
-        else:
-            cmd.extend(['-c', 'copy'])
-
-        cmd.extend(['-y', output_file])
-        return cmd
+        options = self.get_tab_options('trim')
+        keyframe_index = self.probe_cache.peek(options['input'], 'keyframes')
+        return ffmpeg_core.build_trim_command(self.config['ffmpeg_path'], options,
+                                              keyframe_index[0] if keyframe_index else None)
 
     def show_trim_command(self):
         """Show trim command"""
@@ -1516,22 +2189,39 @@ class FFmpegGUI:
 
     def start_trim(self):
         """Start trim process"""
-        if self.is_processing:
-            messagebox.showwarning("Busy", "A process is already running!")
-            return
         try:
-            cmd = self.build_trim_command()
-            self.log(f"Starting trim: {' '.join(cmd)}")
-            self.is_processing = True
-            self.progress_label.config(text="Trimming...")
-            self.progress_bar.start(10)
-            thread = threading.Thread(target=self.run_ffmpeg_process, args=(cmd,))
-            thread.daemon = True
-            thread.start()
+            options = self.get_tab_options('trim')
+            input_file, output_file, start, length = trim_settings(options)
+            if options['smartcut']:
+                self.start_smart_cut(options)
+                return
+
+            ffmpeg_path = self.config['ffmpeg_path']
+
+            def work(job):
+                keyframes = None
+                if not options['reencode']:
+                    # Stream copy needs the keyframe index to start on a keyframe
+                    job.report(status="indexing keyframes")
+                    keyframes = self.probe_cache.keyframes(input_file)[0]
+                cmd = ffmpeg_core.build_trim_command(ffmpeg_path, options, keyframes)
+                self.log(f"Starting trim: {' '.join(cmd)}")
+                self.run_ffmpeg_process(job, cmd)
+
+            self.enqueue_job(f"Trim: {os.path.basename(output_file)}", work, 'trim')
         except Exception as e:
             messagebox.showerror("Error", str(e))
             self.log(f"Error: {str(e)}")
 
+    def start_smart_cut(self, options):
+        """Queue a frame-accurate trim that only re-encodes the partial GOPs"""
+        _, output_file, _, _ = trim_settings(options)
+
+        def work(job):
+            ffmpeg_core.smart_cut(self.config['ffmpeg_path'], options, self.probe_cache, job, self.log)
+
+        self.enqueue_job(f"Smart cut: {os.path.basename(output_file)}", work, 'trim')
+
     # Video editing tab methods - Merge
     def add_merge_files(self):
         """Add files to merge list"""
@@ -1590,28 +2280,18 @@ class FFmpegGUI:
 
     def build_merge_command(self):
         """Build FFmpeg command for merging"""
-        if len(self.merge_files) < 2:
-            raise ValueError("Please add at least 2 files to merge")
-
-        output_file = self.merge_output_entry.get().strip()
-        if not output_file:
-            raise ValueError("Please specify output file")
-
         # Create temp concat file
         import tempfile
         fd, concat_file = tempfile.mkstemp(suffix='.txt', text=True)
-        with os.fdopen(fd, 'w', encoding='utf-8') as f:
-            for file in self.merge_files:
-                f.write(f"file '{file}'\n")
-
-        cmd = [self.config['ffmpeg_path'], '-f', 'concat', '-safe', '0', '-i', concat_file]
+        os.close(fd)
 
-        if self.merge_reencode_var.get():
-            cmd.extend(['-c:v', 'libx264', '-c:a', 'aac'])
-        else:
-            cmd.extend(['-c', 'copy'])
-
-        cmd.extend(['-y', output_file])
+        options = self.get_tab_options('merge')
+        options['files'] = list(self.merge_files)
+        try:
+            cmd = ffmpeg_core.build_merge_command(self.config['ffmpeg_path'], options, concat_file)
+        except Exception:
+            os.remove(concat_file)
+            raise
 
         # Store concat file path for cleanup
         self.temp_concat_file = concat_file
@@ -1634,18 +2314,23 @@ class FFmpegGUI:
 
     def start_merge(self):
         """Start merge process"""
-        if self.is_processing:
-            messagebox.showwarning("Busy", "A process is already running!")
-            return
         try:
+            options = self.get_tab_options('merge')
+            options['files'] = list(self.merge_files)
+            if ffmpeg_core.smart_merge_enabled(options):
+                if len(options['files']) < 2:
+                    raise ValueError("Please add at least 2 files to merge")
+                output_file, = ffmpeg_core.require(options, ['output'], "Please specify output file")
+
+                def work(job):
+                    ffmpeg_core.smart_merge(self.config['ffmpeg_path'], options['files'], output_file,
+                                            self.probe_cache, job, self.log, options['reencode'])
+
+                self.enqueue_job(f"Merge: {os.path.basename(output_file)}", work, 'merge')
+                return
+
             cmd = self.build_merge_command()
-            self.log(f"Starting merge: {' '.join(cmd)}")
-            self.is_processing = True
-            self.progress_label.config(text="Merging...")
-            self.progress_bar.start(10)
-            thread = threading.Thread(target=self.run_ffmpeg_process, args=(cmd,))
-            thread.daemon = True
-            thread.start()
+            self.queue_ffmpeg_job('merge', "Merge", cmd, temp_files=[self.temp_concat_file])
         except Exception as e:
             messagebox.showerror("Error", str(e))
             self.log(f"Error: {str(e)}")
@@ -1663,6 +2348,7 @@ class FFmpegGUI:
             base = os.path.splitext(path)[0]
             self.filter_output_entry.delete(0, 'end')
             self.filter_output_entry.insert(0, f"{base}_filtered{os.path.splitext(path)[1]}")
+            self.schedule_preview('filter')
 
     def browse_filter_output(self):
         """Browse for filter output file"""
@@ -1674,59 +2360,45 @@ class FFmpegGUI:
             self.filter_output_entry.delete(0, 'end')
             self.filter_output_entry.insert(0, path)
 
-    def build_filter_command(self):
+    def build_filter_command(self, options=None, probes=None):
         """Build FFmpeg command with filters"""
-        input_file = self.filter_input_entry.get().strip()
-        output_file = self.filter_output_entry.get().strip()
-
-        if not input_file or not output_file:
-            raise ValueError("Please specify both input and output files")
-
-        cmd = [self.config['ffmpeg_path'], '-i', input_file]
-
-        # Build filter chain
-        filters = []
-
-        # Rotation
-        rotate = self.filter_rotate_var.get()
-        if rotate != "none":
-            if rotate == "90":
-                filters.append("transpose=1")
-            elif rotate == "270":
-                filters.append("transpose=2")
-            elif rotate == "180":
-                filters.append("transpose=1,transpose=1")
-
-        # Flip
-        if self.filter_hflip_var.get():
-            filters.append("hflip")
-        if self.filter_vflip_var.get():
-            filters.append("vflip")
-
-        # Speed
-        speed = float(self.filter_speed_var.get())
-        if speed != 1.0:
-            filters.append(f"setpts={1/speed}*PTS")
-
-        # Brightness/Contrast/Saturation
-        brightness = float(self.filter_brightness_var.get())
-        contrast = float(self.filter_contrast_var.get())
-        saturation = float(self.filter_saturation_var.get())
-        if brightness != 0 or contrast != 1.0 or saturation != 1.0:
-            filters.append(f"eq=brightness={brightness}:contrast={contrast}:saturation={saturation}")
-
-        # Blur
-        if self.filter_blur_var.get():
-            radius = self.filter_blur_radius_var.get()
-            filters.append(f"boxblur={radius}:{radius}")
-
-        # Apply filters
-        if filters:
-            filter_str = ','.join(filters)
-            cmd.extend(['-vf', filter_str])
-
-        cmd.extend(['-c:v', 'libx264', '-c:a', 'copy', '-y', output_file])
-        return cmd
+        options = options or self.get_tab_options('filter')
+        # The size lets the optimizer place the scale; without probes (on the
+        # Tk thread) only a size the preview has already probed is used
+        probes = probes or self.probe_cache.cached()
+        return ffmpeg_core.build_filter_command(self.config['ffmpeg_path'], options,
+                                               ffmpeg_core.frame_size(probes, options['input']))
+
+    def benchmark_filters(self):
+        """Time the filter chain with and without optimization on the first seconds of the input"""
+        try:
+            options = self.get_tab_options('filter')
+            input_file = options['input']
+            if not os.path.isfile(input_file):
+                raise ValueError("Please choose an existing input file")
+            ffmpeg_path = self.config['ffmpeg_path']
+            seconds = 10
+
+            def work(job):
+                original = ffmpeg_core.filter_chain(options)
+                optimized = ffmpeg_core.optimize_filter_chain(
+                    original, ffmpeg_core.frame_size(self.probe_cache, input_file))
+                results = ffmpeg_core.benchmark_filter_chains(
+                    ffmpeg_path, input_file, [('Original', original), ('Optimized', optimized)],
+                    seconds, run=job.run_checked)
+
+                lines = [f"Filter benchmark, first {seconds}s of {os.path.basename(input_file)}:"]
+                for label, filters, elapsed in results:
+                    chain = ','.join(filters) or '(no filters, stream copy)'
+                    lines.append(f"  {label:<9} {elapsed:6.2f}s  {chain}")
+                before, after = results[0][2], results[1][2]
+                if after > 0:
+                    lines.append(f"  Optimized chain is {before / after:.2f}x the speed of the original")
+                self.log('\n'.join(lines))
+
+            self.enqueue_job(f"Benchmark filters: {os.path.basename(input_file)}", work, 'filter')
+        except Exception as e:
+            messagebox.showerror("Error", str(e))
 
     def show_filter_command(self):
         """Show filter command"""
@@ -1745,18 +2417,114 @@ class FFmpegGUI:
 
     def start_filter(self):
         """Start filter process"""
-        if self.is_processing:
-            messagebox.showwarning("Busy", "A process is already running!")
+        try:
+            options = self.get_tab_options('filter')
+            self.queue_built_job('filter', f"Filter: {os.path.basename(options['output'])}",
+                                 lambda probes: self.build_filter_command(options, probes))
+        except Exception as e:
+            messagebox.showerror("Error", str(e))
+            self.log(f"Error: {str(e)}")
+
+    # Video editing tab methods - Pipeline
+    def browse_pipeline_input(self):
+        """Browse for pipeline input file"""
+        path = filedialog.askopenfilename(
+            title="Select Video File",
+            filetypes=[("Video Files", "*.mp4 *.avi *.mkv *.mov *.flv *.wmv *.webm"), ("All Files", "*.*")]
+        )
+        if path:
+            self.pipeline_input_entry.delete(0, 'end')
+            self.pipeline_input_entry.insert(0, path)
+            base = os.path.splitext(path)[0]
+            self.pipeline_output_entry.delete(0, 'end')
+            self.pipeline_output_entry.insert(0, f"{base}_edited.mp4")
+
+    def browse_pipeline_output(self):
+        """Browse for pipeline output file"""
+        path = filedialog.asksaveasfilename(
+            title="Save Edited Video As",
+            defaultextension=".mp4",
+            filetypes=[("Video Files", "*.mp4 *.mkv *.mov"), ("All Files", "*.*")]
+        )
+        if path:
+            self.pipeline_output_entry.delete(0, 'end')
+            self.pipeline_output_entry.insert(0, path)
+
+    def add_pipeline_step(self, operation):
+        """Append a step with the current settings of its tab"""
+        step = self.get_tab_options(operation)
+        step['operation'] = operation
+        if operation == 'trim':
+            end = step['duration'] if step['mode'] == 'duration' else f"to {step['end']}"
+            summary = f"Trim: from {step['start']}, {end}"
+        elif operation == 'filter':
+            summary = f"Filters: {','.join(ffmpeg_core.filter_chain(step)) or '(none)'}"
+        elif operation == 'watermark':
+            if not step.get('file'):
+                messagebox.showwarning("No Watermark", "Please choose a watermark image on the Watermark tab")
+                return
+            summary = f"Watermark: {os.path.basename(step['file'])} ({step['position']})"
+        else:
+            if not step.get('file'):
+                messagebox.showwarning("No Subtitles", "Please choose a subtitle file on the Subtitles tab")
+                return
+            summary = f"Subtitles: {os.path.basename(step['file'])} ({step['type']})"
+        self.pipeline_steps.append(step)
+        self.pipeline_listbox.insert('end', summary)
+
+    def remove_pipeline_step(self):
+        """Remove selected pipeline step"""
+        selection = self.pipeline_listbox.curselection()
+        if selection:
+            idx = selection[0]
+            self.pipeline_listbox.delete(idx)
+            del self.pipeline_steps[idx]
+
+    def clear_pipeline_steps(self):
+        """Clear all pipeline steps"""
+        self.pipeline_listbox.delete(0, 'end')
+        self.pipeline_steps.clear()
+
+    def move_pipeline_step(self, direction):
+        """Move the selected step up (-1) or down (1)"""
+        selection = self.pipeline_listbox.curselection()
+        if not selection:
             return
+        idx = selection[0]
+        target = idx + direction
+        if 0 <= target < len(self.pipeline_steps):
+            steps = self.pipeline_steps
+            steps[idx], steps[target] = steps[target], steps[idx]
+            text = self.pipeline_listbox.get(idx)
+            self.pipeline_listbox.delete(idx)
+            self.pipeline_listbox.insert(target, text)
+            self.pipeline_listbox.selection_set(target)
+
+    def build_pipeline_command(self):
+        """Build the single FFmpeg command of the pipeline"""
+        options = self.get_tab_options('pipeline')
+        options['steps'] = list(self.pipeline_steps)
+        return ffmpeg_core.build_pipeline_command(self.config['ffmpeg_path'], options)
+
+    def show_pipeline_command(self):
+        """Show pipeline command"""
         try:
-            cmd = self.build_filter_command()
-            self.log(f"Starting filter: {' '.join(cmd)}")
-            self.is_processing = True
-            self.progress_label.config(text="Applying filters...")
-            self.progress_bar.start(10)
-            thread = threading.Thread(target=self.run_ffmpeg_process, args=(cmd,))
-            thread.daemon = True
-            thread.start()
+            cmd = self.build_pipeline_command()
+            cmd_str = ' '.join(f'"{arg}"' if ' ' in arg else arg for arg in cmd)
+            msg_window = tk.Toplevel(self.root)
+            msg_window.title("FFmpeg Command")
+            msg_window.geometry("800x200")
+            text = scrolledtext.ScrolledText(msg_window, wrap='word')
+            text.pack(fill='both', expand=True, padx=10, pady=10)
+            text.insert('1.0', cmd_str)
+            text.config(state='disabled')
+        except Exception as e:
+            messagebox.showerror("Error", str(e))
+
+    def start_pipeline(self):
+        """Start the pipeline"""
+        try:
+            self.queue_ffmpeg_job('pipeline', "Pipeline", self.build_pipeline_command())
         except Exception as e:
             messagebox.showerror("Error", str(e))
             self.log(f"Error: {str(e)}")
@@ -1771,6 +2539,7 @@ class FFmpegGUI:
         if path:
             self.audio_input_entry.delete(0, 'end')
             self.audio_input_entry.insert(0, path)
+            self.prefetch_probe(path)
             base = os.path.splitext(path)[0]
             ext = self.audio_format_var.get()
             self.audio_output_entry.delete(0, 'end')
@@ -1791,98 +2560,207 @@ class FFmpegGUI:
             self.audio_output_entry.delete(0, 'end')
             self.audio_output_entry.insert(0, path)
 
-    def build_audio_command(self):
+    def build_audio_command(self, options=None, loudness=None, probes=None):
         """Build FFmpeg command for audio extraction"""
-        input_file = self.audio_input_entry.get().strip()
-        output_file = self.audio_output_entry.get().strip()
+        options = options or self.get_tab_options('audio')
+        # Only a fade-out needs the duration and only stream copy the source stream;
+        # without probes (on the Tk thread) both come from what is already cached
+        probes = probes or self.probe_cache.cached()
+        duration = probes.duration(options['input']) if options['fadeout'] else None
+        source = ffmpeg_core.audio_stream(probes, options['input']) if options['stream_copy'] else None
+        return ffmpeg_core.build_audio_command(self.config['ffmpeg_path'], options, duration, loudness, source)
+
+    def show_audio_command(self):
+        """Show audio extraction command"""
+        try:
+            cmd = self.build_audio_command()
+            cmd_str = ' '.join(f'"{arg}"' if ' ' in arg else arg for arg in cmd)
+            msg_window = tk.Toplevel(self.root)
+            msg_window.title("FFmpeg Command")
+            msg_window.geometry("800x200")
+            text = scrolledtext.ScrolledText(msg_window, wrap='word')
+            text.pack(fill='both', expand=True, padx=10, pady=10)
+            text.insert('1.0', cmd_str)
+            text.config(state='disabled')
+        except Exception as e:
+            messagebox.showerror("Error", str(e))
 
-        if not input_file or not output_file:
-            raise ValueError("Please specify both input and output files")
+    def start_audio_extract(self):
+        """Start audio extraction process"""
+        try:
+            if self.audio_loudnorm_var.get():
+                self.start_loudnorm_extract()
+                return
+            options = self.get_tab_options('audio')
+            self.queue_built_job('audio', f"Extract audio: {os.path.basename(options['output'])}",
+                                 lambda probes: self.build_audio_command(options, probes=probes))
+        except Exception as e:
+            messagebox.showerror("Error", str(e))
+            self.log(f"Error: {str(e)}")
 
-        cmd = [self.config['ffmpeg_path'], '-i', input_file]
+    def start_loudnorm_extract(self):
+        """Queue extraction with loudness normalization: measure (or reuse the
+        cached measurement), then encode with the linear correction"""
+        options = self.get_tab_options('audio')
 
-        # Trim if enabled
-        if self.audio_trim_enable_var.get():
-            start = self.audio_trim_start_var.get().strip()
-            duration = self.audio_trim_duration_var.get().strip()
-            if start and start != "00:00:00":
-                cmd.extend(['-ss', start])
-            if duration:
-                cmd.extend(['-t', duration])
+        def work(job):
+            job.report(status="measuring loudness")
+            loudness = ffmpeg_core.audio_loudness(self.config['ffmpeg_path'], options,
+                                                  self.probe_cache, job.run_checked)
+            self.log(f"Loudness of {os.path.basename(options['input'])}: {loudness['input_i']} LUFS, "
+                     f"true peak {loudness['input_tp']} dBTP, range {loudness['input_lra']} LU")
+            self.run_ffmpeg_process(job, self.build_audio_command(options, loudness, self.probe_cache))
 
-        # Build audio filter chain
-        audio_filters = []
+        self.enqueue_job(f"Extract audio: {os.path.basename(options['output'])}", work, 'audio')
 
-        # Volume
-        if self.audio_volume_enable_var.get():
-            volume = float(self.audio_volume_var.get())
-            if volume != 1.0:
-                audio_filters.append(f"volume={volume}")
+    # Thumbnail tab methods
+    def browse_thumbnail_input(self):
+        """Browse for thumbnail input file"""
+        path = filedialog.askopenfilename(
+            title="Select Video File",
+            filetypes=[("Video Files", "*.mp4 *.avi *.mkv *.mov *.flv *.wmv *.webm"), ("All Files", "*.*")]
+        )
+        if path:
+            self.thumbnail_input_entry.delete(0, 'end')
+            self.thumbnail_input_entry.insert(0, path)
+            self.prefetch_probe(path)
+            base = os.path.splitext(path)[0]
+            self.thumbnail_output_entry.delete(0, 'end')
+            self.thumbnail_output_entry.insert(0, f"{base}_thumbnails.jpg")
+
+    def browse_thumbnail_output(self):
+        """Browse for thumbnail output file"""
+        path = filedialog.asksaveasfilename(
+            title="Save Contact Sheet As",
+            defaultextension=".jpg",
+            filetypes=[("JPEG", "*.jpg"), ("PNG", "*.png"), ("All Files", "*.*")]
+        )
+        if path:
+            self.thumbnail_output_entry.delete(0, 'end')
+            self.thumbnail_output_entry.insert(0, path)
+
+    def build_thumbnail_command(self, options=None, probes=None):
+        """Build FFmpeg command for the contact sheet"""
+        options = options or self.get_tab_options('thumbnail')
+        # Without probes (on the Tk thread) only an already cached duration is used
+        probes = probes or self.probe_cache.cached()
+        return ffmpeg_core.build_thumbnail_command(self.config['ffmpeg_path'], options,
+                                                   probes.duration(options['input']))
+
+    def show_thumbnail_command(self):
+        """Show contact sheet command"""
+        try:
+            cmd = self.build_thumbnail_command()
+            cmd_str = ' '.join(f'"{arg}"' if ' ' in arg else arg for arg in cmd)
+            msg_window = tk.Toplevel(self.root)
+            msg_window.title("FFmpeg Command")
+            msg_window.geometry("800x200")
+            text = scrolledtext.ScrolledText(msg_window, wrap='word')
+            text.pack(fill='both', expand=True, padx=10, pady=10)
+            text.insert('1.0', cmd_str)
+            text.config(state='disabled')
+        except Exception as e:
+            messagebox.showerror("Error", str(e))
 
-        # Fade in
-        if self.audio_fadein_var.get():
-            fadein_duration = float(self.audio_fadein_duration_var.get())
-            audio_filters.append(f"afade=t=in:st=0:d={fadein_duration}")
+    def start_thumbnail_sheet(self):
+        """Save the contact sheet, reusing a cached one for the same file and settings"""
+        import shutil
 
-        # Fade out (need duration - will estimate if trimming)
-        if self.audio_fadeout_var.get():
-            fadeout_duration = float(self.audio_fadeout_duration_var.get())
-            # For fade out, we need to know the end time
-            # This is approximate - may need adjustment
-            audio_filters.append(f"afade=t=out:d={fadeout_duration}")
+        options = self.get_tab_options('thumbnail')
 
-        # Apply audio filters
-        if audio_filters:
-            filter_str = ','.join(audio_filters)
-            cmd.extend(['-af', filter_str])
+        def work(job):
+            cmd = self.build_thumbnail_command(options, self.probe_cache)
+            path = self.thumbnail_cache.encode(job.run_checked, options['input'], cmd)
+            shutil.copyfile(path, options['output'])
+            self.thumbnail_cache.prune(keep=[path])
 
-        # No video
-        cmd.append('-vn')
+        self.enqueue_job(f"Thumbnails: {os.path.basename(options['output'])}", work, 'thumbnail')
 
-        # Audio codec
-        codec = self.audio_codec_var.get()
-        if codec == "auto":
-            # Auto-select codec based on format
-            format_codec_map = {
-                "mp3": "libmp3lame",
-                "aac": "aac",
-                "m4a": "aac",
-                "wav": "pcm_s16le",
-                "flac": "flac",
-                "ogg": "libvorbis",
-                "opus": "libopus",
-                "ac3": "ac3"
-            }
-            codec = format_codec_map.get(self.audio_format_var.get(), "aac")
+    def preview_thumbnail_sheet(self):
+        """Show the contact sheet of the input in the tab"""
+        options = self.get_tab_options('thumbnail')
+        if not options['input'] or not os.path.exists(options['input']):
+            messagebox.showwarning("No File", "Please select a valid video file first")
+            return
+        self.thumbnail_preview_label.config(image='', text="Generating preview...")
 
-        cmd.extend(['-c:a', codec])
+        def show(image):
+            # Halve big sheets so they fit the tab
+            while image.width() > 1000 or image.height() > 500:
+                image = image.subsample(2)
+            self.thumbnail_preview_image = image
+            self.thumbnail_preview_label.config(image=image, text='')
 
-        # Bitrate (if not using lossless codec)
-        if codec not in ['flac', 'pcm_s16le']:
-            bitrate = self.audio_bitrate_var.get()
-            cmd.extend(['-b:a', bitrate])
+        self.load_thumbnail_sheet(options['input'], options, show)
 
-        # Sample rate
-        sample_rate = self.audio_sample_var.get()
-        cmd.extend(['-ar', sample_rate])
+    def load_thumbnail_sheet(self, input_file, options, show):
+        """Make (or reuse) a contact sheet in the background, then show(PhotoImage) on the Tk thread"""
+        def work():
+            try:
+                path = cached_thumbnail_sheet(self.config['ffmpeg_path'], input_file, self.probe_cache,
+                                              self.thumbnail_cache, Job('thumbnails', None).run_checked,
+                                              options)
+            except Exception as e:
+                self.log(f"✗ Thumbnails of {os.path.basename(input_file)}: {str(e)}")
+                return
+            self.ui_call(lambda: show(tk.PhotoImage(file=path)))
 
-        # Channels
-        if self.audio_channels_var.get() == "mono":
-            cmd.extend(['-ac', '1'])
-        else:
-            cmd.extend(['-ac', '2'])
+        self.probe_pool.submit(work)
 
-        cmd.extend(['-y', output_file])
-        return cmd
+    def show_batch_preview(self):
+        """Show a small contact sheet of the selected batch file"""
+        selection = self.batch_tree.selection()
+        paths = [path for path, item in self.batch_items.items() if item in selection[:1]]
+        if not paths or paths[0] == self.batch_preview_file:
+            return
+        path = self.batch_preview_file = paths[0]
+        self.batch_preview_label.config(image='', text="Loading preview...")
 
-    def show_audio_command(self):
-        """Show audio extraction command"""
+        def show(image):
+            # Skip sheets that arrive after the selection moved on
+            if self.batch_preview_file == path:
+                self.batch_preview_image = image
+                self.batch_preview_label.config(image=image, text='')
+
+        self.load_thumbnail_sheet(path, {'columns': '2', 'rows': '3', 'width': '96'}, show)
+
+    # GIF tab methods
+    def browse_gif_input(self):
+        """Browse for GIF input file"""
+        path = filedialog.askopenfilename(
+            title="Select Video File",
+            filetypes=[("Video Files", "*.mp4 *.avi *.mkv *.mov *.flv *.wmv *.webm"), ("All Files", "*.*")]
+        )
+        if path:
+            self.gif_input_entry.delete(0, 'end')
+            self.gif_input_entry.insert(0, path)
+            base = os.path.splitext(path)[0]
+            self.gif_output_entry.delete(0, 'end')
+            self.gif_output_entry.insert(0, f"{base}.gif")
+
+    def browse_gif_output(self):
+        """Browse for GIF output file"""
+        path = filedialog.asksaveasfilename(
+            title="Save GIF As",
+            defaultextension=".gif",
+            filetypes=[("GIF", "*.gif"), ("All Files", "*.*")]
+        )
+        if path:
+            self.gif_output_entry.delete(0, 'end')
+            self.gif_output_entry.insert(0, path)
+
+    def show_gif_command(self):
+        """Show the palette and GIF commands"""
         try:
-            cmd = self.build_audio_command()
-            cmd_str = ' '.join(f'"{arg}"' if ' ' in arg else arg for arg in cmd)
+            options = self.get_tab_options('gif')
+            ffmpeg = self.config['ffmpeg_path']
+            commands = [ffmpeg_core.build_palette_command(ffmpeg, options, 'palette.png'),
+                        ffmpeg_core.build_gif_command(ffmpeg, options, 'palette.png')]
+            cmd_str = '\n\n'.join(' '.join(f'"{arg}"' if ' ' in arg else arg for arg in cmd)
+                                   for cmd in commands)
             msg_window = tk.Toplevel(self.root)
-            msg_window.title("FFmpeg Command")
-            msg_window.geometry("800x200")
+            msg_window.title("FFmpeg Commands")
+            msg_window.geometry("800x250")
             text = scrolledtext.ScrolledText(msg_window, wrap='word')
             text.pack(fill='both', expand=True, padx=10, pady=10)
             text.insert('1.0', cmd_str)
@@ -1890,23 +2768,19 @@ class FFmpegGUI:
         except Exception as e:
             messagebox.showerror("Error", str(e))
 
-    def start_audio_extract(self):
-        """Start audio extraction process"""
-        if self.is_processing:
-            messagebox.showwarning("Busy", "A process is already running!")
-            return
+    def start_gif(self):
+        """Queue GIF creation"""
         try:
-            cmd = self.build_audio_command()
-            self.log(f"Starting audio extraction: {' '.join(cmd)}")
-            self.is_processing = True
-            self.progress_label.config(text="Extracting audio...")
-            self.progress_bar.start(10)
-            thread = threading.Thread(target=self.run_ffmpeg_process, args=(cmd,))
-            thread.daemon = True
-            thread.start()
+            options = self.get_tab_options('gif')
+            ffmpeg_core.gif_settings(options)
         except Exception as e:
             messagebox.showerror("Error", str(e))
-            self.log(f"Error: {str(e)}")
+            return
+
+        def work(job):
+            ffmpeg_core.make_gif(self.config['ffmpeg_path'], options, job, self.log)
+
+        self.enqueue_job(f"GIF: {os.path.basename(options['output'])}", work, 'gif')
 
     # Batch processing methods
     def add_batch_files(self):
@@ -1916,9 +2790,7 @@ class FFmpegGUI:
             filetypes=[("Video Files", "*.mp4 *.avi *.mkv *.mov *.flv *.wmv *.webm"), ("All Files", "*.*")]
         )
         for file in files:
-            if file not in self.batch_files:
-                self.batch_files.append(file)
-                self.batch_listbox.insert('end', os.path.basename(file))
+            self.add_batch_file(file)
 
     def add_batch_folder(self):
         """Add all video files from a folder"""
@@ -1927,23 +2799,135 @@ class FFmpegGUI:
             video_extensions = ('.mp4', '.avi', '.mkv', '.mov', '.flv', '.wmv', '.webm', '.m4v', '.mpg', '.mpeg')
             for file in os.listdir(folder):
                 if file.lower().endswith(video_extensions):
-                    full_path = os.path.join(folder, file)
-                    if full_path not in self.batch_files:
-                        self.batch_files.append(full_path)
-                        self.batch_listbox.insert('end', file)
+                    self.add_batch_file(os.path.join(folder, file))
+
+    def add_batch_file(self, path):
+        """Add one file to the batch list and probe it in the background"""
+        if path in self.batch_items:
+            return
+        self.batch_files.append(path)
+        self.batch_items[path] = self.batch_tree.insert(
+            '', 'end', text=os.path.basename(path), values=['', '', '', '', '', 'probing...'])
+        self.probe_pool.submit(self.probe_batch_file, path)
+
+    def probe_batch_file(self, path):
+        """Probe a batch file on the probe pool and show the result"""
+        try:
+            info = summarize_probe(self.probe_cache.probe(path))
+        except Exception:
+            info = None
+        self.ui_call(lambda: self.show_batch_file_info(path, info))
+
+    def show_batch_file_info(self, path, info):
+        """Fill in the metadata columns of a batch file"""
+        item = self.batch_items.get(path)
+        if item is None:
+            return  # removed while probing
+        if info is None:
+            self.batch_tree.set(item, 'status', 'probe failed')
+            return
+        self.batch_info[path] = info
+        if info['duration'] is not None:
+            self.batch_tree.set(item, 'duration', format_duration(info['duration']))
+        if info['width']:
+            self.batch_tree.set(item, 'resolution', f"{info['width']}x{info['height']}")
+        self.batch_tree.set(item, 'codecs', '/'.join(c for c in (info['vcodec'], info['acodec']) if c))
+        self.batch_tree.set(item, 'size', format_size(info['size']))
+        if self.batch_tree.set(item, 'status') == 'probing...':
+            self.batch_tree.set(item, 'status', '')
+        self.update_batch_estimate(path)
+
+    def update_batch_estimate(self, path):
+        """Show the estimated output size of a batch file for the current operation"""
+        estimate = self.estimate_batch_output_size(self.batch_info[path])
+        self.batch_tree.set(self.batch_items[path], 'estimate',
+                            f"~{format_size(estimate)}" if estimate else '')
+
+    def refresh_batch_estimates(self):
+        """Recompute estimated output sizes after the batch settings changed"""
+        for path in self.batch_info:
+            if path in self.batch_items:
+                self.update_batch_estimate(path)
+
+    def estimate_batch_output_size(self, info):
+        """Rough output size in bytes for the current batch operation"""
+        duration = info['duration']
+        if not duration:
+            return None
+        operation = self.batch_operation_var.get()
+        try:
+            if operation == "audio":
+                audio_format = self.batch_audio_format_var.get()
+                if audio_format == 'wav':
+                    bitrate = 1411200
+                elif audio_format == 'flac':
+                    bitrate = 850000
+                else:
+                    bitrate = parse_bitrate(self.batch_audio_bitrate_var.get())
+                return duration * bitrate / 8
+
+            width, height = info['width'], info['height']
+            if operation == "convert":
+                codec = self.batch_convert_codec_var.get()
+                if codec == 'copy':
+                    return info['size']
+                crf = float(self.batch_convert_crf_var.get())
+            else:
+                codec, crf = 'libx264', 23
+                if operation == "resize":
+                    width, height = (int(v) for v in self.batch_resize_resolution_var.get().split('x'))
+        except ValueError:
+            return None
+
+        if not width or not info['fps']:
+            return info['size']
+        # ~0.1 bits per pixel at CRF 23 for x264, halving every 6 CRF steps
+        bits_per_pixel = 0.1 * 2 ** ((23 - crf) / 6)
+        if codec == 'libx265':
+            bits_per_pixel *= 0.6
+        video_bitrate = width * height * info['fps'] * bits_per_pixel
+        return duration * (video_bitrate + 128000) / 8
+
+    def sort_batch_files(self, column):
+        """Sort the batch list by a column, toggling direction on repeated clicks"""
+        last_column, descending = self.batch_sort
+        descending = not descending if column == last_column else False
+        self.batch_sort = (column, descending)
+
+        def sort_key(path):
+            info = self.batch_info.get(path, {})
+            if column == '#0':
+                return os.path.basename(path).lower()
+            if column == 'duration':
+                return info.get('duration') or 0
+            if column == 'resolution':
+                return info.get('width', 0) * info.get('height', 0)
+            if column == 'size':
+                return info.get('size', 0)
+            if column == 'estimate':
+                return (self.estimate_batch_output_size(info) or 0) if info else 0
+            return self.batch_tree.set(self.batch_items[path], column)
+
+        self.batch_files.sort(key=sort_key, reverse=descending)
+        for index, path in enumerate(self.batch_files):
+            self.batch_tree.move(self.batch_items[path], '', index)
 
     def remove_batch_file(self):
-        """Remove selected file from batch list"""
-        selection = self.batch_listbox.curselection()
-        if selection:
-            idx = selection[0]
-            self.batch_listbox.delete(idx)
-            del self.batch_files[idx]
+        """Remove selected files from batch list"""
+        selected = set(self.batch_tree.selection())
+        for path in [p for p in self.batch_files if self.batch_items[p] in selected]:
+            self.batch_tree.delete(self.batch_items.pop(path))
+            self.batch_files.remove(path)
+            self.batch_info.pop(path, None)
 
     def clear_batch_files(self):
         """Clear all files from batch list"""
-        self.batch_listbox.delete(0, 'end')
+        self.batch_tree.delete(*self.batch_tree.get_children())
         self.batch_files.clear()
+        self.batch_items.clear()
+        self.batch_info.clear()
+        self.batch_preview_file = None
+        self.batch_preview_label.config(image='', text="Select a file\nto preview")
 
     def browse_batch_output(self):
         """Browse for output folder"""
@@ -1952,53 +2936,45 @@ class FFmpegGUI:
             self.batch_output_entry.delete(0, 'end')
             self.batch_output_entry.insert(0, folder)
 
-    def build_batch_command(self, input_file, output_file):
-        """Build FFmpeg command for batch operation"""
-        operation = self.batch_operation_var.get()
-        cmd = [self.config['ffmpeg_path'], '-i', input_file]
-
-        if operation == "convert":
-            # Format conversion
-            codec = self.batch_convert_codec_var.get()
-            cmd.extend(['-c:v', codec])
-            if codec != 'copy':
-                crf = self.batch_convert_crf_var.get()
-                cmd.extend(['-crf', crf])
-            cmd.extend(['-c:a', 'aac'])
-
-        elif operation == "audio":
-            # Audio extraction
-            cmd.append('-vn')
-            format_codec_map = {"mp3": "libmp3lame", "aac": "aac", "wav": "pcm_s16le", "flac": "flac"}
-            format_ext = self.batch_audio_format_var.get()
-            codec = format_codec_map.get(format_ext, "aac")
-            cmd.extend(['-c:a', codec])
-            if codec not in ['flac', 'pcm_s16le']:
-                bitrate = self.batch_audio_bitrate_var.get()
-                cmd.extend(['-b:a', bitrate])
-
-        elif operation == "resize":
-            # Resize video
-            resolution = self.batch_resize_resolution_var.get()
-            cmd.extend(['-vf', f'scale={resolution}'])
-            cmd.extend(['-c:v', 'libx264', '-c:a', 'copy'])
+    def get_batch_concurrency(self):
+        """Get (parallel jobs, threads per job) for the current batch settings"""
+        options = self.get_batch_options()
+        try:
+            self.config['batch_jobs'] = max(0, int(options['jobs']))
+        except ValueError:
+            self.config['batch_jobs'] = 0
+        self.save_config()
+        return batch_jobs(options)
+
+    def set_batch_file_state(self, path, state):
+        """Show the processing state of a file in the batch list"""
+        item = self.batch_items.get(path)
+        if item is None:
+            return
+        self.batch_tree.set(item, 'status', state)
+        self.batch_tree.item(item, tags=(state,))
+
+    def get_batch_options(self):
+        """Snapshot of the batch settings, stored in the batch journal"""
+        return self.get_tab_options('batch')
+
+    def apply_batch_options(self, options):
+        """Restore batch settings from a snapshot"""
+        for key, value in options.items():
+            if key in OPTION_DEFAULTS['batch']:
+                getattr(self, f'batch_{key}_var').set(value)
+        self.update_batch_options()
 
-        elif operation == "filter":
-            # Apply filter
-            filter_type = self.batch_filter_type_var.get()
-            if filter_type == "grayscale":
-                cmd.extend(['-vf', 'hue=s=0'])
-            elif filter_type == "blur":
-                cmd.extend(['-vf', 'boxblur=5:5'])
-            elif filter_type == "sharpen":
-                cmd.extend(['-vf', 'unsharp=5:5:1.0:5:5:0.0'])
-            cmd.extend(['-c:a', 'copy'])
-
-        cmd.extend(['-y', output_file])
-        return cmd
+    def get_batch_output_file(self, input_file, output_folder):
+        """Output path of a batch file from the filename pattern"""
+        return batch_output_file(self.get_batch_options(), input_file, output_folder)
 
     def start_batch_processing(self):
         """Start batch processing"""
+        if self.batch_processing:
+            messagebox.showwarning("Busy", "Batch processing is already running!")
+            return
+
         if not self.batch_files:
             messagebox.showwarning("No Files", "Please add files to process")
             return
@@ -2015,89 +2991,143 @@ class FFmpegGUI:
                 messagebox.showerror("Error", f"Cannot create output folder: {str(e)}")
                 return
 
-        self.batch_processing = True
-        self.batch_progress_bar['value'] = 0
-        self.batch_progress_bar['maximum'] = len(self.batch_files)
+        jobs = [(input_file, self.get_batch_output_file(input_file, output_folder))
+                for input_file in self.batch_files]
+        try:
+            journal = BatchJournal.create(output_folder, self.get_batch_options(), jobs)
+        except OSError as e:
+            messagebox.showerror("Error", f"Cannot write batch journal: {str(e)}")
+            return
+        self.launch_batch(journal)
 
-        # Run batch processing in thread
-        thread = threading.Thread(target=self.run_batch_processing, args=(output_folder,))
-        thread.daemon = True
-        thread.start()
+    def resume_batch_processing(self):
+        """Resume an interrupted batch from its journal"""
+        if self.batch_processing:
+            messagebox.showwarning("Busy", "Batch processing is already running!")
+            return
 
-    def run_batch_processing(self, output_folder):
-        """Run batch processing in background"""
-        operation = self.batch_operation_var.get()
-        pattern = self.batch_pattern_var.get()
+        journal_path = self.config.get('batch_journal')
+        if not journal_path or not os.path.exists(journal_path):
+            journal_path = filedialog.askopenfilename(
+                title="Select Batch Journal",
+                filetypes=[("Batch Journal", BATCH_JOURNAL_NAME), ("JSON Files", "*.json"), ("All Files", "*.*")],
+                initialdir=self.batch_output_entry.get().strip() or None
+            )
+            if not journal_path:
+                return
 
-        # Determine output extension
-        if operation == "audio":
-            out_ext = f".{self.batch_audio_format_var.get()}"
-        elif operation == "convert":
-            out_ext = f".{self.batch_convert_format_var.get()}"
-        else:
-            out_ext = ".mp4"
+        try:
+            journal = BatchJournal.load(journal_path)
+        except Exception as e:
+            messagebox.showerror("Error", f"Cannot read batch journal: {str(e)}")
+            return
 
-        for idx, input_file in enumerate(self.batch_files):
-            if not self.batch_processing:
-                break
+        # Restore the batch exactly as it was started
+        self.apply_batch_options(journal.data['options'])
+        self.batch_output_entry.delete(0, 'end')
+        self.batch_output_entry.insert(0, journal.data['output_folder'])
+        self.clear_batch_files()
+        for item in journal.data['items']:
+            self.add_batch_file(item['input'])
 
-            # Generate output filename
-            base_name = os.path.splitext(os.path.basename(input_file))[0]
-            output_name = pattern.replace("{name}", base_name).replace("{ext}", out_ext)
-            output_file = os.path.join(output_folder, output_name)
+        remaining = sum(1 for item in journal.data['items'] if item['status'] != 'done')
+        self.log(f"Resuming batch from {journal_path}: {remaining} of "
+                 f"{len(journal.data['items'])} file(s) left")
+        self.launch_batch(journal)
 
-            self.log(f"Processing {idx+1}/{len(self.batch_files)}: {os.path.basename(input_file)}")
-            self.root.after(0, lambda i=idx, fn=os.path.basename(input_file): self.batch_progress_label.config(
-                text=f"Processing {i+1}/{len(self.batch_files)}: {fn}"))
+    def launch_batch(self, journal):
+        """Start the batch thread for a journal"""
+        self.config['batch_journal'] = journal.path
+        self.save_config()
 
-            try:
-                cmd = self.build_batch_command(input_file, output_file)
-                self.log(f"Command: {' '.join(cmd)}")
-
-                process = subprocess.Popen(
-                    cmd,
-                    stdout=subprocess.PIPE,
-                    stderr=subprocess.STDOUT,  # Redirect stderr to stdout
-                    text=True,
-                    creationflags=subprocess.CREATE_NO_WINDOW if os.name == 'nt' else 0
-                )
-
-                # Read output to prevent buffer blocking
-                output_lines = []
-                for line in process.stdout:
-                    output_lines.append(line.strip())
-
-                # Wait for process to complete
-                process.wait()
-
-                if process.returncode == 0:
-                    self.log(f"✓ Completed: {os.path.basename(input_file)}")
-                else:
-                    self.log(f"✗ Failed: {os.path.basename(input_file)} (return code: {process.returncode})")
-                    # Log last few lines of output for debugging
-                    for line in output_lines[-5:]:
-                        if line:
-                            self.log(f"  {line}")
+        self.batch_processing = True
+        self.batch_progress_bar['value'] = 0
+        self.batch_progress_bar['maximum'] = len(journal.data['items'])
+        for path in self.batch_files:
+            self.set_batch_file_state(path, 'queued')
+
+        # Tk variables and batch_info belong to this thread, so the worker gets copies
+        concurrency = self.get_batch_concurrency()
+        durations = {path: info.get('duration') for path, info in self.batch_info.items()}
+
+        # Made here so Stop reaches it even before its thread starts processing
+        self.batch_runner = BatchRunner(
+            self.config['ffmpeg_path'], journal, durations, log=self.log,
+            on_state=lambda path, state: self.ui_call(lambda: self.set_batch_file_state(path, state)),
+            on_progress=lambda finished, total: self.update_batch_progress(
+                finished, f"Finished {finished}/{total}"),
+            probe_cache=self.probe_cache, concurrency=concurrency)
 
-            except Exception as e:
-                self.log(f"✗ Error processing {os.path.basename(input_file)}: {str(e)}")
-                import traceback
-                self.log(traceback.format_exc())
+        # Run batch processing in thread
+        thread = threading.Thread(target=self.run_batch_processing, args=(self.batch_runner,))
+        thread.daemon = True
+        thread.start()
 
-            # Update progress
-            self.root.after(0, lambda: self.batch_progress_bar.step(1))
+    def check_unfinished_batch(self):
+        """Log a hint if the last batch didn't finish"""
+        journal_path = self.config.get('batch_journal')
+        if journal_path and os.path.exists(journal_path):
+            self.log(f"An unfinished batch was found ({journal_path}). "
+                     f"Use 'Resume Batch' on the Batch Processing tab to continue it.")
+
+    def run_batch_processing(self, runner):
+        """Run batch processing in background, several files at a time.
+
+        The runner is set up on the Tk thread, with the concurrency and the
+        known durations read there. A new batch can start only once this
+        returns.
+        """
+        journal = runner.journal
+        try:
+            # Files still being probed (e.g. right after a resume) come from the probe cache
+            durations = runner.durations
+            missing = [item['input'] for item in journal.data['items'] if durations.get(item['input']) is None]
+            if missing:
+                with ThreadPoolExecutor(max_workers=PROBE_WORKERS) as pool:
+                    durations.update(zip(missing, pool.map(self.probe_cache.duration, missing)))
+            results = runner.run()
+        finally:
+            # The journal is written and every job has ended
+            self.ui_call(self.finish_batch)
 
         # Batch complete
+        if journal.is_complete():
+            # Nothing left to resume
+            def forget_journal():
+                self.config.pop('batch_journal', None)
+                self.save_config()
+            self.ui_call(forget_journal)
+        else:
+            self.log("Batch is incomplete, use 'Resume Batch' to retry the remaining files")
+
+        summary = f"{results['done']} succeeded, {results['failed']} failed"
+        if results['up to date']:
+            summary += f", {results['up to date']} up to date"
+        if results['stopped']:
+            summary += f", {results['stopped']} stopped"
+        self.ui_call(lambda: self.batch_progress_label.config(text=f"Batch processing complete! ({summary})"))
+        self.ui_call(lambda: messagebox.showinfo("Complete", f"Batch processing finished!\n{summary}"))
+        self.log(f"Batch processing complete! {summary}")
+
+    def update_batch_progress(self, value, text):
+        """Set the batch progress bar and label, coalesced per UI refresh"""
+        def apply():
+            self.batch_progress_bar.config(value=value)
+            self.batch_progress_label.config(text=text)
+        self.ui_latest('batch_progress', apply)
+
+    def finish_batch(self):
+        """Allow a new batch once the running one has exited"""
         self.batch_processing = False
-        self.root.after(0, lambda: self.batch_progress_label.config(text="Batch processing complete!"))
-        self.root.after(0, lambda: messagebox.showinfo("Complete", "Batch processing finished!"))
-        self.log("Batch processing complete!")
+        self.batch_runner = None
 
     def stop_batch_processing(self):
-        """Stop batch processing"""
-        self.batch_processing = False
+        """Stop batch processing; the batch counts as running until its jobs have ended"""
+        if not self.batch_runner:
+            return
+        self.batch_runner.stop()
         self.log("Batch processing stopped by user")
-        self.batch_progress_label.config(text="Stopped")
+        self.batch_progress_label.config(text="Stopping...")
 
     # Advanced tab methods - Subtitle
     def browse_subtitle_input(self):
@@ -2135,34 +3165,7 @@ class FFmpegGUI:
 
     def build_subtitle_command(self):
         """Build FFmpeg command for adding subtitles"""
-        input_file = self.subtitle_input_entry.get().strip()
-        subtitle_file = self.subtitle_file_entry.get().strip()
-        output_file = self.subtitle_output_entry.get().strip()
-
-        if not input_file or not subtitle_file or not output_file:
-            raise ValueError("Please specify input video, subtitle file, and output file")
-
-        cmd = [self.config['ffmpeg_path'], '-i', input_file]
-
-        subtitle_type = self.subtitle_type_var.get()
-
-        if subtitle_type == "soft":
-            # Soft subtitle (embedded in container)
-            cmd.extend(['-i', subtitle_file, '-c', 'copy', '-c:s', 'mov_text'])
-        else:
-            # Hard subtitle (burned into video)
-            # Escape path for Windows
-            subtitle_path = subtitle_file.replace('\\', '/').replace(':', '\\:')
-            fontsize = self.subtitle_fontsize_var.get()
-            color = self.subtitle_color_var.get()
-
-            # Build subtitles filter
-            subtitle_filter = f"subtitles='{subtitle_path}':force_style='FontSize={fontsize},PrimaryColour=&H{color}&'"
-
-            cmd.extend(['-vf', subtitle_filter, '-c:v', 'libx264', '-c:a', 'copy'])
-
-        cmd.extend(['-y', output_file])
-        return cmd
+        return ffmpeg_core.build_subtitle_command(self.config['ffmpeg_path'], self.get_tab_options('subtitle'))
 
     def show_subtitle_command(self):
         """Show subtitle command"""
@@ -2181,18 +3184,8 @@ class FFmpegGUI:
 
     def start_add_subtitle(self):
         """Start adding subtitle"""
-        if self.is_processing:
-            messagebox.showwarning("Busy", "A process is already running!")
-            return
         try:
-            cmd = self.build_subtitle_command()
-            self.log(f"Adding subtitles: {' '.join(cmd)}")
-            self.is_processing = True
-            self.progress_label.config(text="Adding subtitles...")
-            self.progress_bar.start(10)
-            thread = threading.Thread(target=self.run_ffmpeg_process, args=(cmd,))
-            thread.daemon = True
-            thread.start()
+            self.queue_ffmpeg_job('subtitle', "Subtitles", self.build_subtitle_command())
         except Exception as e:
             messagebox.showerror("Error", str(e))
             self.log(f"Error: {str(e)}")
@@ -2210,6 +3203,7 @@ class FFmpegGUI:
             base = os.path.splitext(path)[0]
             self.watermark_output_entry.delete(0, 'end')
             self.watermark_output_entry.insert(0, f"{base}_watermarked{os.path.splitext(path)[1]}")
+            self.schedule_preview('watermark')
 
     def browse_watermark_file(self):
         """Browse for watermark image"""
@@ -2220,6 +3214,7 @@ class FFmpegGUI:
         if path:
             self.watermark_file_entry.delete(0, 'end')
             self.watermark_file_entry.insert(0, path)
+            self.schedule_preview('watermark')
 
     def browse_watermark_output(self):
         """Browse for watermark output file"""
@@ -2233,36 +3228,7 @@ class FFmpegGUI:
 
     def build_watermark_command(self):
         """Build FFmpeg command for adding watermark"""
-        input_file = self.watermark_input_entry.get().strip()
-        watermark_file = self.watermark_file_entry.get().strip()
-        output_file = self.watermark_output_entry.get().strip()
-
-        if not input_file or not watermark_file or not output_file:
-            raise ValueError("Please specify input video, watermark image, and output file")
-
-        cmd = [self.config['ffmpeg_path'], '-i', input_file, '-i', watermark_file]
-
-        # Calculate position
-        position = self.watermark_position_var.get()
-        margin = self.watermark_margin_var.get()
-        opacity = self.watermark_opacity_var.get()
-
-        # Position mapping
-        position_map = {
-            "top-left": f"{margin}:{margin}",
-            "top-right": f"W-w-{margin}:{margin}",
-            "bottom-left": f"{margin}:H-h-{margin}",
-            "bottom-right": f"W-w-{margin}:H-h-{margin}",
-            "center": "(W-w)/2:(H-h)/2"
-        }
-
-        overlay_pos = position_map.get(position, f"{margin}:{margin}")
-
-        # Build overlay filter with opacity
-        overlay_filter = f"[1:v]format=rgba,colorchannelmixer=aa={opacity}[wm];[0:v][wm]overlay={overlay_pos}"
-
-        cmd.extend(['-filter_complex', overlay_filter, '-c:v', 'libx264', '-c:a', 'copy', '-y', output_file])
-        return cmd
+        return ffmpeg_core.build_watermark_command(self.config['ffmpeg_path'], self.get_tab_options('watermark'))
 
     def show_watermark_command(self):
         """Show watermark command"""
@@ -2281,23 +3247,17 @@ class FFmpegGUI:
 
     def start_add_watermark(self):
         """Start adding watermark"""
-        if self.is_processing:
-            messagebox.showwarning("Busy", "A process is already running!")
-            return
         try:
-            cmd = self.build_watermark_command()
-            self.log(f"Adding watermark: {' '.join(cmd)}")
-            self.is_processing = True
-            self.progress_label.config(text="Adding watermark...")
-            self.progress_bar.start(10)
-            thread = threading.Thread(target=self.run_ffmpeg_process, args=(cmd,))
-            thread.daemon = True
-            thread.start()
+            self.queue_ffmpeg_job('watermark', "Watermark", self.build_watermark_command())
         except Exception as e:
             messagebox.showerror("Error", str(e))
             self.log(f"Error: {str(e)}")
 
     # Advanced tab methods - Video Info
+    def get_ffprobe_path(self):
+        """Find ffprobe next to the configured ffmpeg, falling back to PATH"""
+        return ffprobe_path_for(self.config['ffmpeg_path'])
+
     def browse_info_input(self):
         """Browse for info input video"""
         path = filedialog.askopenfilename(
@@ -2317,23 +3277,13 @@ class FFmpegGUI:
             return
 
         try:
-            # Try to find ffprobe
-            ffmpeg_path = self.config['ffmpeg_path']
-            if ffmpeg_path == 'ffmpeg':
-                ffprobe_path = 'ffprobe'
-            else:
-                ffprobe_path = os.path.join(os.path.dirname(ffmpeg_path), 'ffprobe.exe')
-                if not os.path.exists(ffprobe_path):
-                    ffprobe_path = 'ffprobe'
-
-            # Run ffprobe
-            cmd = [ffprobe_path, '-v', 'quiet', '-print_format', 'json', '-show_format', '-show_streams', input_file]
-
-            result = subprocess.run(cmd, capture_output=True, text=True, timeout=10)
+            # Run ffprobe (or reuse the cached result)
+            try:
+                data = self.probe_cache.probe(input_file)
+            except RuntimeError:
+                data = None
 
-            if result.returncode == 0:
-                import json
-                data = json.loads(result.stdout)
+            if data is not None:
 
                 # Format the information
                 info_lines = []
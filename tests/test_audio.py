@@ -0,0 +1,114 @@
+import pytest
+
+from ffmpeg_core import (audio_copy_matches, build_audio_command, build_multi_audio_command,
+                         parse_audio_outputs)
+
+AAC_SOURCE = {'codec_type': 'audio', 'codec_name': 'aac', 'sample_rate': '48000',
+              'channels': 2, 'bit_rate': '192000'}
+FLAC_SOURCE = {'codec_type': 'audio', 'codec_name': 'flac', 'sample_rate': '44100', 'channels': 2}
+
+
+def audio_options(**options):
+    return dict({'input': 'movie.mkv', 'output': 'movie.m4a', 'format': 'm4a'}, **options)
+
+
+def codec_args(cmd, output_file):
+    """The -c:a value used for one output of a command"""
+    end = cmd.index(output_file)
+    start = max(index for index, arg in enumerate(cmd[:end]) if arg == '-c:a')
+    return cmd[start + 1]
+
+
+def test_parse_audio_outputs():
+    assert parse_audio_outputs('mp3:320k, .M4A:192k; flac') == [
+        ('mp3', '320k'), ('m4a', '192k'), ('flac', None)]
+
+
+@pytest.mark.parametrize('text', ['', 'mp3, mp3:128k', 'mp3, xyz'])
+def test_parse_audio_outputs_rejects_bad_lists(text):
+    with pytest.raises(ValueError):
+        parse_audio_outputs(text)
+
+
+def test_copy_matches_same_codec_and_bitrate():
+    assert audio_copy_matches('m4a', 'auto', '192k', 'keep', 'keep', AAC_SOURCE)
+    assert audio_copy_matches('m4a', 'aac', '196k', '48000', 'stereo', AAC_SOURCE)
+
+
+@pytest.mark.parametrize('output_format, codec, bitrate, sample, channels', [
+    ('mp3', 'auto', '192k', 'keep', 'keep'),      # codec the format can't hold
+    ('m4a', 'libmp3lame', '192k', 'keep', 'keep'),  # another encoder asked for
+    ('m4a', 'auto', '128k', 'keep', 'keep'),      # other bitrate
+    ('m4a', 'auto', '192k', '44100', 'keep'),     # other sample rate
+    ('m4a', 'auto', '192k', 'keep', 'mono'),      # other channel count
+])
+def test_copy_refused_when_settings_differ(output_format, codec, bitrate, sample, channels):
+    assert not audio_copy_matches(output_format, codec, bitrate, sample, channels, AAC_SOURCE)
+
+
+def test_copy_needs_a_known_source_bitrate():
+    source = dict(AAC_SOURCE, bit_rate=None)
+    assert not audio_copy_matches('m4a', 'auto', '192k', 'keep', 'keep', source)
+    assert not audio_copy_matches('m4a', 'auto', '192k', 'keep', 'keep', None)
+
+
+def test_lossless_copy_ignores_bitrate():
+    assert audio_copy_matches('flac', 'auto', '192k', 'keep', 'keep', FLAC_SOURCE)
+
+
+def test_pcm_copy_needs_the_same_sample_format():
+    source = {'codec_name': 'pcm_s16le', 'sample_rate': '48000', 'channels': 2}
+    assert audio_copy_matches('wav', 'auto', '192k', 'keep', 'keep', source)
+    for codec_name in ('pcm_s24le', 'pcm_f32le'):
+        source = dict(source, codec_name=codec_name)
+        assert not audio_copy_matches('wav', 'auto', '192k', 'keep', 'keep', source)
+
+
+def test_audio_command_copies_matching_source():
+    cmd = build_audio_command('ffmpeg', audio_options(bitrate='192k'), source=AAC_SOURCE)
+    assert codec_args(cmd, 'movie.m4a') == 'copy'
+
+
+def test_audio_command_encodes_other_bitrate():
+    cmd = build_audio_command('ffmpeg', audio_options(bitrate='128k'), source=AAC_SOURCE)
+    assert codec_args(cmd, 'movie.m4a') == 'aac'
+    assert cmd[cmd.index('-b:a') + 1] == '128k'
+
+
+def test_audio_command_encodes_when_copy_is_off_or_filtered():
+    options = audio_options(bitrate='192k', stream_copy=False)
+    assert codec_args(build_audio_command('ffmpeg', options, source=AAC_SOURCE), 'movie.m4a') == 'aac'
+    options = audio_options(bitrate='192k', volume_enable=True, volume='1.5')
+    assert codec_args(build_audio_command('ffmpeg', options, source=AAC_SOURCE), 'movie.m4a') == 'aac'
+
+
+def test_explicit_copy_refuses_filters():
+    options = audio_options(codec='copy', volume_enable=True, volume='1.5')
+    with pytest.raises(ValueError):
+        build_audio_command('ffmpeg', options, source=AAC_SOURCE)
+
+
+def test_multi_audio_copies_only_outputs_without_own_bitrate():
+    options = audio_options(bitrate='192k', multi_enable=True, outputs='m4a, mp3:320k, flac')
+    cmd = build_multi_audio_command('ffmpeg', options, source=AAC_SOURCE)
+    assert codec_args(cmd, 'movie.m4a') == 'copy'
+    assert codec_args(cmd, 'movie.mp3') == 'libmp3lame'
+    assert codec_args(cmd, 'movie.flac') == 'flac'
+
+    options['outputs'] = 'm4a:192k, mp3'
+    cmd = build_multi_audio_command('ffmpeg', options, source=AAC_SOURCE)
+    assert codec_args(cmd, 'movie.m4a') == 'aac'
+
+
+def test_multi_audio_rejects_a_fixed_codec():
+    options = audio_options(codec='libmp3lame', multi_enable=True, outputs='m4a, mp3')
+    with pytest.raises(ValueError):
+        build_multi_audio_command('ffmpeg', options, source=AAC_SOURCE)
+
+
+def test_multi_audio_copies_and_encodes_by_the_same_codec_rule():
+    mp3_source = dict(AAC_SOURCE, codec_name='mp3')
+    options = audio_options(bitrate='192k', multi_enable=True, outputs='m4a, mp3')
+    cmd = build_multi_audio_command('ffmpeg', options, source=mp3_source)
+    assert codec_args(cmd, 'movie.m4a') == 'aac'
+    assert codec_args(cmd, 'movie.mp3') == 'copy'
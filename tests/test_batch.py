@@ -0,0 +1,85 @@
+import os
+
+from ffmpeg_core import BATCH_JOURNAL_NAME, BatchJournal, BatchRunner, batch_concurrency
+
+
+def test_batch_concurrency_splits_cores_by_codec_budget():
+    assert batch_concurrency('libx264', cpu_count=16) == (4, 4)
+    assert batch_concurrency('libx265', cpu_count=16) == (2, 8)
+
+
+def test_batch_concurrency_caps_stream_copy_jobs():
+    assert batch_concurrency('copy', cpu_count=16) == (4, 4)
+
+
+def test_batch_concurrency_keeps_explicit_job_count():
+    assert batch_concurrency('libx264', jobs=3, cpu_count=16) == (3, 5)
+    assert batch_concurrency('libx265', jobs=32, cpu_count=4) == (32, 1)
+
+
+def test_batch_concurrency_runs_at_least_one_job():
+    assert batch_concurrency('libx265', cpu_count=2) == (1, 2)
+
+
+def make_journal(tmp_path, names):
+    jobs = [(str(tmp_path / f'{name}.mkv'), str(tmp_path / f'{name}_out.mp4')) for name in names]
+    for input_file, _ in jobs:
+        with open(input_file, 'wb') as f:
+            f.write(b'input')
+    options = {'operation': 'convert', 'convert_codec': 'libx264'}
+    return BatchJournal.create(str(tmp_path), options, jobs), jobs
+
+
+def test_journal_round_trip(tmp_path):
+    journal, jobs = make_journal(tmp_path, ['a', 'b'])
+    journal.update(jobs[0][0], status='done')
+    journal.save(force=True)
+
+    loaded = BatchJournal.load(str(tmp_path / BATCH_JOURNAL_NAME))
+    assert [item['status'] for item in loaded.data['items']] == ['done', 'pending']
+    assert loaded.data['options']['convert_codec'] == 'libx264'
+    assert not loaded.is_complete()
+
+
+def test_journal_detects_changed_output(tmp_path):
+    journal, jobs = make_journal(tmp_path, ['a'])
+    output_file = jobs[0][1]
+    with open(output_file, 'wb') as f:
+        f.write(b'encoded')
+    stat = os.stat(output_file)
+    item = journal.items[jobs[0][0]]
+    item.update(status='done', size=stat.st_size, mtime=stat.st_mtime_ns, checksum='0' * 64)
+    assert journal.output_intact(item)
+
+    with open(output_file, 'wb') as f:
+        f.write(b'something else')
+    assert not journal.output_intact(item)
+    os.remove(output_file)
+    assert not journal.output_intact(item)
+
+
+def test_resume_skips_completed_files(tmp_path, monkeypatch):
+    journal, jobs = make_journal(tmp_path, ['a', 'b'])
+    (done_input, done_output), (pending_input, pending_output) = jobs
+    with open(done_output, 'wb') as f:
+        f.write(b'encoded')
+    stat = os.stat(done_output)
+    journal.update(done_input, status='done', size=stat.st_size, mtime=stat.st_mtime_ns)
+    journal.save(force=True)
+
+    ran = []
+
+    def run_process(cmd):
+        ran.append(cmd[-1])
+        with open(cmd[-1], 'wb') as f:
+            f.write(b'encoded')
+        return 0, []
+
+    runner = BatchRunner('ffmpeg', BatchJournal.load(journal.path), concurrency=(1, 1))
+    monkeypatch.setattr(runner, 'run_process', run_process)
+    results = runner.run()
+
+    assert ran == [pending_output]
+    assert results['done'] == 2
+    # A finished batch leaves nothing to resume
+    assert not os.path.exists(journal.path)
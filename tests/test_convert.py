@@ -0,0 +1,36 @@
+import pytest
+
+from ffmpeg_core import build_renditions_command, parse_renditions
+
+
+def renditions_command(tmp_path, renditions, **options):
+    input_file = tmp_path / 'movie.mkv'
+    input_file.write_bytes(b'video')
+    options = dict({'input': str(input_file), 'output': 'movie.mp4', 'renditions_enable': True,
+                    'renditions': renditions}, **options)
+    return build_renditions_command('ffmpeg', options)
+
+
+def test_parse_renditions():
+    assert parse_renditions('1080p:5M, 1280x720, 480') == [
+        (None, 1080, '5M'), (1280, 720, None), (None, 480, None)]
+
+
+@pytest.mark.parametrize('text', ['', '720, 720:1M', 'big'])
+def test_parse_renditions_rejects_bad_lists(text):
+    with pytest.raises(ValueError):
+        parse_renditions(text)
+
+
+def test_renditions_of_one_height_get_their_own_files(tmp_path):
+    cmd = renditions_command(tmp_path, '720, 960x720')
+    assert 'movie_720p.mp4' in cmd
+    assert 'movie_960x720.mp4' in cmd
+
+
+def test_rendition_bitrate_overrides_the_shared_one(tmp_path):
+    cmd = renditions_command(tmp_path, '1080:5M, 480', vbitrate='1M')
+    first = cmd[:cmd.index('movie_1080p.mp4')]
+    second = cmd[cmd.index('movie_1080p.mp4'):]
+    assert first[first.index('-b:v') + 1] == '5M'
+    assert second[second.index('-b:v') + 1] == '1M'
@@ -0,0 +1,38 @@
+from ffmpeg_core import search_crf
+
+
+def measure_with(scores, calls=None):
+    """measure() backed by a {crf: score} table, recording each round"""
+    def measure(crfs):
+        if calls is not None:
+            calls.append(list(crfs))
+        return {crf: scores(crf) for crf in crfs}
+    return measure
+
+
+def falling_ssim(crf):
+    return 1.0 - crf * 0.001
+
+
+def test_binary_search_finds_highest_passing_crf():
+    best, scores = search_crf(16, 36, 0.975, measure_with(falling_ssim))
+    assert best == 25
+    assert all(score >= 0.975 for crf, score in scores.items() if crf <= best)
+
+
+def test_parallel_candidates_reach_same_crf_in_fewer_rounds():
+    serial, parallel = [], []
+    assert search_crf(16, 36, 0.975, measure_with(falling_ssim, serial))[0] == 25
+    assert search_crf(16, 36, 0.975, measure_with(falling_ssim, parallel), candidates=3)[0] == 25
+    assert len(parallel) < len(serial)
+    assert all(len(round_crfs) <= 3 for round_crfs in parallel)
+
+
+def test_unreachable_target_gives_none():
+    best, scores = search_crf(16, 36, 0.999, measure_with(falling_ssim))
+    assert best is None
+    assert 16 in scores
+
+
+def test_every_crf_passing_gives_the_highest():
+    assert search_crf(16, 36, 0.5, measure_with(falling_ssim))[0] == 36
@@ -0,0 +1,57 @@
+from ffmpeg_core import filter_chain, optimize_filter_chain
+
+
+def test_filter_chain_neutral_settings_add_nothing():
+    assert filter_chain({'blur': True, 'blur_radius': '0'}) == []
+
+
+def test_half_turn_with_both_flips_cancels_out():
+    filters = filter_chain({'rotate': '180', 'hflip': True, 'vflip': True})
+    assert filters == ['transpose=1', 'transpose=1', 'hflip', 'vflip']
+    assert optimize_filter_chain(filters) == []
+
+
+def test_half_turn_collapses_to_flips():
+    assert optimize_filter_chain(['transpose=1', 'transpose=1']) == ['hflip', 'vflip']
+
+
+def test_quarter_turn_and_flip_collapse_to_one_transpose():
+    # 90 degrees clockwise then a horizontal flip is a transpose along the main diagonal
+    assert optimize_filter_chain(['transpose=1', 'hflip']) == ['transpose=0']
+
+
+def test_geometric_runs_are_collapsed_separately():
+    filters = ['hflip', 'eq=brightness=0.1:contrast=1.0:saturation=1.0', 'hflip']
+    assert optimize_filter_chain(filters) == filters
+
+
+def test_downscale_moves_ahead_of_pointwise_filters():
+    filters = ['setpts=0.5*PTS', 'eq=brightness=0.1:contrast=1.0:saturation=1.0', 'scale=-2:720']
+    assert optimize_filter_chain(filters, (1920, 1080)) == [
+        'scale=-2:720', 'setpts=0.5*PTS', 'eq=brightness=0.1:contrast=1.0:saturation=1.0']
+
+
+def test_downscale_stays_behind_blur():
+    filters = ['eq=brightness=0.1:contrast=1.0:saturation=1.0', 'boxblur=5:5', 'scale=-2:720']
+    assert optimize_filter_chain(filters, (1920, 1080)) == filters
+
+
+def test_upscale_and_unknown_size_stay_in_place():
+    filters = ['eq=brightness=0.1:contrast=1.0:saturation=1.0', 'scale=-2:1080']
+    assert optimize_filter_chain(filters, (1280, 720)) == filters
+    assert optimize_filter_chain(['setpts=0.5*PTS', 'scale=-2:720']) == ['setpts=0.5*PTS', 'scale=-2:720']
+
+
+def test_scale_to_current_size_is_dropped():
+    assert optimize_filter_chain(['hflip', 'scale=-2:1080'], (1920, 1080)) == ['hflip']
+
+
+def test_rotation_swaps_the_size_seen_by_scale():
+    # After a quarter turn the 1920x1080 frames are 1080 wide and 1920 high
+    assert optimize_filter_chain(['transpose=1', 'scale=-2:1920'], (1920, 1080)) == ['transpose=1']
+
+
+def test_even_rounding_scale_is_kept_on_odd_width_source():
+    # -2 rounds the 1921 pixel width to an even one, which yuv420p encoders need
+    assert optimize_filter_chain(['hflip', 'scale=-2:1080'], (1921, 1080)) == ['hflip', 'scale=-2:1080']
+    assert optimize_filter_chain(['hflip', 'scale=-1:1080'], (1921, 1080)) == ['hflip']
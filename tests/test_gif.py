@@ -0,0 +1,28 @@
+import pytest
+
+from ffmpeg_core import GIF_SEGMENT_SECONDS, plan_gif_segments
+
+
+def test_short_ranges_stay_whole():
+    assert plan_gif_segments(GIF_SEGMENT_SECONDS * 2 - 1, 12, 8) == [(0.0, GIF_SEGMENT_SECONDS * 2 - 1)]
+
+
+def test_single_worker_renders_one_segment():
+    assert plan_gif_segments(60, 12, 1) == [(0.0, 60)]
+
+
+def test_segments_cover_the_range_in_whole_frames():
+    fps = 12
+    segments = plan_gif_segments(45, fps, 4)
+    assert len(segments) == 4
+    assert segments[0][0] == 0.0
+    for (offset, length), (next_offset, _) in zip(segments, segments[1:]):
+        assert next_offset == pytest.approx(offset + length)
+    assert sum(length for _, length in segments) == pytest.approx(45)
+    for offset, length in segments:
+        assert (offset * fps) == pytest.approx(round(offset * fps))
+        assert (length * fps) == pytest.approx(round(length * fps))
+
+
+def test_segment_count_limited_by_length():
+    assert len(plan_gif_segments(25, 10, 16)) == 2
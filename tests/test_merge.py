@@ -0,0 +1,46 @@
+from ffmpeg_core import merge_signature, plan_merge
+
+
+def probe(width=1920, height=1080, duration=60.0, audio=True, codec='h264'):
+    """ffprobe-style data of a clip"""
+    streams = [{'codec_type': 'video', 'codec_name': codec, 'profile': 'High',
+                'width': width, 'height': height, 'pix_fmt': 'yuv420p',
+                'r_frame_rate': '30/1', 'time_base': '1/15360'}]
+    if audio:
+        streams.append({'codec_type': 'audio', 'codec_name': 'aac',
+                        'sample_rate': '48000', 'channels': 2})
+    return {'streams': streams, 'format': {'duration': str(duration)}}
+
+
+def test_merge_signature_covers_video_and_audio():
+    video, audio = merge_signature(probe())
+    assert video == ('h264', 'High', 1920, 1080, 'yuv420p', '30/1', '1/15360')
+    assert audio == ('aac', '48000', 2)
+
+
+def test_merge_signature_without_audio():
+    assert merge_signature(probe(audio=False))[1] is None
+
+
+def test_plan_merge_keeps_the_majority_format():
+    infos = [probe(), probe(width=1280, height=720), probe()]
+    target, outliers = plan_merge(infos)
+    assert target == merge_signature(infos[0])
+    assert outliers == [1]
+
+
+def test_plan_merge_ties_go_to_the_longest_footage():
+    infos = [probe(duration=30.0), probe(width=1280, height=720, duration=600.0)]
+    target, outliers = plan_merge(infos)
+    assert target == merge_signature(infos[1])
+    assert outliers == [0]
+
+
+def test_plan_merge_matching_inputs_need_no_reencode():
+    infos = [probe(), probe(duration=10.0)]
+    assert plan_merge(infos)[1] == []
+
+
+def test_plan_merge_treats_missing_audio_as_a_mismatch():
+    infos = [probe(), probe(audio=False), probe()]
+    assert plan_merge(infos)[1] == [1]
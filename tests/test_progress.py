@@ -0,0 +1,35 @@
+from ffmpeg_core import iter_progress
+
+
+def test_iter_progress_yields_one_report_per_block():
+    stream = [
+        'frame=120\n', 'fps=29.97\n', 'bitrate= 812.3kbits/s\n', 'total_size=524288\n',
+        'out_time_us=4000000\n', 'speed=1.5x\n', 'progress=continue\n',
+        'frame=240\n', 'out_time_us=8000000\n', 'progress=end\n',
+    ]
+    first, last = iter_progress(stream)
+
+    assert first.frame == 120
+    assert first.bitrate == 812.3
+    assert first.total_size == 524288
+    assert first.out_time == 4.0
+    assert first.speed == 1.5
+    assert not first.done
+    assert first.percent(8.0) == 50.0
+
+    assert last.frame == 240
+    assert last.done
+    assert last.percent(8.0) == 100.0
+
+
+def test_iter_progress_tolerates_unknown_values_and_noise():
+    stream = ['Press [q] to stop\n', 'bitrate=N/A\n', 'speed=N/A\n', 'out_time_us=N/A\n',
+              'progress=continue\n']
+    report, = iter_progress(stream)
+    assert report.bitrate == 0.0
+    assert report.speed == 0.0
+    assert report.percent(None) == 0.0
+
+
+def test_iter_progress_drops_incomplete_block():
+    assert list(iter_progress(['frame=1\n', 'out_time_us=1000\n'])) == []
@@ -0,0 +1,26 @@
+from ffmpeg_core import THUMBNAIL_SEEK_LIMIT, build_thumbnail_command
+
+
+def thumbnail_command(columns, rows, duration):
+    options = {'input': 'movie.mkv', 'output': 'sheet.png', 'columns': str(columns), 'rows': str(rows)}
+    return build_thumbnail_command('ffmpeg', options, duration)
+
+
+def test_small_grid_seeks_to_each_thumbnail():
+    cmd = thumbnail_command(4, 4, 160.0)
+    assert cmd.count('-i') == 16
+    seeks = [float(cmd[index + 1]) for index, arg in enumerate(cmd) if arg == '-ss']
+    assert seeks[0] == 5.0 and seeks[-1] == 155.0
+
+
+def test_large_grid_reads_the_file_once():
+    cmd = thumbnail_command(12, 12, 600.0)
+    assert 12 * 12 > THUMBNAIL_SEEK_LIMIT
+    assert cmd.count('-i') == 1
+    assert "select=" in cmd[cmd.index('-vf') + 1]
+
+
+def test_unknown_duration_uses_the_first_keyframes():
+    cmd = thumbnail_command(2, 2, None)
+    assert cmd.count('-i') == 1
+    assert 'select' not in cmd[cmd.index('-vf') + 1]
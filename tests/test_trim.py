@@ -0,0 +1,41 @@
+import pytest
+
+from ffmpeg_core import plan_smart_cut, smart_cut_encoder_args
+
+
+def test_plan_smart_cut_encodes_only_partial_gops():
+    keyframes = [0.0, 2.0, 4.0, 6.0, 8.0, 10.0]
+    assert plan_smart_cut(keyframes, 1.5, 8.5) == [
+        ('encode', 1.5, 2.0), ('copy', 2.0, 8.0), ('encode', 8.0, 8.5)]
+
+
+def test_plan_smart_cut_copies_when_cuts_hit_keyframes():
+    assert plan_smart_cut([0.0, 2.0, 4.0, 6.0], 2.0, 6.0) == [('copy', 2.0, 6.0)]
+
+
+def test_plan_smart_cut_encodes_ranges_without_a_full_gop():
+    assert plan_smart_cut([0.0, 2.0, 4.0], 2.5, 3.5) == [('encode', 2.5, 3.5)]
+    assert plan_smart_cut([0.0, 2.0, 4.0], 1.0, 3.0) == [('encode', 1.0, 3.0)]
+
+
+def test_smart_cut_encoder_matches_h264_stream():
+    video = {'codec_name': 'h264', 'profile': 'High', 'level': 41, 'pix_fmt': 'yuv420p'}
+    args = smart_cut_encoder_args(video)
+    assert args[:2] == ['-c:v', 'libx264']
+    assert args[args.index('-profile:v') + 1] == 'high'
+    assert args[args.index('-level') + 1] == '4.1'
+    assert args[args.index('-pix_fmt') + 1] == 'yuv420p'
+    assert 'repeat-headers=1' in args[args.index('-x264-params') + 1]
+
+
+def test_smart_cut_encoder_matches_hevc_stream():
+    video = {'codec_name': 'hevc', 'profile': 'Main 10', 'level': 120, 'pix_fmt': 'yuv420p10le'}
+    args = smart_cut_encoder_args(video)
+    assert args[:2] == ['-c:v', 'libx265']
+    assert args[args.index('-profile:v') + 1] == 'main10'
+    assert args[args.index('-x265-params') + 1] == 'repeat-headers=1:level-idc=4.0'
+
+
+def test_smart_cut_encoder_rejects_other_codecs():
+    with pytest.raises(ValueError):
+        smart_cut_encoder_args({'codec_name': 'vp9'})